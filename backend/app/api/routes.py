@@ -1,16 +1,21 @@
 from fastapi import APIRouter, Request, HTTPException, BackgroundTasks
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from app.services.artifacts import artifact_store
 from app.services.image_generation import image_generation_service
-from app.services.processing import processing_service
-from app.services.vectorization import vectorization_service
-from app.services.gcode import gcode_service
+from app.services.jobs import job_queue_service, QueueFullError
+from app.services.metrics import metrics_service
+from app.services.plotter import plotter_service, PlotterError, PlotterBusyError
 from app.core.config import settings
-import os
-import traceback
 from pathlib import Path
 
 router = APIRouter()
 
+# Job della pipeline, importati solo nei worker della coda (OpenCV e scikit-image non servono al server)
+PRINT_JOB = "app.services.print_pipeline:run_print_job"
+PRINT_BATCH_JOB = "app.services.print_pipeline:run_batch_print_job"
+
 # --- Modelli Pydantic ---
 class GenerateRequest(BaseModel):
     prompt: str
@@ -27,6 +32,33 @@ class PrintRequest(BaseModel):
     width_mm: float
     height_mm: float
     rotation: float = 0.0
+    optimize_travel: bool = False
+    export_svg: bool = False
+    profile: bool = False  # salva un profilo del job in PROFILE_DIR
+    debug_artifacts: bool = False  # salva maschera, scheletro e SVG intermedi
+    # Scostamento massimo dei path semplificati (None = default da config, 0 = solo la risoluzione del plotter)
+    tolerance_mm: Optional[float] = Field(None, ge=0)
+    adaptive_feed: bool = False  # feedrate per segmento: più veloce sui tratti lunghi e dritti
+    compact: bool = False  # G-code compatto (parole modali, meno decimali) per le linee seriali lente
+
+class LayoutItem(BaseModel):
+    imageUrl: str
+    x_mm: float
+    y_mm: float
+    width_mm: float
+    height_mm: float
+    rotation: float = 0.0
+
+class PrintBatchRequest(BaseModel):
+    items: List[LayoutItem]  # disegni posizionati sul foglio dal composer
+    optimize_travel: bool = False  # 2-opt/Or-opt sull'ordine globale dei path
+    profile: bool = False
+    tolerance_mm: Optional[float] = Field(None, ge=0)
+    adaptive_feed: bool = False
+    compact: bool = False
+
+class PlotRequest(BaseModel):
+    job_id: str  # job /print concluso di cui inviare il G-code al plotter
 
 # --- Routes ---
 
@@ -51,67 +83,138 @@ async def generate_image(request: GenerateRequest, req: Request):
         print(f"ERROR GENERATION: {e}")
         raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
 
-# NOTA: Rimosso 'async' perché le operazioni di immagine sono CPU-bound (pesanti)
-# Usando 'def' standard, FastAPI le esegue in un threadpool senza bloccare gli altri utenti
-@router.post("/print")
+# NOTA: La pipeline è CPU-bound (pesante): /print si limita ad accodare un job nel
+# process pool (app.services.jobs) e risponde subito con il suo ID.
+# Lo stato si segue con GET /jobs/{job_id}.
+@router.post("/print", status_code=202)
 def print_image(request: PrintRequest):
     """
-    Riceve le coordinate dall'interfaccia Angular e avvia la pipeline:
+    Riceve le coordinate dall'interfaccia Angular e accoda la pipeline:
     Processing -> Vectorization -> GCode -> Plotting
     """
     print(f">>> PRINT REQUEST: {request.imageUrl} at ({request.x_mm}, {request.y_mm})")
     
     # 1. Identificazione sicura del file locale
+    file_path = _static_file(request.imageUrl)
+
+    # 2. Pipeline di elaborazione, in un worker del process pool
+    params = request.model_dump(exclude={"imageUrl"})
     try:
-        if "/static/" not in request.imageUrl:
-            raise HTTPException(status_code=400, detail="Only local static images are supported for now.")
-        
-        # Estraiamo il nome file in modo più robusto usando Path
-        filename = request.imageUrl.split("/static/")[-1].split("?")[0] # Rimuove eventuali query params
-        
-        # Costruiamo il path assoluto rispetto alla cartella app
-        base_path = Path(__file__).resolve().parent.parent / "static"
-        file_path = base_path / filename
+        job = job_queue_service.submit("print", PRINT_JOB, str(file_path), params)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
 
-        if not file_path.exists():
-            raise HTTPException(status_code=404, detail=f"File not found on disk: {file_path}")
+    return {
+        "status": "queued",
+        "message": "Print job queued",
+        "job_id": job["id"],
+        "status_url": f"/jobs/{job['id']}"
+    }
 
-        # 2. Pipeline di elaborazione
-        # NOTA: In un prodotto reale qui useresti BackgroundTasks perché il plotter è lento
-        
-        # A. Binarizzazione e pulizia (OpenCV)
-        print("Step 1: Preprocessing...")
-        processed_path = processing_service.preprocess_image(str(file_path))
-        
-        # B. Vettorializzazione (Potrace/Centerline)
-        print("Step 2: Vectorizing...")
-        svg_path = vectorization_service.vectorize_image(processed_path)
-        
-        # C. Generazione G-Code con trasformazione coordinate
-        # Qui passiamo i millimetri e la scala decisi dall'utente in Angular
-        print("Step 3: Generating G-Code...")
-        gcode_data = gcode_service.generate_gcode(
-            svg_path=svg_path,
-            target_x=request.x_mm,
-            target_y=request.y_mm,
-            target_width=request.width_mm,
-            target_height=request.height_mm,
-            rotation=request.rotation
-        )
-        
-        # D. Invio ai motori (su Raspberry Pi)
-        # gcode_service.execute_plot(gcode_data) # Questo muoverà i GPIO
-
-        return {
-            "status": "success", 
-            "message": "Image processed and sent to plotter",
-            "details": {
-                "svg": os.path.basename(svg_path),
-                "commands": len(gcode_data)
-            }
-        }
+@router.post("/print/batch", status_code=202)
+def print_batch(request: PrintBatchRequest):
+    """
+    Layout di più immagini in un solo job: preparate in parallelo, ordinate insieme
+    e scritte in un unico G-code (un solo ritorno a casa per tutto il foglio).
+    """
+    print(f">>> PRINT BATCH REQUEST: {len(request.items)} images")
+    if not request.items:
+        raise HTTPException(status_code=400, detail="The layout has no images.")
 
-    except Exception as e:
-        print(f"Error during print processing: {e}")
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    items = [
+        {**item.model_dump(exclude={"imageUrl"}), "file_path": str(_static_file(item.imageUrl))}
+        for item in request.items
+    ]
+    params = request.model_dump(exclude={"items"})
+    try:
+        job = job_queue_service.submit("print_batch", PRINT_BATCH_JOB, items, params)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+
+    return {
+        "status": "queued",
+        "message": f"Layout job queued ({len(items)} images)",
+        "job_id": job["id"],
+        "status_url": f"/jobs/{job['id']}"
+    }
+
+def _static_file(image_url: str) -> Path:
+    """Path su disco di un'immagine servita da /static (400 se esterna, 404 se non esiste)."""
+    if "/static/" not in image_url:
+        raise HTTPException(status_code=400, detail="Only local static images are supported for now.")
+
+    # Estraiamo il nome file in modo più robusto usando Path
+    filename = image_url.split("/static/")[-1].split("?")[0] # Rimuove eventuali query params
+
+    # Path assoluto dentro la cartella static (anche nelle sottocartelle degli artefatti, mai fuori)
+    base_path = Path(settings.STATIC_DIR).resolve()
+    file_path = (base_path / filename).resolve()
+    if not file_path.is_relative_to(base_path):
+        raise HTTPException(status_code=400, detail="Invalid static file path.")
+
+    # touch: il file è in uso, la pulizia degli artefatti (LRU) lo tiene
+    if not file_path.is_file() or not artifact_store.touch(file_path):
+        raise HTTPException(status_code=404, detail=f"File not found on disk: {file_path}")
+    return file_path
+
+@router.get("/jobs")
+def list_jobs(limit: int = 50):
+    return {"queue": job_queue_service.stats(), "jobs": job_queue_service.list_jobs(limit)}
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_queue_service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Metriche dei job e degli stadi della pipeline in formato Prometheus."""
+    queue = job_queue_service.stats()
+    generation = image_generation_service.stats
+    artifacts = artifact_store.stats
+    return metrics_service.render({
+        "plotter_job_queue_pending": queue["pending"],
+        "plotter_job_queue_max_pending": queue["max_pending"],
+        "plotter_job_queue_workers": queue["workers"],
+        **{f"plotter_generation_{name}": value for name, value in generation.items()},
+        **{f"plotter_artifacts_{name}": value for name, value in artifacts.items()},
+    })
+
+# --- Plotter ---
+# Lo streaming del G-code gira in un thread del driver: le route rispondono subito
+# e lo stato (avanzamento, ETA) si segue con GET /plotter.
+
+@router.post("/plotter/jobs", status_code=202)
+def start_plot(request: PlotRequest):
+    job = job_queue_service.get(request.job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {request.job_id}")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job {request.job_id} is {job['status']}")
+
+    # Il G-code può essere stato eliminato dalla pulizia degli artefatti (quota/TTL)
+    gcode_path = Path(settings.STATIC_DIR) / job["result"]["gcode"]
+    if not artifact_store.touch(gcode_path):
+        raise HTTPException(status_code=404, detail=f"File not found on disk: {gcode_path}")
+    try:
+        return plotter_service.start(str(gcode_path), job_id=job["id"], estimated_time_s=job["estimated_plot_s"])
+    except PlotterBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except PlotterError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.get("/plotter")
+def plotter_status():
+    return {"port": plotter_service.port, "stream": plotter_service.status()}
+
+@router.post("/plotter/{action}")
+def plotter_control(action: str):
+    """pause / resume / cancel dello streaming in corso."""
+    if action not in ("pause", "resume", "cancel"):
+        raise HTTPException(status_code=404, detail=f"Unknown plotter action: {action}")
+    try:
+        return getattr(plotter_service, action)()
+    except PlotterError as e:
+        raise HTTPException(status_code=409, detail=str(e))
@@ -5,5 +5,103 @@ load_dotenv()
 
 class Settings:
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    # Endpoint alternativo compatibile con l'API OpenAI (proxy, mock locale); vuoto = quello ufficiale
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")
+
+    # Generazione immagini (/generate): richieste contemporanee verso l'API, tentativi sugli errori
+    # transitori (backoff esponenziale con jitter a partire da BACKOFF_S) e timeout per richiesta.
+    # Le immagini generate restano fra gli artefatti (vedi ARTIFACT_*), con un nome dato dal prompt.
+    GENERATION_MODEL: str = os.getenv("PLOTTER_GENERATION_MODEL", "gpt-image-1-mini")
+    GENERATION_SIZE: str = os.getenv("PLOTTER_GENERATION_SIZE", "1024x1024")
+    GENERATION_CONCURRENCY: int = int(os.getenv("PLOTTER_GENERATION_CONCURRENCY", "4"))
+    GENERATION_MAX_RETRIES: int = int(os.getenv("PLOTTER_GENERATION_MAX_RETRIES", "3"))
+    GENERATION_TIMEOUT_S: float = float(os.getenv("PLOTTER_GENERATION_TIMEOUT_S", "120"))
+    GENERATION_BACKOFF_S: float = float(os.getenv("PLOTTER_GENERATION_BACKOFF_S", "1.0"))
+
+    # Artefatti serviti da /static (immagini generate, G-code, SVG) in STATIC_DIR/artifacts:
+    # spazio massimo su disco (LRU), durata massima in ore (0 = nessuna) e intervallo della pulizia
+    STATIC_DIR: str = os.getenv("PLOTTER_STATIC_DIR", "app/static")
+    ARTIFACT_QUOTA_MB: int = int(os.getenv("PLOTTER_ARTIFACT_QUOTA_MB", "2048"))
+    ARTIFACT_TTL_H: float = float(os.getenv("PLOTTER_ARTIFACT_TTL_H", "168"))
+    ARTIFACT_SWEEP_S: float = float(os.getenv("PLOTTER_ARTIFACT_SWEEP_S", "600"))
+
+    # Cache dei risultati della pipeline /print (scheletro, path, path ordinati)
+    CACHE_DIR: str = os.getenv("PLOTTER_CACHE_DIR", "app/cache")
+    CACHE_MEMORY_MB: int = int(os.getenv("PLOTTER_CACHE_MEMORY_MB", "256"))
+    CACHE_DISK_MB: int = int(os.getenv("PLOTTER_CACHE_DISK_MB", "1024"))
+
+    # Coda dei job /print: processi worker, job in attesa/esecuzione ammessi, job conclusi ricordati
+    JOB_WORKERS: int = int(os.getenv("PLOTTER_JOB_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+    JOB_QUEUE_SIZE: int = int(os.getenv("PLOTTER_JOB_QUEUE_SIZE", "8"))
+    JOB_HISTORY: int = int(os.getenv("PLOTTER_JOB_HISTORY", "200"))
+    # Warm-up in background dopo l'avvio: SDK OpenAI nel server, worker avviati con la pipeline
+    # già importata (altrimenti li paga la prima richiesta /generate o /print)
+    WARMUP: bool = os.getenv("PLOTTER_WARMUP", "1") == "1"
+
+    # Scheletrizzazione: backend (lee/zhang/ximgproc), tile in px (0 = mai a tasselli),
+    # pixel minimi per usare le tile e processi del pool delle tile
+    SKELETON_BACKEND: str = os.getenv("PLOTTER_SKELETON_BACKEND", "lee")
+    SKELETON_TILE_SIZE: int = int(os.getenv("PLOTTER_SKELETON_TILE_SIZE", "1024"))
+    SKELETON_TILE_MIN_PIXELS: int = int(os.getenv("PLOTTER_SKELETON_TILE_MIN_PIXELS", str(2048 * 2048)))
+    SKELETON_WORKERS: int = int(os.getenv("PLOTTER_SKELETON_WORKERS", str(os.cpu_count() or 1)))
+
+    # Layout (/print/batch): processi che preparano in parallelo le immagini del foglio
+    LAYOUT_WORKERS: int = int(os.getenv("PLOTTER_LAYOUT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+    # Preprocessing adattivo: l'immagine viene ridotta prima di morfologia e scheletro fino a
+    # PREPROCESS_PX_PER_PEN pixel per larghezza della penna (PEN_WIDTH_MM) alla dimensione di stampa;
+    # 0 = sempre a piena risoluzione
+    PEN_WIDTH_MM: float = float(os.getenv("PLOTTER_PEN_WIDTH_MM", "0.3"))
+    PREPROCESS_PX_PER_PEN: float = float(os.getenv("PLOTTER_PREPROCESS_PX_PER_PEN", "3"))
+
+    # Vettorializzazione: 'centerline' (grafo dello scheletro) o 'contours' (findContours, storico)
+    VECTORIZE_ENGINE: str = os.getenv("PLOTTER_VECTORIZE_ENGINE", "centerline")
+
+    # Semplificazione dei path: 'absolute' (tolleranza in mm sul foglio, calcolata dalla dimensione
+    # di stampa) o 'relative' (storico: epsilon proporzionale alla lunghezza di ogni path).
+    # Sotto la risoluzione meccanica del plotter la penna non distingue i punti.
+    SIMPLIFY_MODE: str = os.getenv("PLOTTER_SIMPLIFY_MODE", "absolute")
+    SIMPLIFY_TOLERANCE_MM: float = float(os.getenv("PLOTTER_SIMPLIFY_TOLERANCE_MM", "0.1"))
+    PLOTTER_RESOLUTION_MM: float = float(os.getenv("PLOTTER_RESOLUTION_MM", "0.05"))
+
+    # Pianificazione del moto (stima dei tempi e feedrate per segmento): accelerazione e
+    # junction deviation come nel firmware del plotter, velocità massima di disegno (mm/min)
+    # per i tratti lunghi e dritti quando il job chiede adaptive_feed
+    MOTION_ACCEL_MM_S2: float = float(os.getenv("PLOTTER_MOTION_ACCEL_MM_S2", "500"))
+    MOTION_JUNCTION_DEVIATION_MM: float = float(os.getenv("PLOTTER_MOTION_JUNCTION_DEVIATION_MM", "0.02"))
+    MOTION_MAX_DRAW_SPEED: float = float(os.getenv("PLOTTER_MOTION_MAX_DRAW_SPEED", "3000"))
+
+    # G-code compatto (opzione compact dei job, per le seriali lente): cifre decimali accettate dalla
+    # macchina, passo minimo in mm (movimenti più corti scartati) e scostamento massimo in mm
+    # per unire i tratti allineati
+    GCODE_DECIMALS: int = int(os.getenv("PLOTTER_GCODE_DECIMALS", "2"))
+    GCODE_MIN_STEP_MM: float = float(os.getenv("PLOTTER_GCODE_MIN_STEP_MM", "0.05"))
+    GCODE_COLLINEAR_TOLERANCE_MM: float = float(os.getenv("PLOTTER_GCODE_COLLINEAR_TOLERANCE_MM", "0.01"))
+
+    # Escursione dell'asse Z a ogni pen up/down in mm (fissa: il G-code scrive "G0 Z5" / "G1 Z0").
+    # Qui e non in GCodeService perché serve anche al driver del plotter, nel server senza numpy/OpenCV
+    PEN_LIFT_MM: float = 5.0
+
+    # Driver del plotter: porta seriale ('/dev/ttyUSB0', 'COM3'), 'socket://host:porta' o 'sim://'
+    # (firmware simulato); controllo di flusso 'char' (Grbl, buffer di rx_buffer byte) o 'ack'
+    # (al massimo ack_window righe senza 'ok'). settle_s: attesa del reset di Grbl all'apertura.
+    PLOTTER_PORT: str = os.getenv("PLOTTER_PORT", "")
+    PLOTTER_BAUDRATE: int = int(os.getenv("PLOTTER_BAUDRATE", "115200"))
+    PLOTTER_FLOW_CONTROL: str = os.getenv("PLOTTER_FLOW_CONTROL", "char")
+    PLOTTER_RX_BUFFER: int = int(os.getenv("PLOTTER_RX_BUFFER", "128"))
+    PLOTTER_ACK_WINDOW: int = int(os.getenv("PLOTTER_ACK_WINDOW", "1"))
+    PLOTTER_ACK_TIMEOUT_S: float = float(os.getenv("PLOTTER_ACK_TIMEOUT_S", "60"))
+    PLOTTER_SETTLE_S: float = float(os.getenv("PLOTTER_SETTLE_S", "2.0"))
+    PLOTTER_SIM_SPEEDUP: float = float(os.getenv("PLOTTER_SIM_SPEEDUP", "1.0"))
+
+    # Artefatti intermedi della pipeline (maschera, scheletro, SVG) solo in modalità debug;
+    # cartella vuota = accanto all'immagine sorgente
+    DEBUG_ARTIFACTS: bool = os.getenv("PLOTTER_DEBUG_ARTIFACTS", "0") == "1"
+    DEBUG_DIR: str = os.getenv("PLOTTER_DEBUG_DIR", "")
+
+    # Strumentazione: picco di memoria per stadio (tracemalloc, costoso) e profilazione dei job lenti
+    METRICS_TRACE_MEMORY: bool = os.getenv("PLOTTER_TRACE_MEMORY", "0") == "1"
+    PROFILE_DIR: str = os.getenv("PLOTTER_PROFILE_DIR", "app/profiles")
+    PROFILE_SLOW_JOBS_S: float = float(os.environ["PLOTTER_PROFILE_SLOW_JOBS_S"]) if os.getenv("PLOTTER_PROFILE_SLOW_JOBS_S") else None
     
 settings = Settings()
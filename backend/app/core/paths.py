@@ -0,0 +1,143 @@
+import os
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+
+class PathArray:
+    """
+    Contenitore compatto di path: tutte le coordinate in un unico array (N, 2) float32 e
+    gli offset (M + 1, int64) di inizio/fine di ogni path, path i = points[offsets[i]:offsets[i+1]].
+    Due soli oggetti NumPy per job invece di un array (o una lista di tuple) per path:
+    poca memoria, pickle compatto (caricato senza copie dalla cache su disco, vedi ResultCache)
+    e lunghezze, bounding box e filtri vettoriali su tutti i path insieme.
+    float32 (default) è esatto per le coordinate intere in pixel del vettorizzatore; le coordinate
+    decimali (SVG, punti in mm) vanno tenute in float64, altrimenti l'arrotondamento del G-code cambia.
+    Si comporta come una sequenza di array (N, 2): len(), indice e iterazione restituiscono viste.
+    """
+
+    def __init__(self, points=None, offsets=None):
+        self.points = np.zeros((0, 2), dtype=np.float32) if points is None else points
+        self.offsets = np.zeros(1, dtype=np.int64) if offsets is None else offsets
+
+    @classmethod
+    def from_paths(cls, paths, dtype=np.float32) -> "PathArray":
+        """
+        Impacchetta una sequenza di path (array (N, 2) o liste di coppie x, y).
+        dtype=float64 per le coordinate decimali (SVG, punti già in mm), che non vanno arrotondate.
+        """
+        if isinstance(paths, PathArray) and paths.points.dtype == dtype:
+            return paths
+        paths = [np.asarray(p, dtype=dtype).reshape(-1, 2) for p in paths]
+        offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in paths], out=offsets[1:])
+        points = np.concatenate(paths) if paths else np.zeros((0, 2), dtype=dtype)
+        return cls(points, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        index = range(len(self))[index]
+        return self.points[self.offsets[index]:self.offsets[index + 1]]
+
+    def __iter__(self):
+        bounds = self.offsets.tolist()
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            yield self.points[start:end]
+
+    def __reduce__(self):
+        # Solo i due array: con il pickle protocollo 5 finiscono fuori banda (ResultCache)
+        return PathArray, (self.points, self.offsets)
+
+    @property
+    def point_count(self) -> int:
+        return len(self.points)
+
+    def starts(self) -> np.ndarray:
+        return self.points[self.offsets[:-1]]
+
+    def ends(self) -> np.ndarray:
+        return self.points[self.offsets[1:] - 1]
+
+    def lengths(self) -> np.ndarray:
+        """Lunghezza (float64) di ogni path, senza contare i salti da un path al successivo."""
+        steps = np.zeros(len(self.points))
+        steps[1:] = np.hypot(*np.diff(self.points.astype(np.float64), axis=0).T)
+        steps[self.offsets[:-1][self.offsets[:-1] < len(steps)]] = 0.0
+        cumulative = np.concatenate([[0.0], np.cumsum(steps)])
+        return np.diff(cumulative[self.offsets])
+
+    def bbox(self):
+        """(min_x, min_y, max_x, max_y) di tutti i punti."""
+        min_x, min_y = self.points.min(axis=0).astype(np.float64).tolist()
+        max_x, max_y = self.points.max(axis=0).astype(np.float64).tolist()
+        return min_x, min_y, max_x, max_y
+
+    def select(self, mask) -> "PathArray":
+        """Nuovo PathArray con i soli path per cui mask (bool, uno per path) è vero."""
+        counts = np.diff(self.offsets)
+        offsets = np.zeros(int(np.count_nonzero(mask)) + 1, dtype=np.int64)
+        np.cumsum(counts[mask], out=offsets[1:])
+        return PathArray(self.points[np.repeat(mask, counts)], offsets)
+
+
+@dataclass
+class PathSet:
+    """
+    Rappresentazione in memoria dei tracciati passati da VectorizationService a GCodeService.
+    Ogni path è un tratto (N, 2) di punti (x, y) in pixel dell'immagine sorgente,
+    nell'ordine in cui va disegnato (M seguito da L), tutti in un unico PathArray.
+    """
+    paths: PathArray = field(default_factory=PathArray)
+    width: int = 0
+    height: int = 0
+    # Immagine da cui sono stati estratti i path: serve per dare il nome agli artefatti
+    source_path: Optional[str] = None
+    # Export SVG, valorizzato solo quando viene effettivamente scritto (write_svg)
+    svg_path: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    @property
+    def point_count(self) -> int:
+        return self.paths.point_count
+
+    @property
+    def output_base(self) -> Optional[str]:
+        """Path base (senza estensione) per gli artefatti: 'x_processed.png' -> 'x'."""
+        if self.source_path is None:
+            return None
+        base, _ = os.path.splitext(self.source_path)
+        if base.endswith("_processed"):
+            base = base[:-len("_processed")]
+        return base
+
+    def to_svg(self) -> str:
+        svg_paths = []
+        for points in self.paths:
+            coords = points.tolist()
+            path_data = f"M {coords[0][0]:g} {coords[0][1]:g}"
+            for x, y in coords[1:]:
+                path_data += f" L {x:g} {y:g}"
+            svg_paths.append(f'<path d="{path_data}" fill="none" stroke="black" stroke-width="1"/>')
+
+        return "\n".join([
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.width}" height="{self.height}" viewBox="0 0 {self.width} {self.height}">',
+            *svg_paths,
+            '</svg>'
+        ])
+
+    def write_svg(self, output_path: Optional[str] = None) -> str:
+        """Scrive l'SVG solo se richiesto (export opzionale) e ne restituisce il path."""
+        if output_path is None:
+            if self.svg_path is not None:
+                return self.svg_path
+            output_path = f"{self.output_base}.svg"
+
+        with open(output_path, "w") as f:
+            f.write(self.to_svg())
+        self.svg_path = output_path
+        return output_path
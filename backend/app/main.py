@@ -1,16 +1,56 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from concurrent.futures import CancelledError
+from contextlib import asynccontextmanager
 from app.api.routes import router
+from app.core.config import settings
+from app.services.artifacts import artifact_store
+from app.services.image_generation import image_generation_service
+from app.services.jobs import job_queue_service
+from app.services.plotter import plotter_service
 import os
+import threading
+import time
 
-app = FastAPI(title="PlotterAI Backend")
+def warm_up():
+    """
+    Carica in background quello che il server importa solo al primo uso: l'SDK OpenAI e,
+    nei worker della coda, la pipeline con OpenCV e scikit-image. /health risponde da subito.
+    """
+    start = time.perf_counter()
+    try:
+        image_generation_service.preload()
+        workers = job_queue_service.warm_up("app.services.print_pipeline:warm_up")
+    except (Exception, CancelledError) as e:
+        # CancelledError: lo shutdown ha chiuso il pool mentre i worker stavano partendo
+        print(f"Warm-up interrotto: {e!r}")
+        return
+    print(f"Warm-up completato in {time.perf_counter() - start:.2f}s "
+          f"({len(workers)} worker, il più lento {max(workers, default=0.0):.2f}s)")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pulizia periodica degli artefatti in /static (quota e TTL)
+    artifact_store.start()
+    if settings.WARMUP:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+    # Chiude i worker della coda dei job
+    job_queue_service.shutdown()
+    # Interrompe l'eventuale streaming verso il plotter (penna alzata)
+    plotter_service.shutdown()
+    # Chiude le connessioni verso l'API di generazione immagini
+    await image_generation_service.aclose()
+    artifact_store.shutdown()
+
+app = FastAPI(title="PlotterAI Backend", lifespan=lifespan)
 
 # Ensure static directory exists
-os.makedirs("app/static", exist_ok=True)
+os.makedirs(settings.STATIC_DIR, exist_ok=True)
 
 # Mount static files
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+app.mount("/static", StaticFiles(directory=settings.STATIC_DIR), name="static")
 
 # Configure CORS
 origins = [
@@ -0,0 +1,193 @@
+import asyncio
+import contextlib
+import os
+import threading
+import time
+
+from app.core.config import settings
+
+# Un file appena scritto non viene eliminato prima di GRACE_S secondi: il job o il client
+# che l'ha prodotto deve ancora poterlo leggere (es. un /print accodato subito dopo /generate)
+GRACE_S = 600
+
+
+class ArtifactStoreService:
+    """
+    File prodotti dal backend e serviti da /static (immagini generate, G-code, SVG esportati).
+
+    - Nomi content-addressed: '<digest><ext>', con digest lo sha256 del contenuto o degli input
+      che lo determinano (prompt, immagine + parametri del job). Due job identici producono
+      lo stesso file invece di due copie, e nomi diversi non collidono mai.
+    - I file stanno in 256 sottocartelle per le prime due cifre del digest ('ab/abcd….gcode'):
+      le cartelle restano piccole anche dopo milioni di job.
+    - Scritture atomiche (file temporaneo + rename), anche da più processi worker;
+      le versioni async (per gli endpoint) scrivono in un thread, fuori dall'event loop.
+    - Quota su disco con eliminazione LRU (mtime, aggiornato a ogni uso con touch) e TTL:
+      sweep() gira in un thread di pulizia periodico (start/shutdown, nel solo processo principale)
+      e viene anticipato quando le scritture superano un decimo della quota. I worker della coda
+      non hanno il thread di pulizia: i byte dei loro job li riporta la coda quando il job finisce.
+    """
+
+    def __init__(self, static_dir: str, prefix: str, quota: int, ttl_s: float, sweep_interval_s: float):
+        self.static_dir = static_dir
+        self.directory = os.path.join(static_dir, prefix)
+        self.quota = quota
+        self.ttl_s = ttl_s
+        self.sweep_interval_s = sweep_interval_s
+
+        self._lock = threading.Lock()
+        self._written = 0  # byte scritti dall'ultimo sweep
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.stats = {"files": 0, "bytes": 0, "evicted": 0, "expired": 0}
+
+    # --- Nomi ---
+
+    def path(self, digest: str, ext: str) -> str:
+        return os.path.join(self.directory, digest[:2], f"{digest}{ext}")
+
+    def relative(self, path: str) -> str:
+        """Path relativo a /static ('artifacts/ab/abcd….gcode'), quello da mettere negli URL."""
+        return os.path.relpath(path, self.static_dir).replace(os.sep, "/")
+
+    def url(self, path: str) -> str:
+        return f"/static/{self.relative(path)}"
+
+    def contains(self, path) -> bool:
+        directory = os.path.realpath(self.directory)
+        return os.path.commonpath([directory, os.path.realpath(path)]) == directory
+
+    # --- Lettura/scrittura ---
+
+    def touch(self, path) -> bool:
+        """True se il file esiste; ne aggiorna l'mtime, così lo sweep LRU lo considera usato."""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    @contextlib.contextmanager
+    def open(self, digest: str, ext: str, buffering: int = -1):
+        """
+        File binario in scrittura per l'artefatto 'digest': i dati finiscono in un temporaneo
+        rinominato al posto del file definitivo solo se il blocco termina senza errori.
+        """
+        path = self.path(digest, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb", buffering=buffering) as f:
+                yield f
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+        self.note_written(size)
+
+    def write_bytes(self, digest: str, ext: str, data: bytes) -> str:
+        with self.open(digest, ext) as f:
+            f.write(data)
+        return self.path(digest, ext)
+
+    async def awrite_bytes(self, digest: str, ext: str, data: bytes) -> str:
+        return await asyncio.to_thread(self.write_bytes, digest, ext, data)
+
+    async def atouch(self, path) -> bool:
+        return await asyncio.to_thread(self.touch, path)
+
+    # --- Quota e TTL ---
+
+    def sweep(self) -> dict:
+        """Elimina i file scaduti (TTL) e poi i meno usati di recente finché non si rientra nella quota."""
+        now = time.time()
+        entries = []
+        for shard in self._scandir(self.directory):
+            if shard.is_dir(follow_symlinks=False):
+                for entry in self._scandir(shard.path):
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if entry.name.endswith(".tmp") and now - stat.st_mtime < GRACE_S:
+                        continue  # scrittura in corso
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+
+        entries.sort()
+        total = sum(size for _, _, size in entries)
+        expired = evicted = 0
+        for mtime, path, size in entries:
+            age = now - mtime
+            is_expired = self.ttl_s > 0 and age > self.ttl_s
+            if not is_expired and (total <= self.quota or age < GRACE_S):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if is_expired:
+                expired += 1
+            else:
+                evicted += 1
+
+        with self._lock:
+            self._written = 0
+            self.stats.update(files=len(entries) - expired - evicted, bytes=total)
+            self.stats["expired"] += expired
+            self.stats["evicted"] += evicted
+        if expired or evicted:
+            print(f"Artefatti: {expired} scaduti e {evicted} eliminati per la quota, "
+                  f"{total / 2**20:.1f} MB su disco")
+        return dict(self.stats)
+
+    def start(self):
+        """Avvia il thread di pulizia (uno sweep subito, poi ogni sweep_interval_s)."""
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._janitor, name="artifact-janitor", daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+
+    def _janitor(self):
+        while not self._stopped.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Artefatti: pulizia fallita: {e}")
+            self._wakeup.wait(self.sweep_interval_s)
+            self._wakeup.clear()
+
+    def note_written(self, size):
+        """Conta size byte scritti fra gli artefatti, anche da un altro processo (es. un worker)."""
+        with self._lock:
+            self._written += size
+            due = self._written > self.quota // 10
+        if due:
+            self._wakeup.set()
+
+    @staticmethod
+    def _scandir(path):
+        try:
+            with os.scandir(path) as it:
+                return list(it)
+        except OSError:
+            return []
+
+
+artifact_store = ArtifactStoreService(
+    static_dir=settings.STATIC_DIR,
+    prefix="artifacts",
+    quota=settings.ARTIFACT_QUOTA_MB * 1024 * 1024,
+    ttl_s=settings.ARTIFACT_TTL_H * 3600,
+    sweep_interval_s=settings.ARTIFACT_SWEEP_S,
+)
@@ -0,0 +1,232 @@
+import contextlib
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from app.core.config import settings
+
+# File su disco: MAGIC, numero di buffer, lunghezza del pickle e di ogni buffer (uint64),
+# poi il pickle e i buffer fuori banda allineati a BUFFER_ALIGN byte
+MAGIC = b"PLTCACH1"
+BUFFER_ALIGN = 64
+# Un file temporaneo più vecchio di TMP_GRACE_S è di una scrittura interrotta: conta e viene eliminato
+TMP_GRACE_S = 600
+# Digest di file sorgente ricordati da ogni processo
+FILE_HASH_MEMO = 1024
+
+
+class ResultCache:
+    """
+    Cache content-addressed dei risultati intermedi della pipeline /print.
+    Le chiavi sono hash di (stage, hash immagine sorgente, parametri dello stage);
+    i valori stanno in un LRU in memoria e in un LRU su disco, entrambi limitati in byte.
+    Su disco gli array NumPy (scheletri, PathArray) sono salvati fuori dal pickle (protocollo 5)
+    e riletti con mmap senza copie: un worker che riprende un job dalla cache non duplica i dati.
+    Su Windows un file mappato non si può eliminare né sostituire (eviction, clear, riscrittura
+    della stessa chiave da un altro worker): lì i file vengono letti in memoria.
+    """
+
+    def __init__(self, directory: str, memory_limit: int, disk_limit: int):
+        self.directory = directory
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (value, size)
+        self._memory_size = 0
+        self._disk_size = None  # calcolata a ogni scrittura
+        # (path, inode, size) -> sha256, LRU: evita di rileggere immagini già viste
+        self._file_hashes = OrderedDict()
+
+    # --- Chiavi ---
+
+    def hash_file(self, path: str) -> str:
+        """
+        sha256 del file. Il memo non usa l'mtime, che cambia a ogni touch degli artefatti (/print):
+        un file sostituito (scrittura atomica) ha un altro inode, uno riscritto sul posto un'altra dimensione.
+        """
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_dev, stat.st_ino, stat.st_size)
+        with self._lock:
+            digest = self._file_hashes.get(memo_key)
+            if digest is not None:
+                self._file_hashes.move_to_end(memo_key)
+                return digest
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        with self._lock:
+            self._file_hashes[memo_key] = digest
+            if len(self._file_hashes) > FILE_HASH_MEMO:
+                self._file_hashes.popitem(last=False)
+        return digest
+
+    def key(self, stage: str, source_hash: str, **params) -> str:
+        payload = json.dumps([stage, source_hash, params], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    # --- Accesso ---
+
+    def get(self, key: str):
+        """Restituisce il valore in cache o None (i valori restituiti non vanno modificati)."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry[0]
+
+        path = self._disk_path(key)
+        try:
+            value, size = self._load(path)
+            os.utime(path)  # LRU su disco basato sull'mtime
+        except (OSError, ValueError, pickle.UnpicklingError):
+            return None  # file assente, troncato o di un formato precedente
+
+        self._remember(key, value, size)
+        return value
+
+    def put(self, key: str, value):
+        buffers = []
+        data = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+        raws = [buffer.raw() for buffer in buffers]
+        chunks = [MAGIC, struct.pack(f"<{len(raws) + 2}Q", len(raws), len(data), *(r.nbytes for r in raws)), data]
+        position = sum(len(c) for c in chunks)
+        for raw in raws:
+            padding = -position % BUFFER_ALIGN
+            chunks += [b"\0" * padding, raw]
+            position += padding + raw.nbytes
+        self._remember(key, value, position)
+        self._store(key, chunks, position)
+
+    def get_or_compute(self, key: str, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith((".pkl", ".tmp")):
+                    os.remove(os.path.join(self.directory, name))
+        self._disk_size = 0
+
+    # --- LRU ---
+
+    def _remember(self, key, value, size):
+        if size > self.memory_limit:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_size -= old[1]
+            self._memory[key] = (value, size)
+            self._memory_size += size
+            while self._memory_size > self.memory_limit:
+                _, (_, evicted) = self._memory.popitem(last=False)
+                self._memory_size -= evicted
+
+    def _load(self, path):
+        """Legge un file della cache; i buffer restano mappati in memoria (array in sola lettura)."""
+        with open(path, "rb") as f:
+            if os.name == "nt":
+                view = memoryview(f.read())
+            else:
+                view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        if view[:len(MAGIC)] != MAGIC:
+            raise ValueError("Unknown cache file format")
+        position = len(MAGIC)
+        count, data_size = struct.unpack_from("<2Q", view, position)
+        sizes = struct.unpack_from(f"<{count}Q", view, position + 16)
+        position += 16 + 8 * count
+        data = view[position:position + data_size]
+        position += data_size
+        buffers = []
+        for size in sizes:
+            position += -position % BUFFER_ALIGN
+            buffers.append(view[position:position + size])
+            position += size
+        return pickle.loads(data, buffers=buffers), len(view)
+
+    def _store(self, key, chunks, size):
+        if size > self.disk_limit:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            print(f"Cache: impossibile scrivere su disco: {e}")
+            return
+
+        # Dimensione riletta dal disco: una chiave riscritta sostituisce il file (non si somma)
+        # e gli altri worker scrivono nella stessa cartella
+        with self._lock:
+            self._disk_size = sum(size for _, _, size in self._disk_entries())
+            if self._disk_size > self.disk_limit:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        # Eliminiamo i file meno usati di recente finché non rientriamo nel limite
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= self.disk_limit:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_size = total
+
+    def _disk_entries(self):
+        """
+        (mtime, path, size) per ogni file della cache su disco, compresi i temporanei rimasti da
+        scritture interrotte (i più vecchi: l'eviction li elimina per primi).
+        """
+        entries = []
+        now = time.time()
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith((".pkl", ".tmp")):
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue  # eliminato nel frattempo
+                        if entry.name.endswith(".tmp") and now - stat.st_mtime < TMP_GRACE_S:
+                            continue  # scrittura in corso
+                        entries.append((stat.st_mtime, entry.path, stat.st_size))
+        except OSError:
+            pass
+        return entries
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+
+result_cache = ResultCache(
+    directory=settings.CACHE_DIR,
+    memory_limit=settings.CACHE_MEMORY_MB * 1024 * 1024,
+    disk_limit=settings.CACHE_DISK_MB * 1024 * 1024,
+)
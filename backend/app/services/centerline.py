@@ -0,0 +1,234 @@
+import math
+
+import cv2
+import numpy as np
+
+# Vicinato 8-connesso (centro escluso) per il grado dei pixel dello scheletro
+_NEIGHBOURS = np.array([[1, 1, 1], [1, 0, 1], [1, 1, 1]], dtype=np.float32)
+
+# Pattern hit-or-miss degli angoli a scalino (1 = tratto, -1 = sfondo, 0 = indifferente):
+# il pixel centrale ha due vicini ortogonali che si toccano già in diagonale, quindi è ridondante
+_STAIR_KERNELS = [np.rot90(np.array([[0, 1, 0], [1, 1, -1], [0, -1, -1]], dtype=np.int32), k) for k in range(4)]
+
+
+class CenterlineService:
+    """
+    Vettorializzazione 'centerline': trasforma lo scheletro (1 px) in un grafo di pixel con
+    nodi (estremi e incroci) e archi, ed emette ogni arco una sola volta come polilinea aperta.
+    A differenza di findContours, che percorre ogni tratto in andata e ritorno, non ci sono
+    punti doppi e il plotter disegna ogni linea una volta sola.
+
+    Tutte le classificazioni (grado, nodi, catene) sono operazioni su array NumPy/OpenCV;
+    l'ordinamento dei pixel di ogni catena riusa il border following di findContours
+    sulla sola maschera delle catene, tagliandolo tra i due estremi.
+    """
+
+    # Pixel usati per stimare la direzione di un arco vicino a un nodo
+    DIRECTION_SPAN = 6
+
+    def trace(self, mask: np.ndarray) -> list:
+        """
+        mask: scheletro booleano (True = tratto). Restituisce una lista di array int32 (N, 2)
+        di punti (x, y). Ogni arco del grafo compare una sola volta; gli archi che si incontrano
+        in un nodo vengono concatenati in tratti continui (proseguendo sull'arco più allineato),
+        così il plotter non alza la penna a ogni incrocio. Gli anelli isolati sono chiusi.
+        """
+        skel = self._thin_stairs(mask.astype(np.uint8))
+        # Bordo di un pixel: tutti i vicini esistono e gli indici non escono dall'immagine
+        skel = cv2.copyMakeBorder(skel, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+        fg = skel.astype(bool)
+        degree = self._degree(skel)
+
+        chain = (fg & (degree == 2)).astype(np.uint8)
+        junction = (fg & (degree >= 3)).astype(np.uint8)
+        endpoint = fg & (degree == 1)
+
+        # Nodi: ogni gruppo di pixel d'incrocio adiacenti è un unico nodo (nel suo baricentro),
+        # ogni estremo è un nodo a sé
+        n_junctions, labels, _, centroids = cv2.connectedComponentsWithStats(junction, connectivity=8)
+        ey, ex = np.nonzero(endpoint)
+        labels[ey, ex] = n_junctions + np.arange(len(ex))
+        node_xy = np.concatenate([
+            np.rint(centroids).astype(np.int32),
+            np.stack([ex, ey], axis=1).astype(np.int32),
+        ]).reshape(-1, 2)
+
+        loops, edges = self._trace_chains(chain, labels, node_xy)
+        edges += self._short_edges(ex, ey, labels, node_xy, chain, n_junctions)
+        paths = loops + self._join_edges(edges)
+
+        # Togliamo il bordo aggiunto all'inizio
+        return [p - 1 for p in paths]
+
+    # --- Interni ---
+
+    def _thin_stairs(self, skel):
+        """Rende lo scheletro 8-sottile togliendo i pixel degli scalini (non cambia la connettività)."""
+        for kernel in _STAIR_KERNELS:
+            hits = cv2.morphologyEx(skel, cv2.MORPH_HITMISS, kernel)
+            skel[hits > 0] = 0
+        return skel
+
+    def _degree(self, skel):
+        return cv2.filter2D(skel, cv2.CV_8U, _NEIGHBOURS, borderType=cv2.BORDER_CONSTANT) * skel
+
+    def _trace_chains(self, chain, labels, node_xy):
+        """
+        Una polilinea per catena di pixel di grado 2, estesa ai nodi alle sue estremità.
+        Restituisce (anelli isolati, archi) con archi = [(nodo_inizio, nodo_fine, punti)];
+        0 = nessun nodo.
+        """
+        contours, hierarchy = cv2.findContours(chain, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_NONE)
+        if not contours:
+            return [], []
+        chain_degree = self._degree(chain)
+
+        loops, chains = [], []
+        for contour, (_, _, _, parent) in zip(contours, hierarchy[0]):
+            # Con RETR_CCOMP i bordi dei buchi (anelli chiusi) hanno un padre: li saltiamo
+            if parent != -1:
+                continue
+            pts = contour.reshape(-1, 2)
+            ends = np.flatnonzero(chain_degree[pts[:, 1], pts[:, 0]] <= 1)
+
+            if len(ends) == 0:
+                # Anello isolato: il bordo esterno lo percorre una volta sola
+                loops.append(np.concatenate([pts, pts[:1]]))
+            elif len(ends) == 1:
+                chains.append(pts[ends])
+            else:
+                # Catena aperta: il contorno va da un estremo all'altro e poi torna indietro,
+                # teniamo solo l'andata
+                second = ends[1] - ends[0]
+                if ends[0] == 0:
+                    chains.append(pts[:ends[1] + 1])
+                else:
+                    chains.append(pts[(ends[0] + np.arange(second + 1)) % len(pts)])
+
+        if not chains:
+            return loops, []
+
+        # Nodi adiacenti a inizio e fine di tutte le catene, in un colpo solo
+        first = np.array([c[0] for c in chains])
+        last = np.array([c[-1] for c in chains])
+        start_nodes = self._neighbour_labels(labels, first).max(axis=1)
+        end_window = self._neighbour_labels(labels, last)
+        end_nodes = end_window.max(axis=1)
+        # Catena di un solo pixel tra due nodi diversi: alla fine usiamo l'altro nodo
+        single = np.array([len(c) == 1 for c in chains])
+        if single.any():
+            other = np.where((end_window > 0) & (end_window != start_nodes[:, None]), end_window, 0).max(axis=1)
+            end_nodes = np.where(single, other, end_nodes)
+
+        edges = []
+        for pts, start, end in zip(chains, start_nodes.tolist(), end_nodes.tolist()):
+            parts = [pts]
+            if start:
+                parts.insert(0, node_xy[start:start + 1])
+            if end:
+                parts.append(node_xy[end:end + 1])
+            edges.append((start, end, np.concatenate(parts)))
+        return loops, edges
+
+    def _short_edges(self, ex, ey, labels, node_xy, chain, n_junctions):
+        """Archi senza pixel di catena: estremo attaccato direttamente a un incrocio o a un altro estremo."""
+        edges = []
+        # Solo gli estremi senza pixel di catena nel vicinato (di solito pochissimi)
+        near_chain = cv2.dilate(chain, np.ones((3, 3), np.uint8))[ey, ex] > 0
+        for i in np.flatnonzero(~near_chain).tolist():
+            x, y = int(ex[i]), int(ey[i])
+            own = n_junctions + i
+            for node in self._adjacent_nodes(labels, (x, y)):
+                # Due estremi vicini: emettiamo l'arco una volta sola
+                if node != own and (node < n_junctions or node > own):
+                    edges.append((node, own, np.stack([node_xy[node], node_xy[own]])))
+        return edges
+
+    def _join_edges(self, edges):
+        """
+        Concatena gli archi in tratti continui: si parte dai nodi di grado dispari (estremi,
+        incroci a T) e in ogni nodo si prosegue sull'arco libero più allineato con la direzione
+        di arrivo. Ogni arco viene usato una volta sola.
+        """
+        incident = {}
+        for i, (start, end, _) in enumerate(edges):
+            for node in (start, end):
+                if node:
+                    incident.setdefault(node, []).append(i)
+
+        used = bytearray(len(edges))
+        # Prima i nodi di grado dispari (estremi per primi), poi gli altri
+        order = sorted(incident, key=lambda n: (len(incident[n]) % 2 == 0, len(incident[n]), n))
+
+        strokes = []
+        for i, (start, end, pts) in enumerate(edges):
+            if not start and not end:
+                used[i] = 1
+                strokes.append(pts)
+        for node in order:
+            for _ in range(len(incident.get(node, ()))):
+                stroke = self._walk(node, edges, incident, used)
+                if stroke is None:
+                    break
+                strokes.append(stroke)
+        # Archi rimasti (es. con un'estremità senza nodo)
+        for i, (start, end, pts) in enumerate(edges):
+            if not used[i]:
+                used[i] = 1
+                strokes.append(pts)
+        return strokes
+
+    def _walk(self, node, edges, incident, used):
+        parts = []
+        direction = None
+        while True:
+            best, best_score = None, None
+            for i in incident.get(node, ()):
+                if used[i]:
+                    continue
+                pts = self._oriented(edges[i], node)
+                if direction is None:
+                    best = (i, pts)
+                    break
+                out = self._direction(pts)
+                score = direction[0] * out[0] + direction[1] * out[1]
+                if best_score is None or score > best_score:
+                    best, best_score = (i, pts), score
+            if best is None:
+                break
+            i, pts = best
+            used[i] = 1
+            parts.append(pts if not parts else pts[1:])
+            # Direzione di arrivo nel nodo successivo (verso l'esterno dell'arco percorso)
+            direction = self._direction(pts[::-1])
+            direction = (-direction[0], -direction[1])
+            start, end, _ = edges[i]
+            node = end if start == node else start
+            if not node:
+                break
+        return np.concatenate(parts) if parts else None
+
+    def _oriented(self, edge, node):
+        start, end, pts = edge
+        return pts if start == node else pts[::-1]
+
+    def _direction(self, pts):
+        """Versore uscente dal primo punto della polilinea, stimato sui primi DIRECTION_SPAN pixel."""
+        k = min(self.DIRECTION_SPAN, len(pts) - 1)
+        dx = float(pts[k][0] - pts[0][0])
+        dy = float(pts[k][1] - pts[0][1])
+        norm = math.hypot(dx, dy) or 1.0
+        return dx / norm, dy / norm
+
+    def _adjacent_nodes(self, labels, point):
+        x, y = int(point[0]), int(point[1])
+        window = labels[y - 1:y + 2, x - 1:x + 2]
+        return [int(n) for n in np.unique(window[window > 0])]
+
+    def _neighbour_labels(self, labels, points):
+        """Etichette dei nodi nel vicinato 3x3 di ogni punto: array (N, 9)."""
+        x, y = points[:, 0], points[:, 1]
+        return np.stack([labels[y + dy, x + dx] for dy in (-1, 0, 1) for dx in (-1, 0, 1)], axis=1)
+
+
+centerline_service = CenterlineService()
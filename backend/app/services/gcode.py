@@ -1,236 +1,568 @@
 import math
-import xml.etree.ElementTree as ET
-import re
 import os
+import io
+from dataclasses import dataclass, field, asdict
+from typing import Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.core.paths import PathArray, PathSet
+from app.services.path_ordering import path_ordering_service
+from app.services.travel_optimization import travel_optimization_service
+from app.services.metrics import metrics_service
+from app.services.simplification import simplification_service
+from app.services.svg_parser import svg_parser_service
+from app.services.motion import motion_planner_service
+
+@dataclass
+class GCodeSummary:
+    """Riepilogo compatto di un job G-code scritto in streaming (al posto del testo completo)."""
+    output_path: Optional[str] = None
+    lines: int = 0
+    bytes: int = 0
+    paths: int = 0
+    estimated_time_s: float = 0.0
+    # Bounding box in mm sul piano del plotter: (min_x, min_y, max_x, max_y)
+    bbox: Optional[Tuple[float, float, float, float]] = None
+    travel: dict = field(default_factory=dict)
+    # Semplificazione in mm (vuoto se non applicata): punti prima/dopo, rapporto e tolleranza
+    simplification: dict = field(default_factory=dict)
+    # Pianificazione del moto: tempi di disegno/spostamento/penna, distanze, velocità media
+    motion: dict = field(default_factory=dict)
+    # Modalità compatta (vuoto se non richiesta): righe/byte/punti del G-code standard e compatto
+    compaction: dict = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class PreparedPaths:
+    """Path filtrati e ordinati (in unità sorgente), pronti per trasformazione ed emissione."""
+    paths: PathArray
+    # Bounding box dei path in unità sorgente: (min_x, min_y, max_x, max_y)
+    bbox: Tuple[float, float, float, float]
+    # Valori "prima" dell'ottimizzazione del percorso (vuoto se non ottimizzati)
+    travel: dict = field(default_factory=dict)
+    # Statistiche della semplificazione in mm (vuoto se non applicata)
+    simplification: dict = field(default_factory=dict)
+
+
+@dataclass
+class Placement:
+    """Un disegno posizionato sul foglio (layout del composer): path preparati + posizione in mm."""
+    prepared: PreparedPaths
+    x_mm: float
+    y_mm: float
+    width_mm: float
+    height_mm: float
+    rotation: float = 0.0
+
 
 class GCodeService:
-    def generate_gcode(self, svg_path: str, target_x: float, target_y: float, 
+    # Escursione dell'asse Z a ogni pen up/down (vedi "G0 Z5" / "G1 Z0")
+    PEN_LIFT_MM = settings.PEN_LIFT_MM
+    # Dimensione del buffer di scrittura per i file .gcode
+    WRITE_BUFFER = 1 << 16
+
+    def generate_gcode(self, svg_path, target_x: float, target_y: float, 
                        target_width: float, target_height: float, rotation: float,
-                       draw_speed: int = 1200, travel_speed: int = 3000) -> str:
+                       draw_speed: int = 1200, travel_speed: int = 3000, **options) -> str:
         """
-        Genera GCode da un file SVG, lo ottimizza e lo salva su disco.
+        Genera GCode da un file SVG (o da un PathSet in memoria), lo ottimizza e lo salva su disco.
         """
-        
-        # 1. Parse SVG
-        raw_paths = self._parse_svg_paths(svg_path)
+        gcode_string, _ = self.generate_gcode_with_report(
+            svg_path, target_x, target_y, target_width, target_height, rotation,
+            draw_speed=draw_speed, travel_speed=travel_speed, **options
+        )
+        return gcode_string
+
+    def generate_gcode_with_report(self, svg_path, target_x: float, target_y: float,
+                                   target_width: float, target_height: float, rotation: float,
+                                   draw_speed: int = 1200, travel_speed: int = 3000, **options):
+        """
+        Come generate_gcode, ma restituisce anche un report con i G0 (in mm) e i pen lift
+        prima e dopo l'ottimizzazione opzionale del percorso (2-opt/Or-opt + unione tratti).
+        """
+        summary = GCodeSummary()
+        gcode_string = "".join(self.iter_gcode(
+            svg_path, target_x, target_y, target_width, target_height, rotation,
+            draw_speed=draw_speed, travel_speed=travel_speed, summary=summary, **options
+        ))
+        if not gcode_string:
+            return "", summary.travel
+
+        # --- SALVATAGGIO FILE ---
+        try:
+            # Crea il nome file .gcode partendo dal path dell'SVG
+            output_path = self._default_output_path(svg_path)
+            
+            with open(output_path, "w") as f:
+                f.write(gcode_string)
+            print(f"GCode salvato con successo: {output_path}")
+        except Exception as e:
+            print(f"Errore durante il salvataggio del GCode: {e}")
+
+        return gcode_string, summary.travel
+
+    def write_gcode(self, source, target_x: float, target_y: float,
+                    target_width: float, target_height: float, rotation: float,
+                    sink=None, **options) -> GCodeSummary:
+        """
+        Modalità streaming: scrive il G-code a blocchi direttamente sul sink senza mai
+        costruire il programma completo in memoria, e restituisce solo un GCodeSummary.
+        source: path di un file SVG oppure PathSet prodotto da VectorizationService.
+        sink: path di un file (default '<svg>.gcode'), oppure un oggetto con write()
+        (file, porta seriale) o sendall() (socket).
+        """
+        summary = GCodeSummary()
+        chunks = self.iter_gcode(source, target_x, target_y, target_width, target_height,
+                                 rotation, summary=summary, **options)
+        return self._write_chunks(chunks, summary, sink, default_sink=lambda: self._default_output_path(source))
+
+    def write_layout_gcode(self, placements, sink, **options) -> GCodeSummary:
+        """
+        Come write_gcode, ma per un layout di più disegni (lista di Placement) in un unico
+        programma: un solo header, un solo ritorno a casa e ordinamento globale dei path.
+        """
+        summary = GCodeSummary()
+        return self._write_chunks(self.iter_layout_gcode(placements, summary=summary, **options), summary, sink)
+
+    def _write_chunks(self, chunks, summary, sink, default_sink=None) -> GCodeSummary:
+        """Scrive i blocchi sul sink (path, oggetto con write() o sendall()); default_sink() se sink è None."""
+        # Prepariamo il primo blocco prima di aprire il sink: niente file vuoti se il job è vuoto
+        first = next(chunks, None)
+        if first is None:
+            return summary
+
+        if sink is None:
+            sink = default_sink()
+        # Il primo blocco ha già eseguito filtro e ordinamento: "emit" misura trasformazione e scrittura
+        with metrics_service.stage("emit") as info:
+            if isinstance(sink, (str, os.PathLike)):
+                summary.output_path = os.fspath(sink)
+                with open(sink, "wb", buffering=self.WRITE_BUFFER) as f:
+                    self._drain(first, chunks, f.write)
+                print(f"GCode salvato con successo: {summary.output_path}")
+            elif hasattr(sink, "sendall"):
+                self._drain(first, chunks, sink.sendall)
+            elif isinstance(sink, io.TextIOBase):
+                self._drain(first, chunks, sink.write, encode=False)
+            else:
+                self._drain(first, chunks, sink.write)
+            info.update(paths=summary.paths, lines=summary.lines, bytes=summary.bytes)
+        return summary
+
+    def prepare_paths(self, source, target_width: float, target_height: float,
+                      optimize_travel: bool = False, optimize_time_budget: float = 1.0,
+                      merge_tolerance: float = 0.1, tolerance_mm: Optional[float] = None) -> Optional["PreparedPaths"]:
+        """
+        Parte della pipeline che non dipende da posizione e rotazione: parse,
+        filtro rumore, bounding box, semplificazione, ordinamento e ottimizzazione opzionale.
+        Il risultato può essere messo in cache e riusato da iter_gcode/write_gcode.
+        La dimensione target serve alla semplificazione e all'ottimizzazione (distanze in mm).
+        tolerance_mm: se indicata, semplifica i path con questo scostamento massimo in mm
+        sul piano del plotter (mai sotto la risoluzione meccanica PLOTTER_RESOLUTION_MM).
+        """
+        # 1. Path in memoria (PathSet) oppure parse dell'SVG (curve appiattite in mm)
+        raw_paths = self._load_paths(source, target_width, target_height, tolerance_mm)
         if not raw_paths:
-            return ""
+            return None
 
         # --- OTTIMIZZAZIONE ---
         # A. Filtro Rumore: Rimuoviamo tratti minuscoli (es. < 0.3mm) che creano solo punti sporchi
-        filtered_paths = [p for p in raw_paths if self._path_length(p) > 0.3]
-        
-        # B. Ordinamento: Minimizziamo le "linee arancioni" (G0) cercando sempre il tratto più vicino
-        paths = self._sort_paths(filtered_paths)
+        with metrics_service.stage("filter") as info:
+            filtered_paths = raw_paths.select(raw_paths.lengths() > 0.3)
+            info.update(paths=len(filtered_paths), points=filtered_paths.point_count)
+        if not filtered_paths:
+            return None
 
-        # 2. Calcolo del Bounding Box originale
-        orig_min_x, orig_min_y, orig_max_x, orig_max_y = self._get_bounding_box(paths)
-        orig_width = orig_max_x - orig_min_x
-        orig_height = orig_max_y - orig_min_y
+        # 2. Calcolo del Bounding Box originale (non dipende dall'ordine dei path)
+        bbox = filtered_paths.bbox()
+        orig_width = bbox[2] - bbox[0]
+        orig_height = bbox[3] - bbox[1]
         
         if orig_width == 0 or orig_height == 0:
-             return ""
+             return None
 
-        scale_x = target_width / orig_width
-        scale_y = target_height / orig_height
-        
-        # 3. Generazione stringhe GCode
-        gcode = []
-        gcode.append("; --- Start of Job ---")
-        gcode.append("G21 ; Units in mm")
-        gcode.append("G90 ; Absolute positioning")
-        gcode.append(f"G0 Z5 F{travel_speed} ; Initial lift")
+        # Semplificazione con tolleranza assoluta: il bounding box resta quello dei path grezzi,
+        # così la scala (e quindi la posizione sul foglio) non dipende dalla tolleranza
+        simplification = {}
+        if tolerance_mm is not None:
+            with metrics_service.stage("simplify") as info:
+                tolerance_px = simplification_service.tolerance_px(bbox, target_width, target_height, tolerance_mm)
+                resolution_px = simplification_service.tolerance_px(
+                    bbox, target_width, target_height, settings.PLOTTER_RESOLUTION_MM
+                )
+                filtered_paths, simplification = simplification_service.simplify(
+                    filtered_paths, tolerance_px, min_step=resolution_px
+                )
+                simplification["tolerance_mm"] = max(tolerance_mm, settings.PLOTTER_RESOLUTION_MM)
+                info.update(paths=len(filtered_paths), points=simplification["points_after"])
+            print(f"Simplification: {simplification['points_before']} -> {simplification['points_after']} points "
+                  f"({simplification['reduction_ratio']}x, {simplification['tolerance_mm']} mm)")
+
+        # B. Ordinamento: Minimizziamo le "linee arancioni" (G0) cercando sempre il tratto più vicino
+        with metrics_service.stage("sort") as info:
+            paths = self._sort_paths(filtered_paths)
+            info["paths"] = len(paths)
+        # Stesso dtype della sorgente: float32 per i pixel del vettorizzatore, float64 per l'SVG
+        dtype = raw_paths.points.dtype
+        if not optimize_travel:
+            return PreparedPaths(paths=PathArray.from_paths(paths, dtype=dtype), bbox=bbox,
+                                 simplification=simplification)
+
+        # C. Raffinamento opzionale: 2-opt/Or-opt entro il budget e unione dei tratti che si toccano
+        scale = (target_width / orig_width, target_height / orig_height)
+        travel = {
+            "pen_lifts_before": len(paths),
+            "travel_before_mm": round(travel_optimization_service.travel_distance(paths, scale=scale), 2),
+        }
+        with metrics_service.stage("optimize") as info:
+            paths = travel_optimization_service.optimize(paths, scale=scale, time_budget=optimize_time_budget)
+            paths = travel_optimization_service.merge_paths(paths, merge_tolerance, scale=scale)
+            info["paths"] = len(paths)
+        return PreparedPaths(paths=PathArray.from_paths(paths, dtype=dtype), bbox=bbox, travel=travel,
+                             simplification=simplification)
+
+    def iter_gcode(self, source, target_x: float, target_y: float,
+                   target_width: float, target_height: float, rotation: float,
+                   draw_speed: int = 1200, travel_speed: int = 3000,
+                   optimize_travel: bool = False, optimize_time_budget: float = 1.0,
+                   merge_tolerance: float = 0.1, tolerance_mm: Optional[float] = None,
+                   adaptive_feed: bool = False, compact: bool = False, summary: Optional[GCodeSummary] = None):
+        """
+        Generatore di blocchi di testo G-code (header, un blocco per path, footer).
+        La concatenazione dei blocchi è identica all'output di generate_gcode.
+        source può anche essere un PreparedPaths (es. dalla cache): in quel caso restano
+        solo trasformazione ed emissione e le opzioni di ottimizzazione sono ignorate.
+        Se passato, `summary` viene aggiornato man mano che i blocchi vengono prodotti.
+        Il tempo stimato viene da MotionPlannerService (accelerazione e curve); con
+        adaptive_feed ogni G1 ha il proprio feedrate (più alto sui tratti lunghi e dritti).
+        compact: G-code compatto per le linee seriali lente (vedi _compact_paths e _iter_compact_body).
+        """
+        if summary is None:
+            summary = GCodeSummary()
+
+        if isinstance(source, PreparedPaths):
+            prepared = source
+        else:
+            prepared = self.prepare_paths(source, target_width, target_height, optimize_travel,
+                                          optimize_time_budget, merge_tolerance, tolerance_mm)
+        if prepared is None:
+            return
+
+        paths = prepared.paths
+        orig_min_x, orig_min_y, orig_max_x, orig_max_y = prepared.bbox
+        scale_x = target_width / (orig_max_x - orig_min_x)
+        scale_y = target_height / (orig_max_y - orig_min_y)
+        scale = (scale_x, scale_y)
+
+        # Senza ottimizzazione "prima" e "dopo" coincidono
+        travel_after = round(travel_optimization_service.travel_distance(paths, scale=scale), 2)
+        report = summary.travel
+        report["pen_lifts_before"] = prepared.travel.get("pen_lifts_before", len(paths))
+        report["travel_before_mm"] = prepared.travel.get("travel_before_mm", travel_after)
+        report["pen_lifts_after"] = len(paths)
+        report["travel_after_mm"] = travel_after
+        summary.simplification = dict(prepared.simplification)
+        print(f"Travel G0: {report['travel_before_mm']} mm -> {report['travel_after_mm']} mm, "
+              f"pen lifts: {report['pen_lifts_before']} -> {report['pen_lifts_after']}")
         
         center_x = (orig_min_x + orig_max_x) / 2
         center_y = (orig_min_y + orig_max_y) / 2
-        
-        rad = math.radians(rotation)
-        cos_a = math.cos(rad)
-        sin_a = math.sin(rad)
 
-        for path in paths:
-            first_point = True
-            for x, y in path:
-                # Trasformazione
-                tx = x - center_x
-                ty = y - center_y
-                sx = tx * scale_x
-                sy = ty * scale_y
-                rx = sx * cos_a - sy * sin_a
-                ry = sx * sin_a + sy * cos_a
-                
-                final_x = rx + target_x + (target_width / 2)
-                final_y = (ry * -1) + target_y + (target_height / 2) 
-                
-                if first_point:
-                    gcode.append(f"G0 X{final_x:.2f} Y{final_y:.2f} F{travel_speed}")
-                    gcode.append(f"G1 Z0 F{draw_speed}")
-                    first_point = False
-                else:
-                    gcode.append(f"G1 X{final_x:.2f} Y{final_y:.2f} F{draw_speed}")
-import math
-import xml.etree.ElementTree as ET
-import re
-import os
+        # Tutti i punti sono già in un unico array contiguo: la trasformazione è un'unica operazione batch
+        points, offsets = paths.points.astype(np.float64), paths.offsets.tolist()
+        final = self._transform_points(points, (center_x, center_y), scale, rotation,
+                                       (target_x, target_y), (target_width, target_height))
+        yield from self._iter_program(final, offsets, draw_speed, travel_speed, adaptive_feed, summary, compact)
 
-class GCodeService:
-    def generate_gcode(self, svg_path: str, target_x: float, target_y: float, 
-                       target_width: float, target_height: float, rotation: float,
-                       draw_speed: int = 1200, travel_speed: int = 3000) -> str:
+    def iter_layout_gcode(self, placements, draw_speed: int = 1200, travel_speed: int = 3000,
+                          optimize_travel: bool = False, optimize_time_budget: float = 1.0,
+                          merge_tolerance: float = 0.1, adaptive_feed: bool = False, compact: bool = False,
+                          summary: Optional[GCodeSummary] = None):
         """
-        Genera GCode da un file SVG, lo ottimizza e lo salva su disco.
+        Generatore di blocchi G-code per un layout di più disegni (lista di Placement).
+        I path di tutti i disegni vengono portati in mm sul piano del plotter e ordinati insieme
+        (nearest neighbor da (0, 0), più 2-opt/Or-opt e unione dei tratti se optimize_travel):
+        il plotter passa da un disegno all'altro senza tornare a casa e senza lunghi G0.
+        Il travel "prima" è quello dei disegni uno dopo l'altro, ciascuno nel proprio ordine.
         """
-        
-        # 1. Parse SVG
-        raw_paths = self._parse_svg_paths(svg_path)
-        if not raw_paths:
-            return ""
+        if summary is None:
+            summary = GCodeSummary()
+        placements = [p for p in placements if p.prepared is not None and len(p.prepared.paths)]
+        if not placements:
+            return
 
-        # --- OTTIMIZZAZIONE ---
-        # A. Filtro Rumore: Rimuoviamo tratti minuscoli (es. < 0.3mm) che creano solo punti sporchi
-        filtered_paths = [p for p in raw_paths if self._path_length(p) > 0.3]
-        
-        # B. Ordinamento: Minimizziamo le "linee arancioni" (G0) cercando sempre il tratto più vicino
-        paths = self._sort_paths(filtered_paths)
+        with metrics_service.stage("layout") as info:
+            # float64: i punti sono già le coordinate finali in mm, come in iter_gcode
+            sheet = PathArray.from_paths([path for p in placements for path in self._placement_paths(p)],
+                                         dtype=np.float64)
+            info.update(images=len(placements), paths=len(sheet), points=sheet.point_count)
 
-        # 2. Calcolo del Bounding Box originale
-        orig_min_x, orig_min_y, orig_max_x, orig_max_y = self._get_bounding_box(paths)
-        orig_width = orig_max_x - orig_min_x
-        orig_height = orig_max_y - orig_min_y
-        
-        if orig_width == 0 or orig_height == 0:
-             return ""
+        report = summary.travel
+        report["pen_lifts_before"] = len(sheet)
+        report["travel_before_mm"] = round(travel_optimization_service.travel_distance(sheet), 2)
+        with metrics_service.stage("sort") as info:
+            paths = self._sort_paths(sheet)
+            info["paths"] = len(paths)
+        if optimize_travel:
+            with metrics_service.stage("optimize") as info:
+                paths = travel_optimization_service.optimize(paths, time_budget=optimize_time_budget)
+                paths = travel_optimization_service.merge_paths(paths, merge_tolerance)
+                info["paths"] = len(paths)
+        paths = PathArray.from_paths(paths, dtype=np.float64)
+        report["pen_lifts_after"] = len(paths)
+        report["travel_after_mm"] = round(travel_optimization_service.travel_distance(paths), 2)
+        print(f"Travel G0 (layout, {len(placements)} images): {report['travel_before_mm']} mm -> "
+              f"{report['travel_after_mm']} mm, pen lifts: {report['pen_lifts_before']} -> {report['pen_lifts_after']}")
+
+        yield from self._iter_program(paths.points, paths.offsets.tolist(), draw_speed, travel_speed,
+                                      adaptive_feed, summary, compact)
+
+    def _placement_paths(self, placement):
+        """Path di un Placement in mm sul piano del plotter (stessa trasformazione di iter_gcode)."""
+        prepared = placement.prepared
+        min_x, min_y, max_x, max_y = prepared.bbox
+        scale = (placement.width_mm / (max_x - min_x), placement.height_mm / (max_y - min_y))
+        final = self._transform_points(prepared.paths.points.astype(np.float64),
+                                       ((min_x + max_x) / 2, (min_y + max_y) / 2), scale, placement.rotation,
+                                       (placement.x_mm, placement.y_mm), (placement.width_mm, placement.height_mm))
+        return np.split(final, prepared.paths.offsets[1:-1])
+
+    def _iter_program(self, final, offsets, draw_speed, travel_speed, adaptive_feed, summary, compact=False):
+        """Header, un blocco per path (punti già in mm sul plotter) e footer; aggiorna summary."""
+        if compact:
+            final, offsets = self._compact_paths(final, offsets, draw_speed, travel_speed, adaptive_feed, summary)
 
-        scale_x = target_width / orig_width
-        scale_y = target_height / orig_height
-        
         # 3. Generazione stringhe GCode
-        gcode = []
-        gcode.append("; --- Start of Job ---")
-        gcode.append("G21 ; Units in mm")
-        gcode.append("G90 ; Absolute positioning")
-        gcode.append(f"G0 Z5 F{travel_speed} ; Initial lift")
-        
-        center_x = (orig_min_x + orig_max_x) / 2
-        center_y = (orig_min_y + orig_max_y) / 2
+        if compact:
+            header = f"G21\nG90\nG0Z5F{travel_speed}"
+            summary.lines += 3
+        else:
+            header = "\n".join([
+                "; --- Start of Job ---",
+                "G21 ; Units in mm",
+                "G90 ; Absolute positioning",
+                f"G0 Z5 F{travel_speed} ; Initial lift",
+            ])
+            summary.lines += 4
+        summary.bytes += len(header)
+        yield header
         
-        rad = math.radians(rotation)
-        cos_a = math.cos(rad)
-        sin_a = math.sin(rad)
+        summary.paths = len(offsets) - 1
+        summary.bbox = tuple(round(float(v), 2) for v in (*final.min(axis=0), *final.max(axis=0)))
 
-        for path in paths:
-            first_point = True
-            for x, y in path:
-                # Trasformazione
-                tx = x - center_x
-                ty = y - center_y
-                sx = tx * scale_x
-                sy = ty * scale_y
-                rx = sx * cos_a - sy * sin_a
-                ry = sx * sin_a + sy * cos_a
-                
-                final_x = rx + target_x + (target_width / 2)
-                final_y = (ry * -1) + target_y + (target_height / 2) 
-                
-                if first_point:
-                    gcode.append(f"G0 X{final_x:.2f} Y{final_y:.2f} F{travel_speed}")
-                    gcode.append(f"G1 Z0 F{draw_speed}")
-                    first_point = False
-                else:
-                    gcode.append(f"G1 X{final_x:.2f} Y{final_y:.2f} F{draw_speed}")
-            
-            gcode.append(f"G0 Z5 F{travel_speed}")
-            
-        gcode.append("G28 X0 Y0 ; Home")
-        gcode.append("; --- End of Job ---")
-        
-        gcode_string = "\n".join(gcode)
+        # Stima dei tempi (ed eventuali feedrate per segmento) su tutti i movimenti del job
+        with metrics_service.stage("motion_plan") as info:
+            feeds, summary.motion = motion_planner_service.plan(
+                final, offsets, draw_speed, travel_speed, self.PEN_LIFT_MM, adaptive_feed=adaptive_feed
+            )
+            summary.estimated_time_s = summary.motion["estimated_time_s"]
+            info["estimated_time_s"] = summary.estimated_time_s
 
-        # --- SALVATAGGIO FILE ---
-        try:
-            # Crea il nome file .gcode partendo dal path dell'SVG
-            base_path, _ = os.path.splitext(svg_path)
-            output_path = f"{base_path}.gcode"
-            
-            with open(output_path, "w") as f:
-                f.write(gcode_string)
-            print(f"GCode salvato con successo: {output_path}")
-        except Exception as e:
-            print(f"Errore durante il salvataggio del GCode: {e}")
+        if compact:
+            yield from self._iter_compact_body(final, offsets, feeds, draw_speed, travel_speed, summary)
+            footer = "\nG28X0Y0"
+            summary.lines += 1
+        else:
+            yield from self._iter_body(final, offsets, feeds, draw_speed, travel_speed, adaptive_feed, summary)
+            footer = "\nG28 X0 Y0 ; Home\n; --- End of Job ---"
+            summary.lines += 2
+        summary.bytes += len(footer)
+        yield footer
 
-        return gcode_string
+        if compact:
+            report = summary.compaction
+            report.update(lines_after=summary.lines, bytes_after=summary.bytes,
+                          lines_reduction_ratio=round(report["lines_before"] / summary.lines, 2),
+                          bytes_reduction_ratio=round(report["bytes_before"] / summary.bytes, 2))
+            print(f"Compact G-code: {report['lines_before']} -> {report['lines_after']} lines, "
+                  f"{report['bytes_before']} -> {report['bytes_after']} bytes ({report['bytes_reduction_ratio']}x)")
+
+    def _iter_body(self, final, offsets, feeds, draw_speed, travel_speed, adaptive_feed, summary):
+        """Un blocco per path nel formato standard (tutte le parole su ogni riga, due decimali)."""
+        # Formattazione in blocco: un template per path riempito con una sola operazione '%'
+        move_template = f"\nG0 X%.2f Y%.2f F{travel_speed}\nG1 Z0 F{draw_speed}"
+        draw_template = "\nG1 X%.2f Y%.2f F%d" if adaptive_feed else f"\nG1 X%.2f Y%.2f F{draw_speed}"
+        lift = f"\nG0 Z5 F{travel_speed}"
+        for index, (start, end) in enumerate(zip(offsets[:-1], offsets[1:])):
+            block = final[start:end]
+            template = move_template + draw_template * (end - start - 1) + lift
+            if feeds is None:
+                values = block.ravel().tolist()
+            else:
+                # Segmenti del path i: i punti precedenti, meno un segmento per ogni path prima
+                segment = start - index
+                moves = np.column_stack([block[1:], feeds[segment:segment + end - start - 1]])
+                values = block[0].tolist() + moves.ravel().tolist()
+            chunk = template % tuple(values)
+
+            summary.lines += end - start + 2
+            summary.bytes += len(chunk)
+            yield chunk
+
+    def _compact_paths(self, final, offsets, draw_speed, travel_speed, adaptive_feed, summary):
+        """
+        Punti del G-code compatto: coordinate arrotondate alla precisione della macchina
+        (GCODE_DECIMALS), tratti allineati uniti entro GCODE_COLLINEAR_TOLERANCE_MM (Douglas-Peucker,
+        che su un tratto dritto lascia solo gli estremi) e movimenti più corti del passo
+        GCODE_MIN_STEP_MM scartati. Registra in summary.compaction righe e byte che avrebbe
+        il G-code standard dello stesso job, per il confronto (vedi _standard_size).
+        """
+        decimals = settings.GCODE_DECIMALS
+        lines_before, bytes_before = self._standard_size(final, offsets, draw_speed, travel_speed)
+
+        with metrics_service.stage("compact") as info:
+            paths, stats = simplification_service.simplify(
+                PathArray(np.round(final, decimals), np.asarray(offsets)),
+                settings.GCODE_COLLINEAR_TOLERANCE_MM, min_step=settings.GCODE_MIN_STEP_MM,
+            )
+            paths = PathArray.from_paths(paths, dtype=np.float64)
+            info.update(paths=len(paths), points=paths.point_count)
+
+        summary.compaction = {
+            "lines_before": lines_before,
+            "bytes_before": bytes_before,
+            "points_before": stats["points_before"],
+            "points_after": stats["points_after"],
+            "decimals": decimals,
+        }
+        return np.round(paths.points, decimals), paths.offsets.tolist()
+
+    def _standard_size(self, final, offsets, draw_speed, travel_speed):
+        """
+        Righe e byte del G-code standard (header, _iter_body, footer) per questi punti, contati
+        senza generarlo: per path una riga per punto più discesa e salita della penna, e per ogni
+        riga parti fisse più le coordinate '%.2f'. Con adaptive_feed la larghezza delle F è stimata
+        con quella di draw_speed (i feed pianificati hanno quasi sempre le stesse cifre).
+        """
+        points, paths = len(final), len(offsets) - 1
+        draw, travel = len(str(draw_speed)), len(str(travel_speed))
+        header_footer = len(f"; --- Start of Job ---\nG21 ; Units in mm\nG90 ; Absolute positioning\n"
+                            f"G0 Z5 F{travel_speed} ; Initial lift\nG28 X0 Y0 ; Home\n; --- End of Job ---")
+        # '\nG1 X' ' Y' ' F<draw>' per ogni punto; per path anche ' F<travel>\nG1 Z0 F' del primo punto
+        # (al posto della F di disegno resta quella) e '\nG0 Z5 F<travel>' della salita
+        fixed = points * (9 + draw) + paths * (16 + 2 * travel)
+        lines = points + 2 * paths + 6
+        return lines, int(_formatted_lengths(final, 2).sum()) + fixed + header_footer
+
+    def _iter_compact_body(self, final, offsets, feeds, draw_speed, travel_speed, summary):
+        """
+        Un blocco per path nel formato compatto: parole modali (G0/G1 e F) solo quando cambiano,
+        assi che non cambiano omessi, numeri senza zeri finali né spazi fra le parole
+        (accettato da Grbl e dai firmware compatibili, stesso programma del formato standard).
+        """
+        decimals = settings.GCODE_DECIMALS
+        state = {"motion": "G0", "feed": travel_speed}  # dopo l'header: G0 Z5 F<travel>
+        x = y = None
+
+        def line(motion, words, feed=None):
+            text = "".join(words)
+            if not text:
+                return ""  # nessun asse cambia (es. punti uguali dopo l'arrotondamento)
+            if feed is not None and feed != state["feed"]:
+                text += f"F{feed}"
+                state["feed"] = feed
+            if motion != state["motion"]:
+                text = motion + text
+                state["motion"] = motion
+            return "\n" + text
+
+        for index, (start, end) in enumerate(zip(offsets[:-1], offsets[1:])):
+            xs = [_format_number(v, decimals) for v in final[start:end, 0].tolist()]
+            ys = [_format_number(v, decimals) for v in final[start:end, 1].tolist()]
+            segment_feeds = [draw_speed] * (end - start - 1) if feeds is None else \
+                [int(f) for f in feeds[start - index:end - index - 1].tolist()]
+
+            parts = [line("G0", [f"X{xs[0]}" if xs[0] != x else "", f"Y{ys[0]}" if ys[0] != y else ""]),
+                     line("G1", ["Z0"], draw_speed)]
+            x, y = xs[0], ys[0]
+            for px, py, feed in zip(xs[1:], ys[1:], segment_feeds):
+                parts.append(line("G1", [f"X{px}" if px != x else "", f"Y{py}" if py != y else ""], feed))
+                x, y = px, py
+            parts.append(line("G0", ["Z5"], travel_speed))
+            chunk = "".join(parts)
+
+            summary.lines += chunk.count("\n")
+            summary.bytes += len(chunk)
+            yield chunk
+
+    def _drain(self, first, chunks, write, encode=True):
+        """Scrive sul sink il primo blocco e tutti i successivi, uno alla volta."""
+        write(first.encode("ascii") if encode else first)
+        for chunk in chunks:
+            write(chunk.encode("ascii") if encode else chunk)
+
+    def _default_output_path(self, source) -> str:
+        if isinstance(source, PathSet):
+            return f"{source.output_base}.gcode"
+        base_path, _ = os.path.splitext(source)
+        return f"{base_path}.gcode"
+
+    def _load_paths(self, source, target_width: float, target_height: float, tolerance_mm: Optional[float] = None):
+        """
+        Normalizza la sorgente in un PathArray.
+        Le curve di un SVG vengono appiattite con tolerance_mm sul piano del plotter
+        (default SIMPLIFY_TOLERANCE_MM), come la semplificazione dei path.
+        Le coordinate di un SVG (decimali, in unità utente) restano float64: in float32
+        l'arrotondamento a 0.01 mm del G-code cambierebbe su alcuni punti.
+        """
+        if isinstance(source, PathSet):
+            return PathArray.from_paths(source.paths)
+        with metrics_service.stage("svg_parse") as info:
+            paths = PathArray.from_paths(svg_parser_service.parse(
+                source, target_size=(target_width, target_height), tolerance_mm=tolerance_mm, info=info
+            ), dtype=np.float64)
+            info.update(paths=len(paths), points=paths.point_count)
+        return paths
 
     def _sort_paths(self, paths):
         """
         Algoritmo 'Nearest Neighbor' con inversione del percorso.
+        Delegato all'indice spaziale di PathOrderingService (stesso risultato, senza il loop O(n²)).
         """
-        if not paths: return []
-        sorted_p = []
-        current_pos = (0, 0)
-        remaining = paths[:]
-        
-        while remaining:
-            best_idx = -1
-            min_d = float('inf')
-            should_reverse = False
-            
-            for i, p in enumerate(remaining):
-                # Distanza dall'inizio del path
-                start = p[0]
-                d_start = math.sqrt((start[0]-current_pos[0])**2 + (start[1]-current_pos[1])**2)
-                
-                # Distanza dalla fine del path
-                end = p[-1]
-                d_end = math.sqrt((end[0]-current_pos[0])**2 + (end[1]-current_pos[1])**2)
-                
-                if d_start < min_d:
-                    min_d = d_start
-                    best_idx = i
-                    should_reverse = False
-                
-                if d_end < min_d:
-                    min_d = d_end
-                    best_idx = i
-                    should_reverse = True
-            
-            p_to_add = remaining.pop(best_idx)
-            
-            if should_reverse:
-                p_to_add = p_to_add[::-1]
-                
-            sorted_p.append(p_to_add)
-            current_pos = p_to_add[-1]
-            
-        return sorted_p
+        return path_ordering_service.sort_paths(paths)
 
-    def _path_length(self, path):
-        length = 0
-        for i in range(1, len(path)):
-            length += math.sqrt((path[i][0]-path[i-1][0])**2 + (path[i][1]-path[i-1][1])**2)
-        return length
+    def _transform_points(self, points, center, scale, rotation, target, target_size):
+        """
+        Trasla, scala, ruota e ribalta Y di tutti i punti in un colpo solo.
+        Le operazioni sono elemento per elemento e nello stesso ordine del vecchio loop
+        per punto, così gli arrotondamenti (e quindi il G-code) restano identici.
+        """
+        rad = math.radians(rotation)
+        cos_a = math.cos(rad)
+        sin_a = math.sin(rad)
+
+        sx = (points[:, 0] - center[0]) * scale[0]
+        sy = (points[:, 1] - center[1]) * scale[1]
+        rx = sx * cos_a - sy * sin_a
+        ry = sx * sin_a + sy * cos_a
+
+        final = np.empty_like(points)
+        final[:, 0] = rx + target[0] + (target_size[0] / 2)
+        final[:, 1] = (ry * -1) + target[1] + (target_size[1] / 2)
+        return final
+
+def _formatted_lengths(values: np.ndarray, decimals: int) -> np.ndarray:
+    """Lunghezza di '%.*f' % (decimals, v) per ogni valore, senza formattarli tutti."""
+    magnitude = np.abs(values)
+    digits = np.floor(np.log10(np.maximum(magnitude, 1.0))).astype(np.int64) + 1
+    lengths = digits + (decimals + 1 if decimals else 0) + np.signbit(values)
+    # Vicino a una potenza di 10 l'arrotondamento può aggiungere una cifra (9.996 -> '10.00'):
+    # quei pochi valori vengono formattati davvero
+    near = (10.0 ** digits - magnitude <= 10.0 ** -decimals) | (magnitude - 10.0 ** (digits - 1) <= 10.0 ** -decimals)
+    for index in zip(*np.nonzero(near)):
+        lengths[index] = len("%.*f" % (decimals, values[index]))
+    return lengths
+
+
+def _format_number(value: float, decimals: int) -> str:
+    """Numero con al massimo `decimals` decimali, senza zeri finali: 12.50 -> '12.5', 3.00 -> '3'."""
+    text = "%.*f" % (decimals, value)
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
 
-    def _parse_svg_paths(self, svg_path: str):
-        try:
-            tree = ET.parse(svg_path)
-            root = tree.getroot()
-            ns = {'svg': 'http://www.w3.org/2000/svg'}
-            paths = []
-            elements = root.findall('.//svg:path', ns) + root.findall('.//path')
-            for elem in elements:
-                d = elem.get('d')
-                if not d: continue
-                nums = re.findall(r"[-+]?\d*\.\d+|\d+", d)
-                pts = []
-                for i in range(0, len(nums), 2):
-                    if i+1 < len(nums):
-                        pts.append((float(nums[i]), float(nums[i+1])))
-                if pts: paths.append(pts)
-            return paths
-        except: return []
-
-    def _get_bounding_box(self, paths):
-        all_x = [p[0] for path in paths for p in path]
-        all_y = [p[1] for path in paths for p in path]
-        return min(all_x), min(all_y), max(all_x), max(all_y)
 
 gcode_service = GCodeService()
\ No newline at end of file
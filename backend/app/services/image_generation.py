@@ -1,44 +1,177 @@
-from openai import AsyncOpenAI
+import asyncio
 import base64
-import time
+import hashlib
+import json
 import os
+import random
+
 from app.core.config import settings
 from app.core.prompts import PLOTTER_SYSTEM_PROMPT, PRESET_SIMPLE, PRESET_COMPLEX
+from app.services.artifacts import artifact_store
+
+
+def _sdk():
+    """
+    SDK OpenAI e httpx, importati al primo uso: il solo import dell'SDK vale più di metà
+    dell'avvio del server (vedi benchmarks/bench_startup.py).
+    """
+    import httpx
+    import openai
+    return openai, httpx
+
+
+def _retryable():
+    """Errori transitori: limiti di frequenza, 5xx, timeout e connessioni cadute (anche nel download)."""
+    openai, httpx = _sdk()
+    return openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError, httpx.TransportError
+
 
 class ImageGenerationService:
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        self.model = "gpt-image-1-mini"
+    """
+    Gateway verso l'API di generazione immagini (/generate).
+
+    - Al massimo max_concurrency richieste in volo verso l'API, su un solo client (pool di
+      connessioni keep-alive) con timeout_s per richiesta.
+    - Gli errori transitori sono ritentati fino a max_retries volte con backoff esponenziale
+      a jitter pieno (rispettando Retry-After), così i client in attesa non ripartono insieme.
+    - Richieste identiche (stesso prompt completo, modello e dimensione) già in volo non
+      vengono ripetute: chi arriva dopo attende lo stesso risultato.
+    - Le immagini generate restano fra gli artefatti (ArtifactStoreService, scritte fuori
+      dall'event loop) con un nome derivato dal prompt: la stessa richiesta non viene più
+      pagata finché la quota o il TTL dello store non la eliminano.
+    base_url punta l'API altrove (es. MockImageEndpoint per test e benchmark).
+    SDK e client sono caricati al primo uso (fuori dall'event loop) o da preload() nel warm-up.
+    """
+
+    def __init__(self, api_key: str, base_url: str, model: str, size: str, store,
+                 max_concurrency: int, max_retries: int, timeout_s: float, backoff_s: float):
+        self.api_key = api_key
+        self.base_url = base_url or None
+        self.model = model
+        self.size = size
+        self.store = store
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout_s = timeout_s
+        self.backoff_s = backoff_s
+
+        # Creati al primo uso, nel loop di asyncio che li usa
+        self._client = None
+        self._http = None
+        self._semaphore = None
+        self._inflight = {}  # chiave -> asyncio.Task della generazione in corso
+        self.stats = {"requests": 0, "cache_hits": 0, "coalesced": 0, "upstream_calls": 0,
+                      "retries": 0, "failures": 0}
 
     async def generate_image(self, prompt: str, complexity: str = "simple") -> str:
+        """Restituisce l'URL locale (/static/...) dell'immagine generata per prompt e complessità."""
         preset_prompt = PRESET_SIMPLE if complexity == "simple" else PRESET_COMPLEX
-        full_prompt = f"{PLOTTER_SYSTEM_PROMPT}\nDensity: {preset_prompt}\nSubject to draw: {prompt}"
-        
-        try:
-            response = await self.client.images.generate(
-                model=self.model,
-                prompt=full_prompt,
-                n=1,
-                size="1024x1024"
-            )
-            
-            image_url = response.data[0].url
-            
-            # Handle base64 response if URL is missing
-            if image_url is None and response.data[0].b64_json:
-                timestamp = int(time.time() * 1000)
-                filename = f"generated_{timestamp}.png"
-                file_path = os.path.join("app/static", filename)
-                
-                image_data = base64.b64decode(response.data[0].b64_json)
-                with open(file_path, "wb") as f:
-                    f.write(image_data)
-                
-                return f"/static/{filename}"
-            
-            return image_url
-        except Exception as e:
-            print(f"Error generating image: {e}")
-            raise e
-
-image_generation_service = ImageGenerationService()
+        full_prompt = f"{PLOTTER_SYSTEM_PROMPT}\nDensity: {preset_prompt}\nSubject to draw: {prompt.strip()}"
+
+        key = self.cache_key(full_prompt)
+        file_path = self.store.path(key, ".png")
+        self.stats["requests"] += 1
+
+        if await self.store.atouch(file_path):
+            self.stats["cache_hits"] += 1
+            print(f"Generazione: {os.path.basename(file_path)} dalla cache")
+            return self.store.url(file_path)
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._generate(full_prompt, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        else:
+            self.stats["coalesced"] += 1
+        # shield: se il client che ha avviato la generazione si disconnette, gli altri la ricevono lo stesso
+        await asyncio.shield(task)
+        return self.store.url(file_path)
+
+    def cache_key(self, full_prompt: str) -> str:
+        payload = json.dumps([self.model, self.size, full_prompt])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def preload(self):
+        """Importa SDK e httpx senza creare il client (warm-up dopo l'avvio)."""
+        _sdk()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+        if self._http is not None:
+            await self._http.aclose()
+        self._client = self._http = None
+
+    # --- Generazione ---
+
+    async def _generate(self, full_prompt, key):
+        image_data = await self._request(full_prompt)
+        await self.store.awrite_bytes(key, ".png", image_data)
+
+    async def _request(self, full_prompt) -> bytes:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        for attempt in range(self.max_retries + 1):
+            try:
+                # Il semaforo è tenuto solo durante la richiesta, non durante l'attesa del backoff
+                async with self._semaphore:
+                    self.stats["upstream_calls"] += 1
+                    return await self._fetch(full_prompt)
+            except _retryable() as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+                self.stats["retries"] += 1
+                print(f"Generazione: {type(e).__name__}, nuovo tentativo tra {delay:.2f}s "
+                      f"({attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+
+    async def _fetch(self, full_prompt) -> bytes:
+        if self._client is None:
+            # Import dell'SDK (centinaia di ms) in un thread, per non fermare l'event loop
+            openai, _ = await asyncio.to_thread(_sdk)
+            # I tentativi li gestiamo noi (con il semaforo libero durante l'attesa)
+            self._client = openai.AsyncOpenAI(api_key=self.api_key, base_url=self.base_url,
+                                              timeout=self.timeout_s, max_retries=0)
+        response = await self._client.images.generate(model=self.model, prompt=full_prompt, n=1, size=self.size)
+        item = response.data[0]
+        if item.b64_json:
+            return base64.b64decode(item.b64_json)
+
+        # Modelli che rispondono con un URL (temporaneo): scarichiamo l'immagine per tenerla in cache
+        if self._http is None:
+            _, httpx = _sdk()
+            self._http = httpx.AsyncClient(timeout=self.timeout_s,
+                                           limits=httpx.Limits(max_connections=self.max_concurrency))
+        download = await self._http.get(item.url)
+        download.raise_for_status()
+        return download.content
+
+    def _backoff(self, attempt, error) -> float:
+        delay = random.uniform(0.0, self.backoff_s * 2 ** attempt)
+        if isinstance(error, _sdk()[0].APIStatusError):
+            try:
+                delay = max(delay, float(error.response.headers.get("retry-after", 0)))
+            except ValueError:
+                pass  # Retry-After come data HTTP: ci basta il backoff
+        return delay
+
+    def _finished(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["failures"] += 1
+            print(f"Error generating image: {task.exception()}")
+
+
+image_generation_service = ImageGenerationService(
+    api_key=settings.OPENAI_API_KEY,
+    base_url=settings.OPENAI_BASE_URL,
+    model=settings.GENERATION_MODEL,
+    size=settings.GENERATION_SIZE,
+    store=artifact_store,
+    max_concurrency=settings.GENERATION_CONCURRENCY,
+    max_retries=settings.GENERATION_MAX_RETRIES,
+    timeout_s=settings.GENERATION_TIMEOUT_S,
+    backoff_s=settings.GENERATION_BACKOFF_S,
+)
@@ -0,0 +1,128 @@
+import base64
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockImageEndpoint:
+    """
+    Endpoint locale compatibile con POST /v1/images/generations, per provare ImageGenerationService
+    senza chiave né costi: ogni risposta arriva dopo latency_s e una frazione error_rate delle
+    richieste fallisce con 429 (con Retry-After) o 500, come fanno i limiti dell'API vera.
+    L'immagine restituita (b64_json) è un PNG in bianco e nero ricavato dal prompt, quindi
+    prompt uguali danno immagini uguali.
+    responses: stato HTTP d'errore forzato per l'n-esima richiesta (da 1, es. {1: 429, 2: 400}),
+    per i test che devono sapere quale richiesta fallisce.
+    stats: richieste ricevute, errori iniettati e picco di richieste contemporanee.
+    """
+
+    def __init__(self, latency_s: float = 0.0, error_rate: float = 0.0, size: int = 64, seed: int = 0,
+                 responses: dict = None):
+        self.latency_s = latency_s
+        self.error_rate = error_rate
+        self.size = size
+        self.responses = responses or {}
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._server = None
+        self.stats = {"requests": 0, "errors": 0, "peak_concurrency": 0}
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Avvia il server in un thread e restituisce il base_url da passare al client."""
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, come l'API vera
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                status, payload, headers = endpoint._handle(self.path, body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = _Server((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}/v1"
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _handle(self, path, body):
+        if not path.rstrip("/").endswith("/images/generations"):
+            return 404, {"error": {"message": f"Unknown path {path}", "type": "invalid_request_error"}}, {}
+
+        with self._lock:
+            self.stats["requests"] += 1
+            self._active += 1
+            self.stats["peak_concurrency"] = max(self.stats["peak_concurrency"], self._active)
+            roll = self._random.random()
+            status = self.responses.get(self.stats["requests"])
+        if status is None and roll < self.error_rate:
+            status = 429 if roll < self.error_rate / 2 else 500
+        try:
+            time.sleep(self.latency_s)
+            if status is not None:
+                with self._lock:
+                    self.stats["errors"] += 1
+                if status == 429:
+                    return 429, {"error": {"message": "Rate limit reached", "type": "requests"}}, {"Retry-After": "0"}
+                if status >= 500:
+                    return status, {"error": {"message": "Internal server error", "type": "server_error"}}, {}
+                return status, {"error": {"message": "Invalid request", "type": "invalid_request_error"}}, {}
+            image = _render_png(body.get("prompt", ""), self.size)
+            return 200, {"created": int(time.time()),
+                         "data": [{"b64_json": base64.b64encode(image).decode()}]}, {}
+        finally:
+            with self._lock:
+                self._active -= 1
+
+
+class _Server(ThreadingHTTPServer):
+    # Coda di connessioni ampia: senza limite lato client arrivano tutte le richieste insieme
+    request_queue_size = 256
+    daemon_threads = True
+
+
+def _render_png(prompt: str, size: int) -> bytes:
+    """PNG in scala di grigi, bianco con qualche linea nera deterministica per il prompt."""
+    seed = int.from_bytes(hashlib.sha256(prompt.encode()).digest()[:8], "big")
+    rng = random.Random(seed)
+    pixels = [bytearray(b"\xff" * size) for _ in range(size)]
+    for _ in range(4):
+        if rng.random() < 0.5:
+            row = rng.randrange(size)
+            pixels[row][:] = b"\x00" * size
+        else:
+            column = rng.randrange(size)
+            for row in pixels:
+                row[column] = 0
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    raw = b"".join(b"\x00" + bytes(row) for row in pixels)
+    return b"".join([
+        b"\x89PNG\r\n\x1a\n",
+        chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 0, 0, 0, 0)),
+        chunk(b"IDAT", zlib.compress(raw)),
+        chunk(b"IEND", b""),
+    ])
@@ -0,0 +1,102 @@
+import os
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.core.paths import PathSet
+from app.services.metrics import metrics_service
+from app.services.processing import processing_service
+from app.services.vectorization import vectorization_service
+
+
+class ImagePipeline:
+    """
+    Catena in memoria Processing -> Vectorization: le immagini intermedie passano da uno
+    stadio all'altro come array NumPy, senza codifica/decodifica PNG su disco.
+
+        image = ImagePipeline.from_file(path).preprocess().vectorize()
+        image.path_set  # PathSet pronto per GCodeService
+
+    In modalità debug ogni stadio salva anche il proprio artefatto
+    ('<nome>_binary.png', '<nome>_processed.png', '<nome>.svg'), elencati in `artifacts`.
+    """
+
+    def __init__(self, gray: np.ndarray = None, source_path: str = None,
+                 debug: bool = None, debug_dir: str = None):
+        self.gray = gray
+        self.source_path = source_path
+        self.debug = settings.DEBUG_ARTIFACTS if debug is None else debug
+        self.debug_dir = debug_dir if debug_dir is not None else settings.DEBUG_DIR
+
+        self.mask = None
+        self.skeleton = None
+        self.path_set = None
+        self.artifacts = []
+
+    @classmethod
+    def from_file(cls, input_path: str, **options) -> "ImagePipeline":
+        """L'immagine viene decodificata solo quando serve (non se lo scheletro arriva dalla cache)."""
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(f"Image not found: {input_path}")
+        return cls(source_path=input_path, **options)
+
+    @classmethod
+    def from_array(cls, img: np.ndarray, source_path: str = None, **options) -> "ImagePipeline":
+        """img: immagine già decodificata, in scala di grigi oppure BGR (come cv2.imread)."""
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return cls(gray=img, source_path=source_path, **options)
+
+    def load(self) -> "ImagePipeline":
+        if self.gray is None:
+            self.gray = processing_service.load_image(self.source_path)
+        return self
+
+    def preprocess(self, scale: float = 1.0, kernel_size: int = 3) -> "ImagePipeline":
+        """
+        Binarizzazione e scheletro (ProcessingService) sull'immagine in memoria, ridotta prima
+        al fattore scale (vedi ProcessingService.working_resolution per scala e kernel_size).
+        """
+        self.load()
+        gray = processing_service.downsample(self.gray, scale)
+        self.mask = processing_service.binarize(gray, kernel_size)
+        self.skeleton = processing_service.skeletonize_mask(self.mask)
+        if self.debug:
+            self._write_image("binary", self.mask)
+            self._write_image("processed", self.skeleton)
+        return self
+
+    def with_skeleton(self, skeleton: np.ndarray) -> "ImagePipeline":
+        """Usa uno scheletro già calcolato (es. dalla cache) al posto di preprocess()."""
+        self.skeleton = skeleton
+        return self
+
+    def vectorize(self, epsilon_coeff: float = 0.002) -> "ImagePipeline":
+        """Estrae i path dallo scheletro (VectorizationService), calcolandolo se manca."""
+        if self.skeleton is None:
+            self.preprocess()
+        self.path_set = vectorization_service.extract_paths_from_image(
+            self.skeleton, epsilon_coeff, source_path=self.source_path
+        )
+        if self.debug:
+            with metrics_service.stage("debug_write"):
+                self.artifacts.append(self.path_set.write_svg(f"{self._debug_base()}.svg"))
+        return self
+
+    def _debug_base(self) -> str:
+        stem = os.path.splitext(os.path.basename(self.source_path or "image"))[0]
+        directory = self.debug_dir or os.path.dirname(self.source_path or "") or "."
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, stem)
+
+    def _write_image(self, suffix: str, img: np.ndarray):
+        with metrics_service.stage("debug_write"):
+            path = f"{self._debug_base()}_{suffix}.png"
+            cv2.imwrite(path, img)
+            self.artifacts.append(path)
+
+
+def run_image_pipeline(input_path: str, epsilon_coeff: float = 0.002, debug: bool = None) -> PathSet:
+    """Scorciatoia: immagine su disco -> PathSet, tutto in memoria."""
+    return ImagePipeline.from_file(input_path, debug=debug).vectorize(epsilon_coeff).path_set
@@ -0,0 +1,285 @@
+import functools
+import importlib
+import multiprocessing
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.core.config import settings
+from app.services.artifacts import artifact_store
+from app.services.metrics import metrics_service
+
+
+class QueueFullError(Exception):
+    """La coda ha già il numero massimo di job in attesa/esecuzione (backpressure)."""
+
+
+# --- Lato worker ---
+
+# Coda verso il processo principale, impostata dall'initializer del pool
+_progress_queue = None
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def _report_stage(job_id, stage, status, info):
+    if _progress_queue is not None:
+        _progress_queue.put((job_id, stage, status, time.time(), dict(info)))
+
+
+def _resolve(fn):
+    """fn oppure, per 'modulo:funzione', la funzione importata nel worker."""
+    if not isinstance(fn, str):
+        return fn
+    module, name = fn.split(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def _preload(target):
+    """Task di warm-up: esegue target nel worker e restituisce quanto ha impiegato."""
+    start = time.perf_counter()
+    _resolve(target)()
+    return time.perf_counter() - start
+
+
+def _execute(job_id, fn, args, kwargs):
+    """
+    Eseguito nel processo worker: inoltra lo stato degli stadi al processo principale
+    e lo restituisce anche insieme al risultato (gli eventi in coda possono arrivare dopo).
+    """
+    stages = {}
+    fn = _resolve(fn)
+
+    def on_stage(stage, status, info):
+        stages.setdefault(stage, {}).update(info, status=status)
+        _report_stage(job_id, stage, status, info)
+
+    started_at = time.time()
+    _report_stage(job_id, None, "running", {})
+    try:
+        return {"result": fn(*args, on_stage=on_stage, **kwargs), "stages": stages, "started_at": started_at}
+    except Exception as e:
+        traceback.print_exc()
+        return {"error": str(e) or type(e).__name__, "stages": stages, "started_at": started_at}
+
+
+# --- Lato server ---
+
+class JobQueueService:
+    """
+    Coda asincrona dei job CPU-bound (es. /print) su un process pool limitato.
+    Ogni job ha un ID, uno stato (queued/running/done/failed), lo stato e i tempi
+    dei singoli stadi e il risultato. Oltre `max_pending` job attivi submit() fallisce
+    con QueueFullError, così una raffica di richieste non sovraccarica la macchina.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, history: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.history = history
+
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._executor = None
+        self._progress_queue = None
+        self._listener = None
+
+    def submit(self, kind: str, fn, *args, **kwargs) -> dict:
+        """
+        Accoda fn(*args, on_stage=..., **kwargs) nel pool e restituisce subito il job.
+        fn deve essere una funzione a livello di modulo (picklabile) che accetta on_stage,
+        oppure 'modulo:funzione': in quel caso il modulo viene importato solo nel worker
+        (il server non carica la pipeline e le sue dipendenze).
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"Too many pending jobs ({self._pending}/{self.max_pending})")
+            self._pending += 1
+
+            job_id = uuid.uuid4().hex
+            job = {
+                "id": job_id,
+                "kind": kind,
+                "status": "queued",
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "duration_s": None,
+                "stages": {},
+                "result": None,
+                "error": None,
+                # Durata prevista della stampa (MotionPlannerService), per pianificare il plotter
+                "estimated_plot_s": None,
+            }
+            self._jobs[job_id] = job
+            self._trim_history()
+
+        try:
+            executor = self._get_executor()
+            future = executor.submit(_execute, job_id, fn, args, kwargs)
+        except Exception as e:
+            self._finish(job_id, error=str(e))
+            raise
+        future.add_done_callback(functools.partial(self._on_done, job_id, executor))
+        return self.get(job_id)
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {**job, "stages": {k: dict(v) for k, v in job["stages"].items()}}
+
+    def list_jobs(self, limit: int = 50):
+        with self._lock:
+            ids = list(self._jobs)[-limit:]
+        return [self.get(job_id) for job_id in reversed(ids)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+            }
+
+    def warm_up(self, target: str) -> list:
+        """
+        Avvia tutti i worker del pool ed esegue in ognuno target ('modulo:funzione', es. gli
+        import della pipeline), così il primo job non paga l'avvio. Un task per worker, inviati
+        insieme: il pool avvia un nuovo processo solo se non ne trova uno libero.
+        Restituisce i secondi impiegati da ogni worker; non conta come job.
+        """
+        executor = self._get_executor()
+        futures = [executor.submit(_preload, target) for _ in range(self.max_workers)]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            listener = self._detach_listener()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._stop_listener(*listener)
+
+    # --- Interni ---
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # 'spawn' evita di fare fork di un server con thread attivi
+                ctx = multiprocessing.get_context("spawn")
+                self._progress_queue = ctx.Queue()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=ctx,
+                    initializer=_init_worker,
+                    initargs=(self._progress_queue,),
+                )
+                self._listener = threading.Thread(
+                    target=self._listen, args=(self._progress_queue,), daemon=True
+                )
+                self._listener.start()
+            return self._executor
+
+    def _listen(self, queue):
+        """Thread del processo principale che applica gli aggiornamenti di stato dei worker."""
+        while True:
+            event = queue.get()
+            if event is None:
+                break
+            job_id, stage, status, timestamp, info = event
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job["status"] in ("done", "failed"):
+                    continue
+                if stage is None:
+                    job["status"] = "running"
+                    job["started_at"] = timestamp
+                else:
+                    entry = job["stages"].setdefault(stage, {})
+                    entry.update(info, status=status)
+
+    def _detach_listener(self):
+        """Coda di progresso e listener del pool corrente, staccati dal servizio (con il lock)."""
+        queue, self._progress_queue = self._progress_queue, None
+        listener, self._listener = self._listener, None
+        return queue, listener
+
+    @staticmethod
+    def _stop_listener(queue, listener):
+        """Ferma il listener (sentinella None) e aspetta che abbia applicato gli ultimi eventi."""
+        if queue is not None:
+            queue.put(None)
+        if listener is not None:
+            listener.join(timeout=5.0)
+
+    def _on_done(self, job_id, executor, future):
+        if future.cancelled():
+            self._finish(job_id, error="Job cancelled")
+            return
+        error = future.exception()
+        if error is not None:
+            if isinstance(error, BrokenProcessPool):
+                # Un worker è morto (es. OOM): il pool va ricreato al prossimo submit, con una coda
+                # e un listener nuovi. Solo il primo job del pool rotto lo scarta (falliscono tutti)
+                listener = (None, None)
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+                        listener = self._detach_listener()
+                self._stop_listener(*listener)
+            self._finish(job_id, error=str(error) or type(error).__name__)
+            return
+        outcome = future.result()
+        self._finish(job_id, result=outcome.get("result"), error=outcome.get("error"),
+                     stages=outcome["stages"], started_at=outcome["started_at"])
+
+    def _finish(self, job_id, result=None, error=None, stages=None, started_at=None):
+        with self._lock:
+            self._pending -= 1
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            now = time.time()
+            job["finished_at"] = now
+            job["duration_s"] = round(now - job["created_at"], 3)
+            if stages is not None:
+                job["stages"] = stages
+            if started_at is not None:
+                job["started_at"] = started_at
+            if error is None:
+                job["status"] = "done"
+                job["result"] = result
+                job["estimated_plot_s"] = (result or {}).get("estimated_time_s")
+            else:
+                job["status"] = "failed"
+                job["error"] = error
+                print(f"Job {job_id} failed: {error}")
+        metrics_service.observe_job(job["kind"], job["status"], job["duration_s"], (result or {}).get("metrics"))
+        if error is None:
+            # Il G-code l'ha scritto il worker: la quota degli artefatti la controlla il server
+            artifact_store.note_written((result or {}).get("bytes") or 0)
+
+    def _trim_history(self):
+        # Dimentichiamo i job conclusi più vecchi oltre il limite della history
+        excess = len(self._jobs) - self.history
+        if excess <= 0:
+            return
+        for job_id in [j for j, job in self._jobs.items() if job["status"] in ("done", "failed")][:excess]:
+            del self._jobs[job_id]
+
+
+job_queue_service = JobQueueService(
+    max_workers=settings.JOB_WORKERS,
+    max_pending=settings.JOB_QUEUE_SIZE,
+    history=settings.JOB_HISTORY,
+)
@@ -0,0 +1,233 @@
+import contextvars
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from app.core.config import settings
+
+try:
+    import resource  # non disponibile su Windows
+except ImportError:
+    resource = None
+
+# Raccoglitore degli stadi del job corrente (per thread/processo, via contextvars)
+_current_recorder = contextvars.ContextVar("metrics_recorder", default=None)
+
+# Bucket (in secondi) degli istogrammi di durata esposti su /metrics
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class StageRecorder:
+    """Misure dei singoli stadi di un job: tempo, path/punti e picco di memoria."""
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name: str):
+        info = {}
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            record = {"stage": name, "duration_s": round(time.perf_counter() - start, 6)}
+            record.update(info)
+            if tracing:
+                record["memory_peak_bytes"] = max(tracemalloc.get_traced_memory()[1] - base, 0)
+            if resource is not None:
+                # ru_maxrss è in KB su Linux: è il massimo del processo, non del solo stadio
+                record["rss_max_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            self.stages.append(record)
+
+
+class MetricsService:
+    """
+    Strumentazione della pipeline di stampa.
+    - Nei worker: stage() misura i singoli passi (load, blur/threshold, morfologia, scheletro,
+      findContours, approxPolyDP, SVG, filtro, ordinamento, emissione) del job corrente.
+    - Nel server: observe_job() aggrega le misure dei job conclusi e render() le espone
+      in formato testo Prometheus su /metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stage_durations = {}  # stage -> [bucket counts..., sum, count]
+        self._stage_counters = {}  # (stage, "paths"/"points") -> totale
+        self._stage_memory = {}  # stage -> ultimo picco di memoria in byte
+        self._job_durations = {}  # kind -> [bucket counts..., sum, count]
+        self._jobs_total = {}  # (kind, status) -> numero di job
+
+    # --- Lato worker ---
+
+    @contextmanager
+    def collect(self):
+        """Attiva un StageRecorder per il job corrente e lo restituisce."""
+        if settings.METRICS_TRACE_MEMORY and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        recorder = StageRecorder()
+        token = _current_recorder.set(recorder)
+        try:
+            yield recorder
+        finally:
+            _current_recorder.reset(token)
+
+    def stage(self, name: str):
+        """
+        Misura uno stadio del job corrente. Il dict restituito dal context manager
+        accetta contatori extra (es. paths=..., points=...). Senza job attivo non registra nulla.
+        """
+        recorder = _current_recorder.get()
+        if recorder is None:
+            return _null_stage()
+        return recorder.stage(name)
+
+    @contextmanager
+    def profile(self, name: str, force: bool = False):
+        """
+        Profilazione opt-in di un job: attiva se force=True (richiesta esplicita) oppure se è
+        impostato PLOTTER_PROFILE_SLOW_JOBS_S; nel secondo caso il profilo viene salvato solo
+        se il job dura almeno quella soglia. Usa pyinstrument se installato, altrimenti cProfile.
+        Il dict restituito riceve la chiave 'path' del file salvato.
+        """
+        threshold = settings.PROFILE_SLOW_JOBS_S
+        out = {}
+        if not force and threshold is None:
+            yield out
+            return
+
+        profiler = _make_profiler()
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            yield out
+        finally:
+            profiler.stop()
+            elapsed = time.perf_counter() - start
+            if force or elapsed >= threshold:
+                os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+                out["path"] = profiler.dump(os.path.join(settings.PROFILE_DIR, name))
+                print(f"Profilo del job salvato: {out['path']} ({elapsed:.2f}s)")
+
+    # --- Lato server ---
+
+    def observe_job(self, kind: str, status: str, duration_s: float, stages=None):
+        with self._lock:
+            self._jobs_total[(kind, status)] = self._jobs_total.get((kind, status), 0) + 1
+            self._observe(self._job_durations, kind, duration_s)
+            for record in stages or []:
+                name = record["stage"]
+                self._observe(self._stage_durations, name, record["duration_s"])
+                for counter in ("paths", "points"):
+                    if counter in record:
+                        key = (name, counter)
+                        self._stage_counters[key] = self._stage_counters.get(key, 0) + record[counter]
+                if "memory_peak_bytes" in record:
+                    self._stage_memory[name] = record["memory_peak_bytes"]
+
+    def render(self, gauges=None) -> str:
+        """Testo in formato di esposizione Prometheus. gauges: {nome: valore} aggiuntivi."""
+        lines = []
+        with self._lock:
+            lines += ["# HELP plotter_jobs_total Completed jobs by kind and status.",
+                      "# TYPE plotter_jobs_total counter"]
+            for (kind, status), value in sorted(self._jobs_total.items()):
+                lines.append(f'plotter_jobs_total{{kind="{kind}",status="{status}"}} {value}')
+
+            lines += ["# HELP plotter_job_duration_seconds Job wall time from submit to finish.",
+                      "# TYPE plotter_job_duration_seconds histogram"]
+            lines += self._render_histogram("plotter_job_duration_seconds", "kind", self._job_durations)
+
+            lines += ["# HELP plotter_stage_duration_seconds Wall time of each pipeline stage.",
+                      "# TYPE plotter_stage_duration_seconds histogram"]
+            lines += self._render_histogram("plotter_stage_duration_seconds", "stage", self._stage_durations)
+
+            for counter in ("paths", "points"):
+                lines += [f"# HELP plotter_stage_{counter}_total {counter.capitalize()} produced by each stage.",
+                          f"# TYPE plotter_stage_{counter}_total counter"]
+                for (name, kind), value in sorted(self._stage_counters.items()):
+                    if kind == counter:
+                        lines.append(f'plotter_stage_{counter}_total{{stage="{name}"}} {value}')
+
+            if self._stage_memory:
+                lines += ["# HELP plotter_stage_memory_peak_bytes Traced peak memory of the last run of each stage.",
+                          "# TYPE plotter_stage_memory_peak_bytes gauge"]
+                for name, value in sorted(self._stage_memory.items()):
+                    lines.append(f'plotter_stage_memory_peak_bytes{{stage="{name}"}} {value}')
+
+        for name, value in (gauges or {}).items():
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def _observe(self, histograms, label, value):
+        hist = histograms.setdefault(label, [0] * len(DURATION_BUCKETS) + [0.0, 0])
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                hist[i] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+    def _render_histogram(self, metric, label_name, histograms):
+        lines = []
+        for label, hist in sorted(histograms.items()):
+            for bound, count in zip(DURATION_BUCKETS, hist):
+                lines.append(f'{metric}_bucket{{{label_name}="{label}",le="{bound}"}} {count}')
+            lines.append(f'{metric}_bucket{{{label_name}="{label}",le="+Inf"}} {hist[-1]}')
+            lines.append(f'{metric}_sum{{{label_name}="{label}"}} {round(hist[-2], 6)}')
+            lines.append(f'{metric}_count{{{label_name}="{label}"}} {hist[-1]}')
+        return lines
+
+
+@contextmanager
+def _null_stage():
+    yield {}
+
+
+class _CProfileProfiler:
+    def __init__(self):
+        import cProfile
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    def dump(self, base_path: str) -> str:
+        path = f"{base_path}.prof"
+        self._profile.dump_stats(path)
+        return path
+
+
+class _PyinstrumentProfiler:
+    def __init__(self, profiler_cls):
+        self._profiler = profiler_cls()
+
+    def start(self):
+        self._profiler.start()
+
+    def stop(self):
+        self._profiler.stop()
+
+    def dump(self, base_path: str) -> str:
+        path = f"{base_path}.html"
+        with open(path, "w") as f:
+            f.write(self._profiler.output_html())
+        return path
+
+
+def _make_profiler():
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        return _CProfileProfiler()
+    return _PyinstrumentProfiler(Profiler)
+
+
+metrics_service = MetricsService()
@@ -0,0 +1,132 @@
+import numpy as np
+
+from app.core.config import settings
+
+
+class MotionPlannerService:
+    """
+    Pianificatore di moto sulla sequenza di movimenti emessa da GCodeService, con lo stesso
+    modello del firmware (Grbl/Marlin): profilo di velocità trapezoidale con accelerazione
+    costante e velocità in curva limitata dalla junction deviation.
+
+    Restituisce il tempo di stampa stimato (usato per la pianificazione dei job) e, su
+    richiesta, un feedrate per segmento: i tratti lunghi e dritti, dove la macchina riesce
+    davvero ad accelerare, vanno fino a MOTION_MAX_DRAW_SPEED; i dettagli restano a draw_speed.
+
+    Tutto è vettoriale sull'intero job: i passaggi in avanti e all'indietro del planner
+    (v² <= v_prec² + 2·a·L) sono minimi cumulativi su somme prefisse delle lunghezze.
+    """
+
+    def __init__(self, accel: float = None, junction_deviation: float = None, max_draw_speed: float = None):
+        self.accel = accel or settings.MOTION_ACCEL_MM_S2
+        self.junction_deviation = junction_deviation or settings.MOTION_JUNCTION_DEVIATION_MM
+        self.max_draw_speed = max_draw_speed or settings.MOTION_MAX_DRAW_SPEED
+
+    def plan(self, points: np.ndarray, offsets, draw_speed: float, travel_speed: float,
+             pen_lift_mm: float, adaptive_feed: bool = False):
+        """
+        points: punti (N, 2) in mm sul piano del plotter, path i = points[offsets[i]:offsets[i+1]].
+        Velocità in mm/min come nel G-code. Ogni path: G0 fino all'inizio, pen down, tratti G1,
+        pen up (la penna si ferma a ogni estremo); il job parte da una penna alzata in (0, 0) e
+        finisce con il ritorno a (0, 0).
+        Restituisce (feedrate per segmento in mm/min o None, stats) con un feedrate per ogni
+        coppia di punti consecutivi dello stesso path, nell'ordine dei punti.
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        a = self.accel
+        draw_v = draw_speed / 60.0
+        travel_v = travel_speed / 60.0
+
+        # Segmenti disegnati: coppie consecutive dello stesso path
+        same_path = np.ones(max(len(points) - 1, 0), dtype=bool)
+        same_path[offsets[1:-1] - 1] = False
+        vectors = np.diff(points, axis=0)[same_path]
+        lengths = np.hypot(*vectors.T)
+
+        # Nodo k = inizio del segmento k; gli estremi dei path (penna giù/su) hanno velocità 0
+        stop = np.zeros(len(lengths) + 1, dtype=bool)
+        stop[np.cumsum(np.diff(offsets) - 1)[:-1]] = True
+        stop[[0, -1]] = True
+
+        nominal = np.full(len(lengths), self.max_draw_speed / 60.0 if adaptive_feed else draw_v)
+        entry, exit_ = self._profile(vectors, lengths, nominal, stop, a)
+        peak = self._peak(lengths, nominal, entry, exit_, a)
+
+        feeds = None
+        if adaptive_feed:
+            # Feedrate = velocità davvero raggiungibile sul segmento, mai sotto draw_speed
+            nominal = np.clip(peak, draw_v, nominal)
+            feeds = np.rint(nominal * 60.0)
+        draw_s = float(self._times(lengths, nominal, entry, exit_, a).sum())
+
+        # Spostamenti G0 (da fermo a fermo) e corse della penna
+        starts = points[offsets[:-1]]
+        ends = points[offsets[1:] - 1]
+        previous = np.vstack([[0.0, 0.0], ends[:-1]])
+        travel = np.append(np.hypot(*(starts - previous).T), np.hypot(*ends[-1]))
+        travel_s = float(self._times(travel, np.full(len(travel), travel_v), 0.0, 0.0, a).sum())
+        # Alzata iniziale + per ogni path una discesa (a draw_speed) e una salita (a travel_speed)
+        n_paths = len(offsets) - 1
+        up = self._times(np.array([pen_lift_mm]), np.array([travel_v]), 0.0, 0.0, a)[0]
+        down = self._times(np.array([pen_lift_mm]), np.array([draw_v]), 0.0, 0.0, a)[0]
+        pen_s = float(up * (n_paths + 1) + down * n_paths)
+
+        draw_mm = float(lengths.sum())
+        total = draw_s + travel_s + pen_s
+        stats = {
+            "estimated_time_s": round(total, 1),
+            "draw_s": round(draw_s, 1),
+            "travel_s": round(travel_s, 1),
+            "pen_s": round(pen_s, 1),
+            "draw_mm": round(draw_mm, 1),
+            "travel_mm": round(float(travel.sum()), 1),
+            # Velocità media effettiva di disegno (mm/min): quanto pesa l'accelerazione sui dettagli
+            "mean_draw_speed": round(draw_mm / draw_s * 60.0, 1) if draw_s else 0.0,
+            "accel_mm_s2": a,
+            "junction_deviation_mm": self.junction_deviation,
+            "adaptive_feed": adaptive_feed,
+        }
+        return feeds, stats
+
+    # --- Interni ---
+
+    def _profile(self, vectors, lengths, nominal, stop, a):
+        """
+        Velocità di ingresso/uscita di ogni segmento (mm/s). stop: nodi con velocità 0.
+        Passaggio in avanti e all'indietro come nel planner del firmware, su v².
+        """
+        n = len(lengths)
+        limit = np.zeros(n + 1)
+        if n > 1:
+            unit = vectors / np.where(lengths > 0, lengths, 1.0)[:, None]
+            # Junction deviation (Grbl): v² = a·δ·sin(θ/2) / (1 - sin(θ/2)), θ = angolo tra i segmenti
+            cos_theta = -(unit[:-1] * unit[1:]).sum(axis=1)
+            sin_half = np.sqrt(np.clip(0.5 * (1.0 - cos_theta), 0.0, 1.0))
+            with np.errstate(divide="ignore"):
+                junction = a * self.junction_deviation * sin_half / (1.0 - sin_half)
+            limit[1:-1] = np.minimum(junction, np.minimum(nominal[:-1], nominal[1:]) ** 2)
+        limit[stop] = 0.0
+
+        # w_k = min(limit_k, w_{k-1} + 2·a·L_{k-1})  ->  w = S + cummin(limit - S), S = somma prefissa
+        reach = np.concatenate([[0.0], np.cumsum(2.0 * a * lengths)])
+        forward = reach + np.minimum.accumulate(limit - reach)
+        # Stessa cosa da destra verso sinistra (decelerazione prima delle curve e degli stop)
+        remaining = reach[-1] - reach
+        both = remaining + np.minimum.accumulate((forward - remaining)[::-1])[::-1]
+        speed = np.sqrt(np.maximum(both, 0.0))
+        return speed[:-1], speed[1:]
+
+    def _peak(self, lengths, nominal, entry, exit_, a):
+        """Velocità massima raggiunta su ogni segmento (trapezio o triangolo)."""
+        return np.sqrt(np.minimum(nominal ** 2, (2.0 * a * lengths + entry ** 2 + exit_ ** 2) / 2.0))
+
+    def _times(self, lengths, nominal, entry, exit_, a):
+        """Durata di ogni segmento: accelerazione, tratto a velocità costante, decelerazione."""
+        peak = self._peak(lengths, nominal, entry, exit_, a)
+        cruise = lengths - (2.0 * peak ** 2 - entry ** 2 - exit_ ** 2) / (2.0 * a)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            times = (2.0 * peak - entry - exit_) / a + np.where(peak > 0, np.maximum(cruise, 0.0) / peak, 0.0)
+        return times
+
+
+motion_planner_service = MotionPlannerService()
@@ -0,0 +1,140 @@
+import math
+
+
+class _EndpointGrid:
+    """
+    Griglia uniforme sugli estremi (inizio/fine) dei path con cancellazione lazy.
+    Ogni cella contiene tuple (indice_path, is_end, x, y).
+    """
+
+    def __init__(self, entries, alive):
+        self.alive = alive
+        self.count = len(entries)
+
+        xs = [e[2] for e in entries]
+        ys = [e[3] for e in entries]
+        self.min_x = min(xs)
+        self.min_y = min(ys)
+        span_x = max(xs) - self.min_x
+        span_y = max(ys) - self.min_y
+
+        # Dimensione cella scelta per avere in media ~2 estremi per cella.
+        # Il secondo termine limita il numero di celle quando i punti sono quasi allineati su un asse.
+        n = max(len(entries), 1)
+        area = span_x * span_y
+        self.cell = max(math.sqrt(2.0 * area / n), max(span_x, span_y) / n, 1e-6)
+        self.cols = int(span_x / self.cell) + 1
+        self.rows = int(span_y / self.cell) + 1
+
+        self.cells = {}
+        for e in entries:
+            key = (int((e[2] - self.min_x) / self.cell), int((e[3] - self.min_y) / self.cell))
+            self.cells.setdefault(key, []).append(e)
+
+    def _cell_of(self, x, y):
+        return (math.floor((x - self.min_x) / self.cell), math.floor((y - self.min_y) / self.cell))
+
+    def _scan(self, key, px, py, best):
+        bucket = self.cells.get(key)
+        if not bucket:
+            return best
+        alive = self.alive
+        stale = False
+        for e in bucket:
+            if not alive[e[0]]:
+                stale = True
+                continue
+            # Stessa formula del vecchio algoritmo: i pareggi si risolvono in modo identico
+            d = math.sqrt((e[2] - px) ** 2 + (e[3] - py) ** 2)
+            if best is None or (d, e[0], e[1]) < best:
+                best = (d, e[0], e[1])
+        if stale:
+            # Cancellazione lazy: compattiamo la cella solo quando la visitiamo
+            bucket[:] = [e for e in bucket if alive[e[0]]]
+            if not bucket:
+                del self.cells[key]
+        return best
+
+    def nearest(self, px, py):
+        """
+        Restituisce (distanza, indice_path, is_end) dell'estremo vivo più vicino,
+        con gli stessi criteri di parità della scansione lineare.
+        """
+        qx, qy = self._cell_of(px, py)
+
+        # Se il punto è fuori dalla griglia partiamo dal primo anello che la tocca
+        dx_out = max(0, -qx, qx - (self.cols - 1))
+        dy_out = max(0, -qy, qy - (self.rows - 1))
+        ring = max(dx_out, dy_out)
+        max_ring = max(abs(qx), abs(qx - (self.cols - 1)), abs(qy), abs(qy - (self.rows - 1)))
+
+        best = None
+        while ring <= max_ring:
+            for cy in range(max(qy - ring, 0), min(qy + ring, self.rows - 1) + 1):
+                if abs(cy - qy) == ring:
+                    for cx in range(max(qx - ring, 0), min(qx + ring, self.cols - 1) + 1):
+                        best = self._scan((cx, cy), px, py, best)
+                else:
+                    if 0 <= qx - ring < self.cols:
+                        best = self._scan((qx - ring, cy), px, py, best)
+                    if ring > 0 and 0 <= qx + ring < self.cols:
+                        best = self._scan((qx + ring, cy), px, py, best)
+            # Gli anelli successivi distano almeno ring * cell: se il migliore è più vicino abbiamo finito
+            if best is not None and best[0] < ring * self.cell:
+                break
+            ring += 1
+        return best
+
+
+class PathOrderingService:
+    """
+    Ordinamento greedy 'Nearest Neighbor' con inversione del percorso,
+    accelerato da un indice spaziale a griglia sugli estremi dei path.
+    Produce lo stesso ordine della scansione lineare O(n²), in circa O(n log n).
+    """
+
+    # Quando i path rimasti scendono sotto questa frazione ricostruiamo la griglia,
+    # così le celle restano dense anche a fine ordinamento
+    REBUILD_FRACTION = 0.5
+
+    def sort_paths(self, paths, start=(0, 0)):
+        if not paths:
+            return []
+
+        alive = bytearray([1]) * len(paths)
+        remaining = len(paths)
+
+        def build():
+            entries = []
+            for i, p in enumerate(paths):
+                if alive[i]:
+                    # float() così funziona sia con liste di tuple sia con array NumPy
+                    entries.append((i, False, float(p[0][0]), float(p[0][1])))
+                    entries.append((i, True, float(p[-1][0]), float(p[-1][1])))
+            return _EndpointGrid(entries, alive)
+
+        grid = build()
+        built_with = remaining
+        sorted_p = []
+        current_pos = start
+
+        while remaining:
+            if remaining < built_with * self.REBUILD_FRACTION:
+                grid = build()
+                built_with = remaining
+
+            _, best_idx, should_reverse = grid.nearest(current_pos[0], current_pos[1])
+            alive[best_idx] = 0
+            remaining -= 1
+
+            p_to_add = paths[best_idx]
+            if should_reverse:
+                p_to_add = p_to_add[::-1]
+
+            sorted_p.append(p_to_add)
+            current_pos = (float(p_to_add[-1][0]), float(p_to_add[-1][1]))
+
+        return sorted_p
+
+
+path_ordering_service = PathOrderingService()
@@ -0,0 +1,421 @@
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+
+from app.core.config import settings
+
+FLOW_CONTROLS = ("char", "ack")
+
+# Intervallo di polling delle risposte del firmware (s)
+POLL_S = 0.1
+
+
+class PlotterError(Exception):
+    """Plotter non configurato o non raggiungibile, oppure errore del firmware durante lo streaming."""
+
+
+class PlotterBusyError(PlotterError):
+    """C'è già uno streaming in corso: il plotter esegue un job alla volta."""
+
+
+# --- Trasporti ---
+
+class _Transport:
+    """Connessione a righe verso il firmware; readline() restituisce None se non arriva nulla entro POLL_S."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def readline(self):
+        while b"\n" not in self._buffer:
+            data = self._recv()
+            if data is None:
+                return None
+            if not data:
+                raise PlotterError("Plotter disconnected")
+            self._buffer += data
+        end = self._buffer.index(b"\n")
+        line = bytes(self._buffer[:end])
+        del self._buffer[:end + 1]
+        return line.decode("ascii", "replace").strip()
+
+    def drain(self):
+        """Scarta quello che il firmware ha già mandato (banner, 'ok' dei comandi di risveglio)."""
+        while self.readline() is not None:
+            pass
+        self._buffer.clear()
+
+
+class _SocketTransport(_Transport):
+    """'socket://host:porta': firmware dietro un bridge TCP (es. ser2net, ESP3D) o SimulatedFirmware."""
+
+    def __init__(self, host, port):
+        super().__init__()
+        self._sock = socket.create_connection((host, port), timeout=5.0)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock.settimeout(POLL_S)
+
+    def write(self, data):
+        self._sock.sendall(data)
+
+    def _recv(self):
+        try:
+            return self._sock.recv(4096)
+        except socket.timeout:
+            return None
+
+    def close(self):
+        self._sock.close()
+
+
+class _SerialTransport(_Transport):
+    """Porta seriale con pyserial (l'unica strada su Windows, es. 'COM3')."""
+
+    def __init__(self, serial, port, baudrate):
+        super().__init__()
+        self._serial = serial.Serial(port, baudrate, timeout=POLL_S)
+
+    def write(self, data):
+        self._serial.write(data)
+
+    def _recv(self):
+        return self._serial.read(max(1, self._serial.in_waiting)) or None
+
+    def close(self):
+        self._serial.close()
+
+
+class _TtyTransport(_Transport):
+    """Fallback POSIX senza pyserial: il device (o un pty) aperto in modalità raw con termios."""
+
+    def __init__(self, port, baudrate):
+        import termios
+        import tty
+        super().__init__()
+        self._fd = os.open(port, os.O_RDWR | os.O_NOCTTY)
+        tty.setraw(self._fd)
+        attrs = termios.tcgetattr(self._fd)
+        speed = getattr(termios, f"B{baudrate}", None)
+        if speed is not None:
+            attrs[4] = attrs[5] = speed
+        termios.tcsetattr(self._fd, termios.TCSANOW, attrs)
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self._fd, view):]
+
+    def _recv(self):
+        ready, _, _ = select.select([self._fd], [], [], POLL_S)
+        if not ready:
+            return None
+        try:
+            return os.read(self._fd, 4096)
+        except OSError:
+            return b""  # pty chiuso dall'altro lato
+
+    def close(self):
+        os.close(self._fd)
+
+
+def _open_transport(port, baudrate):
+    if port.startswith("socket://"):
+        host, _, tcp_port = port[len("socket://"):].rpartition(":")
+        return _SocketTransport(host, int(tcp_port))
+    try:
+        import serial
+    except ImportError:
+        if os.name == "nt":
+            raise PlotterError("pyserial is required for serial ports on Windows (pip install pyserial)")
+        return _TtyTransport(port, baudrate)
+    return _SerialTransport(serial, port, baudrate)
+
+
+# --- Driver ---
+
+class PlotterDriverService:
+    """
+    Streaming del G-code verso il firmware del plotter (Grbl, Marlin) con controllo di flusso,
+    in un thread in background: le route avviano il job e ne leggono lo stato senza bloccarsi.
+
+    - 'char' (character counting, Grbl): si tengono in volo tutte le righe che stanno nel
+      buffer di ricezione del firmware (rx_buffer byte); ogni 'ok' libera i byte della riga
+      più vecchia. Il planner del firmware resta pieno anche con i tanti segmenti corti del
+      disegno, invece di aspettare un giro di 'ok' per ogni riga.
+    - 'ack' (Marlin e firmware senza buffer noto): al massimo ack_window righe senza 'ok'.
+
+    pause() smette di inviare (la macchina si ferma finiti i movimenti già nel buffer),
+    cancel() scarta il resto del file e alza la penna.
+    """
+
+    def __init__(self, port: str, baudrate: int, flow_control: str, rx_buffer: int, ack_window: int,
+                 ack_timeout_s: float, settle_s: float):
+        if flow_control not in FLOW_CONTROLS:
+            raise ValueError(f"Unknown flow control '{flow_control}' (expected one of {FLOW_CONTROLS})")
+        self.port = port
+        self.baudrate = baudrate
+        self.flow_control = flow_control
+        self.rx_buffer = rx_buffer
+        self.ack_window = ack_window
+        self.ack_timeout_s = ack_timeout_s
+        self.settle_s = settle_s
+
+        self._lock = threading.Lock()
+        self._stream = None
+        self._thread = None
+        self._resume = threading.Event()
+        self._cancel = threading.Event()
+        self._simulator = None
+
+    def start(self, gcode_path: str, job_id: str = None, estimated_time_s: float = None) -> dict:
+        """Avvia lo streaming di un file G-code e restituisce subito lo stato."""
+        if not self.port:
+            raise PlotterError("Plotter not configured (set PLOTTER_PORT)")
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                raise PlotterBusyError(f"Plotter busy with stream {self._stream['id']}")
+            self._resume.set()
+            self._cancel.clear()
+            self._stream = {
+                "id": uuid.uuid4().hex,
+                "file": Path(gcode_path).name,
+                "job_id": job_id,
+                "status": "connecting",
+                "flow_control": self.flow_control,
+                "lines_total": 0,
+                "lines_sent": 0,
+                "lines_acked": 0,
+                "bytes_total": 0,
+                "bytes_acked": 0,
+                "progress": 0.0,
+                # Riempimento medio del buffer del firmware subito dopo ogni invio (0-1)
+                "buffer_fill": 0.0,
+                "started_at": time.time(),
+                "finished_at": None,
+                "paused_s": 0.0,
+                "estimated_time_s": estimated_time_s,
+                "error": None,
+            }
+            self._thread = threading.Thread(target=self._run, args=(gcode_path,), daemon=True)
+            self._thread.start()
+        return self.status()
+
+    def status(self):
+        """Stato dell'ultimo streaming (None se il plotter non ha ancora ricevuto job), con ETA."""
+        with self._lock:
+            if self._stream is None:
+                return None
+            stream = dict(self._stream)
+        end = stream["finished_at"] or time.time()
+        elapsed = end - stream["started_at"] - stream["paused_s"]
+        progress = stream["progress"]
+        if stream["finished_at"] is not None:
+            eta = 0.0
+        elif stream["estimated_time_s"]:
+            eta = stream["estimated_time_s"] * (1.0 - progress)
+        else:
+            eta = elapsed * (1.0 - progress) / progress if progress > 0 else None
+        stream.update(elapsed_s=round(elapsed, 1), eta_s=None if eta is None else round(eta, 1),
+                      progress=round(progress, 4), buffer_fill=round(stream["buffer_fill"], 3))
+        return stream
+
+    def pause(self):
+        self._set_status("paused", ("streaming",))
+        self._resume.clear()
+        return self.status()
+
+    def resume(self):
+        self._set_status("streaming", ("paused",))
+        self._resume.set()
+        return self.status()
+
+    def cancel(self):
+        self._set_status("cancelling", ("connecting", "streaming", "paused"))
+        self._cancel.set()
+        self._resume.set()
+        return self.status()
+
+    def wait(self, timeout: float = None):
+        """Attende la fine dello streaming corrente (benchmark e script)."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.status()
+
+    def shutdown(self):
+        if self._thread is not None and self._thread.is_alive():
+            self.cancel()
+            self._thread.join(self.ack_timeout_s)
+        if self._simulator is not None:
+            self._simulator.close()
+            self._simulator = None
+
+    # --- Interni ---
+
+    def _set_status(self, status, allowed):
+        with self._lock:
+            if self._stream is None or self._stream["status"] not in allowed:
+                current = self._stream["status"] if self._stream else "idle"
+                raise PlotterError(f"Cannot switch plotter from '{current}' to '{status}'")
+            self._stream["status"] = status
+
+    def _update(self, **fields):
+        with self._lock:
+            self._stream.update(fields)
+
+    def _commands(self, gcode_path):
+        """Righe da inviare: senza commenti né righe vuote, che occuperebbero il buffer del firmware."""
+        with open(gcode_path, "r") as f:
+            for line in f:
+                line = line.split(";", 1)[0].strip()
+                if line:
+                    yield (line + "\n").encode("ascii")
+
+    def _connect(self):
+        port = self.port
+        if port.startswith("sim://"):
+            # Firmware simulato nel processo, per provare l'interfaccia senza plotter
+            from app.services.plotter_sim import SimulatedFirmware
+            if self._simulator is not None:
+                self._simulator.close()
+            self._simulator = SimulatedFirmware(rx_buffer=self.rx_buffer, baudrate=self.baudrate,
+                                                speedup=settings.PLOTTER_SIM_SPEEDUP)
+            port = self._simulator.listen()
+        transport = _open_transport(port, self.baudrate)
+        # Grbl si resetta all'apertura della seriale: si aspetta il banner e si svuota l'ingresso
+        transport.write(b"\r\n\r\n")
+        if not self.port.startswith("sim://"):
+            time.sleep(self.settle_s)
+        transport.drain()
+        return transport
+
+    def _run(self, gcode_path):
+        transport = None
+        try:
+            lines_total = bytes_total = 0
+            for command in self._commands(gcode_path):
+                lines_total += 1
+                bytes_total += len(command)
+            self._update(lines_total=lines_total, bytes_total=bytes_total)
+
+            transport = self._connect()
+            with self._lock:
+                if self._stream["status"] == "connecting":
+                    self._stream["status"] = "streaming"
+            self._send_all(transport, self._commands(gcode_path), bytes_total)
+            if self._cancel.is_set():
+                # Movimenti già nel buffer eseguiti, poi penna alzata
+                self._lift_pen(transport)
+                status = "cancelled"
+            else:
+                status = "done"
+            self._update(status=status, finished_at=time.time())
+        except Exception as e:
+            self._update(status="failed", error=str(e) or type(e).__name__, finished_at=time.time())
+            if transport is not None:
+                # Firmware che rifiuta una riga (error:/ALARM) o linea caduta: la penna non deve
+                # restare giù sul foglio. Best effort, la macchina potrebbe non rispondere più
+                try:
+                    self._lift_pen(transport, getattr(e, "pending", ()))
+                except Exception as lift_error:
+                    print(f"Plotter: penna non alzata dopo l'errore ({lift_error})")
+        finally:
+            if transport is not None:
+                transport.close()
+        stream = self.status()
+        print(f"Plotter stream {stream['id']} {stream['status']}: {stream['lines_acked']}/{stream['lines_total']} "
+              f"lines in {stream['elapsed_s']}s" + (f" ({stream['error']})" if stream["error"] else ""))
+
+    def _lift_pen(self, transport, pending=()):
+        """Penna alzata; pending: righe ancora in volo dopo un errore, di cui aspettare la risposta."""
+        lift = f"G0 Z{settings.PEN_LIFT_MM:g}\n".encode("ascii")
+        self._send_all(transport, iter([lift]), 0, cancellable=False, pending=pending)
+
+    def _send_all(self, transport, commands, bytes_total, cancellable=True, pending=()):
+        """
+        Invia le righe rispettando il controllo di flusso e attende gli 'ok' di tutte.
+        cancellable=False (comandi di servizio, penna alzata): ignora pausa e annullamento, e un
+        rifiuto del firmware conta come risposta. pending: righe già in volo, come (byte, numero).
+        Se il firmware rifiuta una riga, il PlotterError porta in 'pending' quelle ancora in volo.
+        """
+        pending = deque(pending)  # (byte, numero di riga) delle righe inviate senza 'ok'
+        in_flight = sum(size for size, _ in pending)
+        fill_sum = 0.0
+        sent = acked = bytes_acked = 0
+        char_mode = self.flow_control == "char"
+        capacity = self.rx_buffer if char_mode else self.ack_window
+
+        def receive():
+            nonlocal in_flight, acked, bytes_acked
+            silent_from = time.monotonic()
+            while True:
+                response = transport.readline()
+                if response is None:
+                    if time.monotonic() - silent_from > self.ack_timeout_s:
+                        raise PlotterError(f"No response from plotter for {self.ack_timeout_s:.0f}s")
+                    if not pending:
+                        return
+                    continue
+                if response.startswith("ok") and pending:
+                    size, _ = pending.popleft()
+                    in_flight -= size
+                    acked += 1
+                    bytes_acked += size
+                    return
+                if response.startswith(("error", "ALARM", "!!")):
+                    if not cancellable and pending:
+                        size, _ = pending.popleft()
+                        in_flight -= size
+                        return
+                    number = pending[0][1] if pending else sent
+                    error = PlotterError(f"Firmware rejected line {number}: {response}")
+                    error.pending = list(pending)[1:]
+                    raise error
+                # Banner, messaggi [MSG:...], report di stato: ignorati
+
+        for command in commands:
+            size = len(command)
+            if char_mode and size > capacity:
+                raise PlotterError(f"Line {sent + 1} longer than the firmware buffer ({size} > {capacity} bytes)")
+            while pending and (in_flight + size > capacity if char_mode else len(pending) >= capacity):
+                receive()
+                self._progress(acked, bytes_acked, bytes_total, sent, fill_sum)
+            if cancellable and not self._resume.is_set():
+                paused_at = time.monotonic()
+                while not self._resume.wait(POLL_S):
+                    if pending:
+                        receive()
+                with self._lock:
+                    self._stream["paused_s"] += time.monotonic() - paused_at
+            if cancellable and self._cancel.is_set():
+                break
+            transport.write(command)
+            sent += 1
+            in_flight += size
+            pending.append((size, sent))
+            fill_sum += (in_flight if char_mode else len(pending)) / capacity
+        while pending:
+            receive()
+        self._progress(acked, bytes_acked, bytes_total, sent, fill_sum)
+
+    def _progress(self, acked, bytes_acked, bytes_total, sent, fill_sum):
+        if not bytes_total:
+            return  # comandi di servizio (penna alzata dopo cancel)
+        self._update(lines_sent=sent, lines_acked=acked, bytes_acked=bytes_acked,
+                     progress=bytes_acked / bytes_total, buffer_fill=fill_sum / sent if sent else 0.0)
+
+
+plotter_service = PlotterDriverService(
+    port=settings.PLOTTER_PORT,
+    baudrate=settings.PLOTTER_BAUDRATE,
+    flow_control=settings.PLOTTER_FLOW_CONTROL,
+    rx_buffer=settings.PLOTTER_RX_BUFFER,
+    ack_window=settings.PLOTTER_ACK_WINDOW,
+    ack_timeout_s=settings.PLOTTER_ACK_TIMEOUT_S,
+    settle_s=settings.PLOTTER_SETTLE_S,
+)
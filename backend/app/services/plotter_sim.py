@@ -0,0 +1,210 @@
+import math
+import os
+import re
+import socket
+import threading
+import time
+from collections import deque
+
+# Parole di un blocco: comando G e parametri dei movimenti G0/G1 (X, Y, Z, F), anche senza spazi
+_WORD = re.compile(r"([GXYZF])(-?\d+(?:\.\d*)?|-?\.\d+)")
+
+
+class SimulatedFirmware:
+    """
+    Firmware simulato per provare PlotterDriverService senza hardware, su socket TCP locale
+    o su pseudo-terminale (solo POSIX). Riproduce quello che conta per il flusso:
+
+    - un buffer di ricezione di rx_buffer byte (come la seriale di Grbl): se l'host manda più
+      di quanto entra, i byte in eccesso sono persi e contati in 'overflows';
+    - la linea a una velocità di baudrate (10 bit per byte) più una latenza latency_s su ogni
+      risposta (il latency timer degli adattatori USB-seriale), così il tempo di trasmissione
+      e il ritardo degli 'ok' pesano come su una seriale vera;
+    - un planner di planner_blocks movimenti: una riga lascia il buffer di ricezione (e riceve
+      'ok') solo quando nel planner c'è posto;
+    - l'esecuzione dei movimenti in tempo reale (distanza / feedrate, diviso speedup):
+      il tempo in cui il planner è vuoto a job iniziato è 'starved_s', cioè throughput perso.
+
+    responses: {numero di riga (da 1): risposta} per simulare righe rifiutate (es. 'error:20',
+    'ALARM:1'), che non vengono eseguite. 'rx_peak' è il massimo riempimento del buffer di ricezione.
+    """
+
+    def __init__(self, rx_buffer: int = 128, planner_blocks: int = 16, baudrate: int = 115200,
+                 latency_s: float = 0.0, speedup: float = 1.0, responses: dict = None):
+        self.rx_buffer = rx_buffer
+        self.planner_blocks = planner_blocks
+        self.baudrate = baudrate
+        self.latency_s = latency_s
+        self.speedup = speedup
+        self.responses = responses or {}
+
+        self._cond = threading.Condition()
+        self._rx = bytearray()
+        self._planner = deque()
+        self._outbox = deque()
+        self._position = [0.0, 0.0, 0.0]
+        self._feed = 1000.0
+        self._motion = None  # G0/G1 modale: le righe con soli assi ripetono l'ultimo
+        self._line_number = 0  # righe non vuote ricevute (numerazione di responses)
+        self._closed = False
+        self._server = None
+        self._threads = []
+        self.stats = {"lines": 0, "moves": 0, "overflows": 0, "rx_peak": 0, "busy_s": 0.0, "starved_s": 0.0}
+
+    # --- Trasporti ---
+
+    def listen(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Accetta una connessione TCP e restituisce l'indirizzo 'socket://host:porta' per il driver."""
+        self._server = socket.create_server((host, port))
+        address = f"socket://{host}:{self._server.getsockname()[1]}"
+        self._start(self._accept)
+        return address
+
+    def open_pty(self) -> str:
+        """Pseudo-terminale (POSIX): restituisce il path del lato 'seriale' da aprire col driver."""
+        import tty
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        path = os.ttyname(slave)
+        self._start(self._serve, lambda n: os.read(master, n), lambda data: os.write(master, data))
+        return path
+
+    @property
+    def position(self):
+        """Posizione (x, y, z) dopo l'ultima riga accettata."""
+        with self._cond:
+            return tuple(self._position)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._server is not None:
+            self._server.close()
+
+    # --- Interni ---
+
+    def _start(self, target, *args):
+        for fn, fn_args in ((target, args), (self._parse, ()), (self._execute, ())):
+            thread = threading.Thread(target=fn, args=fn_args, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _accept(self):
+        try:
+            conn, _ = self._server.accept()
+        except OSError:
+            return
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._serve(conn.recv, conn.sendall)
+
+    def _serve(self, read, write):
+        """Riceve byte alla velocità della linea e li mette nel buffer di ricezione."""
+        threading.Thread(target=self._respond, args=(write,), daemon=True).start()
+        self._write(b"Grbl 1.1h ['$' for help]\r\n")
+        while not self._closed:
+            try:
+                data = read(4096)
+            except OSError:
+                break
+            if not data:
+                break
+            time.sleep(len(data) * 10 / self.baudrate)
+            with self._cond:
+                room = self.rx_buffer - len(self._rx)
+                if len(data) > room:
+                    self.stats["overflows"] += len(data) - room
+                    data = data[:max(room, 0)]
+                self._rx += data
+                self.stats["rx_peak"] = max(self.stats["rx_peak"], len(self._rx))
+                self._cond.notify_all()
+        self.close()
+
+    def _write(self, data):
+        with self._cond:
+            self._outbox.append((time.monotonic() + self.latency_s, data))
+            self._cond.notify_all()
+
+    def _respond(self, write):
+        """Invia le risposte in ordine: latenza (in parallelo al resto) e poi tempo di trasmissione."""
+        while True:
+            with self._cond:
+                while not self._closed and not self._outbox:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                due, data = self._outbox.popleft()
+            time.sleep(max(due - time.monotonic(), 0.0) + len(data) * 10 / self.baudrate)
+            try:
+                write(data)
+            except OSError:
+                return
+
+    def _parse(self):
+        """Sposta le righe complete dal buffer di ricezione al planner, rispondendo 'ok'."""
+        while True:
+            with self._cond:
+                while not self._closed and b"\n" not in self._rx:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                end = self._rx.index(b"\n")
+                line = self._rx[:end].decode("ascii", "replace").strip()
+                response = None
+                if line:
+                    self._line_number += 1
+                    response = self.responses.get(self._line_number, "ok")
+                move = self._move(line) if response == "ok" else None
+                # Il planner pieno blocca la riga nel buffer di ricezione (come nel firmware)
+                while not self._closed and move is not None and len(self._planner) >= self.planner_blocks:
+                    self._cond.wait()
+                del self._rx[:end + 1]
+                if move is not None:
+                    self._planner.append(move)
+                self.stats["lines"] += 1
+                self._cond.notify_all()
+            if response is not None:
+                self._write(f"{response}\r\n".encode("ascii"))
+
+    def _move(self, line):
+        """Durata (s) di un G0/G1 (anche modale), None per gli altri comandi (eseguiti subito)."""
+        words = _WORD.findall(line.split(";", 1)[0].upper())
+        commands = [float(value) for axis, value in words if axis == "G"]
+        if commands:
+            if commands[0] not in (0, 1):
+                return None
+            self._motion = commands[0]
+        elif self._motion is None or not words:
+            return None
+        target = list(self._position)
+        for axis, value in words:
+            if axis == "G":
+                continue
+            if axis == "F":
+                self._feed = float(value)
+            else:
+                target["XYZ".index(axis)] = float(value)
+        distance = math.dist(self._position, target)
+        self._position = target
+        return distance / (self._feed / 60.0) / self.speedup
+
+    def _execute(self):
+        """Esegue i movimenti del planner; il tempo a planner vuoto dopo il primo movimento è 'starved_s'."""
+        started = False
+        while True:
+            with self._cond:
+                idle_from = time.perf_counter()
+                while not self._closed and not self._planner:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                if started:
+                    self.stats["starved_s"] += time.perf_counter() - idle_from
+                duration = self._planner[0]
+            time.sleep(duration)
+            with self._cond:
+                self._planner.popleft()
+                self.stats["moves"] += 1
+                self.stats["busy_s"] += duration
+                started = True
+                self._cond.notify_all()
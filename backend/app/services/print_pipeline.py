@@ -0,0 +1,345 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from app.core.config import settings
+from app.services.skeleton import skeleton_service
+from app.services.processing import processing_service
+from app.services.image_pipeline import ImagePipeline
+from app.services.gcode import gcode_service, Placement
+from app.services.cache import result_cache
+from app.services.artifacts import artifact_store
+from app.services.metrics import metrics_service
+
+# Coefficiente di semplificazione usato dal vettorializzatore (fa parte della chiave di cache)
+VECTORIZE_EPSILON = 0.002
+
+# Opzioni di /print che non cambiano il contenuto del G-code (escluse dal suo nome)
+_OUTPUT_NEUTRAL_PARAMS = ("profile", "debug_artifacts", "export_svg")
+
+
+def vectorize_epsilon() -> float:
+    """Con la semplificazione in mm i path escono grezzi dal vettorializzatore (epsilon 0)."""
+    return 0.0 if settings.SIMPLIFY_MODE == "absolute" else VECTORIZE_EPSILON
+
+
+def simplify_tolerance_mm(params: dict):
+    """
+    Tolleranza in mm per GCodeService.prepare_paths (None in modalità 'relative').
+    0 è una scelta esplicita (solo la risoluzione del plotter), non il default.
+    """
+    if settings.SIMPLIFY_MODE != "absolute":
+        return None
+    tolerance_mm = params.get("tolerance_mm")
+    return settings.SIMPLIFY_TOLERANCE_MM if tolerance_mm is None else tolerance_mm
+
+
+class NoDrawablePathsError(ValueError):
+    """L'immagine non contiene tratti disegnabili dopo il filtro rumore."""
+
+
+class PrintPipelineService:
+    """
+    Pipeline completa di /print: Processing -> Vectorization -> GCode.
+    Eseguita nei worker della coda dei job (vedi app.services.jobs).
+    """
+
+    def __init__(self, layout_workers: int):
+        self.layout_workers = layout_workers
+
+    def prepare(self, file_path: Path, params: dict, stage):
+        """
+        Stadi A+B e ordinamento di una singola immagine (o SVG), tutti in cache: restituisce
+        (PreparedPaths, path dell'SVG esportato o None, artefatti di debug).
+        params: width_mm/height_mm più le opzioni di PrintRequest (tolleranza, ottimizzazione, export).
+        """
+        # Ogni stadio è in cache per (hash dell'immagine, parametri dello stadio): se l'utente
+        # sposta/ruota/ridimensiona l'immagine nel composer restano solo trasformazione ed emissione.
+        image_hash = result_cache.hash_file(str(file_path))
+
+        # A+B. Binarizzazione/scheletro (OpenCV) e Vettorializzazione (Potrace/Centerline)
+        # Un SVG esterno salta entrambi: GCodeService lo legge in streaming (SvgParserService)
+        # e ne appiattisce le curve in base alla dimensione di stampa.
+        svg_path = None
+        artifacts = []
+        is_svg = file_path.suffix.lower() == ".svg"
+        if is_svg:
+            source = str(file_path)
+            paths_key = result_cache.key("svg", image_hash)
+            stage.skip("preprocess", "vectorize")
+        else:
+            # Tutto in memoria (ImagePipeline + PathSet): SVG e immagini intermedie sono export opzionali.
+            # In modalità debug si salta la cache, così ogni stadio produce il proprio artefatto.
+            image = ImagePipeline.from_file(str(file_path), debug=params.get("debug_artifacts") or None)
+            # Risoluzione di lavoro dalla dimensione di stampa e dalla penna: una stampa piccola non
+            # ha bisogno di tutti i pixel. La dimensione dell'immagine resta in cache, così con
+            # scheletro e path in cache l'immagine non viene nemmeno decodificata.
+            shape = result_cache.get_or_compute(result_cache.key("shape", image_hash),
+                                                lambda: image.load().gray.shape)
+            resolution = processing_service.working_resolution(shape, params["width_mm"], params["height_mm"])
+            skeleton_params = {**skeleton_service.params(), **resolution}
+            epsilon_coeff = vectorize_epsilon()
+            paths_key = result_cache.key("paths", image_hash, epsilon_coeff=epsilon_coeff,
+                                         engine=settings.VECTORIZE_ENGINE, **skeleton_params)
+            path_set = None if image.debug else result_cache.get(paths_key)
+            if path_set is None:
+                print("Step 1: Preprocessing...")
+                with stage("preprocess") as info:
+                    skeleton_key = result_cache.key("skeleton", image_hash, **skeleton_params)
+                    skeleton = None if image.debug else result_cache.get(skeleton_key)
+                    if skeleton is None:
+                        skeleton = image.preprocess(resolution["scale"], resolution["kernel"]).skeleton
+                        result_cache.put(skeleton_key, skeleton)
+                    image.with_skeleton(skeleton)
+                    info.update(resolution, pixels=skeleton.size)
+                print("Step 2: Vectorizing...")
+                with stage("vectorize") as info:
+                    path_set = image.vectorize(epsilon_coeff).path_set
+                    result_cache.put(paths_key, path_set)
+                    info.update(paths=len(path_set), points=path_set.point_count)
+            else:
+                print("Step 1-2: Paths from cache")
+                stage.skip("preprocess", "vectorize")
+
+            if params.get("export_svg"):
+                # Stessi path, stesso SVG: se è già fra gli artefatti basta il touch (LRU)
+                svg_path = artifact_store.path(paths_key, ".svg")
+                if not artifact_store.touch(svg_path):
+                    with metrics_service.stage("svg_write"):
+                        with artifact_store.open(paths_key, ".svg") as f:
+                            f.write(path_set.to_svg().encode())
+            source = path_set
+            artifacts = image.artifacts
+
+        # Path filtrati, semplificati e ordinati: l'ordine greedy non dipende dalla dimensione,
+        # la semplificazione in mm, l'appiattimento delle curve SVG e l'ottimizzazione del percorso sì
+        optimize_travel = params.get("optimize_travel", False)
+        tolerance_mm = simplify_tolerance_mm(params)
+        order_params = {"optimize_travel": optimize_travel, "tolerance_mm": tolerance_mm}
+        if optimize_travel or tolerance_mm is not None or is_svg:
+            order_params["size"] = (params["width_mm"], params["height_mm"])
+        with stage("order") as info:
+            prepared = result_cache.get_or_compute(
+                result_cache.key("ordered", paths_key, **order_params),
+                lambda: gcode_service.prepare_paths(
+                    source, params["width_mm"], params["height_mm"], optimize_travel=optimize_travel,
+                    tolerance_mm=tolerance_mm
+                )
+            )
+            if prepared is None:
+                raise NoDrawablePathsError("No drawable paths found in image")
+            info.update(paths=len(prepared.paths))
+        return prepared, svg_path, artifacts
+
+    def run(self, file_path: str, params: dict, on_stage=None) -> dict:
+        """
+        params: i campi di PrintRequest (x_mm, y_mm, width_mm, height_mm, rotation, ...).
+        on_stage(stage, status, info): callback opzionale per lo stato dei singoli stadi.
+        Restituisce i dettagli del job (gli stessi riportati da /print).
+        """
+        stage = _StageReporter(on_stage)
+        file_path = Path(file_path)
+        prepared, svg_path, artifacts = self.prepare(file_path, params, stage)
+
+        # C. Generazione G-Code con trasformazione coordinate
+        # Qui passiamo i millimetri e la scala decisi dall'utente in Angular.
+        # Il G-code viene scritto in streaming fra gli artefatti, con un nome dato da immagine e
+        # parametri (lo stesso job riscrive lo stesso file): in memoria resta solo il riepilogo.
+        gcode_key = result_cache.key(
+            "gcode", result_cache.hash_file(str(file_path)),
+            **{k: v for k, v in params.items() if k not in _OUTPUT_NEUTRAL_PARAMS},
+        )
+        print("Step 3: Generating G-Code...")
+        gcode_file = artifact_store.open(gcode_key, ".gcode", buffering=gcode_service.WRITE_BUFFER)
+        with stage("gcode") as info, gcode_file as sink:
+            gcode_summary = gcode_service.write_gcode(
+                source=prepared,
+                target_x=params["x_mm"],
+                target_y=params["y_mm"],
+                target_width=params["width_mm"],
+                target_height=params["height_mm"],
+                rotation=params.get("rotation", 0.0),
+                adaptive_feed=params.get("adaptive_feed", False),
+                compact=params.get("compact", False),
+                sink=sink
+            )
+            info.update(lines=gcode_summary.lines, bytes=gcode_summary.bytes,
+                        estimated_time_s=gcode_summary.estimated_time_s)
+
+        gcode_path = artifact_store.path(gcode_key, ".gcode")
+        print(f"GCode salvato con successo: {gcode_path}")
+
+        # D. Invio ai motori: non nel worker, ma con POST /plotter/jobs (PlotterDriverService)
+
+        return {
+            "svg": artifact_store.relative(svg_path) if svg_path else None,
+            "gcode": artifact_store.relative(gcode_path),
+            "commands": gcode_summary.lines,
+            "bytes": gcode_summary.bytes,
+            "estimated_time_s": gcode_summary.estimated_time_s,
+            "motion": gcode_summary.motion,
+            "bbox": gcode_summary.bbox,
+            "travel": gcode_summary.travel,
+            "simplification": gcode_summary.simplification,
+            "compaction": gcode_summary.compaction,
+            "debug_artifacts": [Path(p).name for p in artifacts]
+        }
+
+
+    def run_batch(self, items: list, params: dict, on_stage=None) -> dict:
+        """
+        Layout di più disegni in un unico job (/print/batch).
+        items: [{file_path, x_mm, y_mm, width_mm, height_mm, rotation}], nell'ordine del composer.
+        params: opzioni comuni (tolerance_mm, optimize_travel, adaptive_feed, compact).
+        Le immagini vengono preparate in parallelo (stadi A+B e ordinamento, con la cache di /print),
+        poi GCodeService ordina tutti i path insieme e scrive un solo programma G-code.
+        """
+        stage = _StageReporter(on_stage)
+
+        # Un task per ogni coppia distinta (immagine, dimensione): le copie dello stesso
+        # disegno sul foglio vengono preparate una volta sola. L'ottimizzazione del percorso
+        # è globale, sul layout intero, quindi non serve per le singole immagini.
+        tasks = {}
+        for item in items:
+            key = (item["file_path"], item["width_mm"], item["height_mm"])
+            tasks.setdefault(key, {**params, "width_mm": item["width_mm"], "height_mm": item["height_mm"],
+                                   "optimize_travel": False})
+        print(f"Step 1-2: Preparing {len(tasks)} images for a layout of {len(items)}...")
+        with stage("prepare") as info:
+            workers = min(self.layout_workers, len(tasks))
+            if workers > 1:
+                # Pool del solo job: un pool che sopravvive al job bloccherebbe l'uscita del worker
+                # della coda (multiprocessing attende i processi figli prima degli atexit)
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    results = list(pool.map(_prepare_placement, [key[0] for key in tasks], tasks.values()))
+            else:
+                results = [_prepare_placement(key[0], task) for key, task in tasks.items()]
+            prepared = dict(zip(tasks, results))
+            info.update(images=len(items), unique=len(tasks), workers=workers)
+
+        placements = []
+        skipped = []
+        for item in items:
+            paths = prepared[(item["file_path"], item["width_mm"], item["height_mm"])]
+            if paths is None:
+                skipped.append(Path(item["file_path"]).name)
+                continue
+            placements.append(Placement(paths, item["x_mm"], item["y_mm"], item["width_mm"], item["height_mm"],
+                                        item.get("rotation", 0.0)))
+        if not placements:
+            raise NoDrawablePathsError("No drawable paths found in any image of the layout")
+
+        # Nome content-addressed: lo stesso layout riscrive lo stesso file
+        layout_key = result_cache.key(
+            "layout", "", images=[result_cache.hash_file(item["file_path"]) for item in items],
+            items=[{k: v for k, v in item.items() if k != "file_path"} for item in items],
+            params={k: v for k, v in params.items() if k not in _OUTPUT_NEUTRAL_PARAMS},
+        )
+
+        print("Step 3: Generating layout G-Code...")
+        gcode_file = artifact_store.open(layout_key, ".gcode", buffering=gcode_service.WRITE_BUFFER)
+        with stage("gcode") as info, gcode_file as sink:
+            gcode_summary = gcode_service.write_layout_gcode(
+                placements,
+                sink=sink,
+                optimize_travel=params.get("optimize_travel", False),
+                adaptive_feed=params.get("adaptive_feed", False),
+                compact=params.get("compact", False),
+            )
+            info.update(lines=gcode_summary.lines, bytes=gcode_summary.bytes,
+                        estimated_time_s=gcode_summary.estimated_time_s)
+
+        output_path = artifact_store.path(layout_key, ".gcode")
+        print(f"GCode salvato con successo: {output_path}")
+        return {
+            "gcode": artifact_store.relative(output_path),
+            "images": len(items),
+            "skipped": skipped,
+            "commands": gcode_summary.lines,
+            "bytes": gcode_summary.bytes,
+            "estimated_time_s": gcode_summary.estimated_time_s,
+            "motion": gcode_summary.motion,
+            "bbox": gcode_summary.bbox,
+            "travel": gcode_summary.travel,
+            "compaction": gcode_summary.compaction,
+        }
+
+
+def _prepare_placement(file_path: str, params: dict):
+    """Task del pool di run_batch: PreparedPaths di un'immagine, None se non ha tratti disegnabili."""
+    try:
+        prepared, _, _ = print_pipeline_service.prepare(Path(file_path), params, _StageReporter(None))
+    except NoDrawablePathsError:
+        return None
+    return prepared
+
+
+class _StageReporter:
+    """Context manager che misura uno stadio e ne notifica inizio/fine/errore."""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def __call__(self, name):
+        return _Stage(self.callback, name)
+
+    def skip(self, *names):
+        if self.callback:
+            for name in names:
+                self.callback(name, "cached", {})
+
+
+class _Stage:
+    def __init__(self, callback, name):
+        self.callback = callback
+        self.name = name
+        self.info = {}
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        if self.callback:
+            self.callback(self.name, "running", {})
+        return self.info
+
+    def __exit__(self, exc_type, exc, tb):
+        self.info["duration_s"] = round(time.perf_counter() - self.start, 4)
+        if self.callback:
+            self.callback(self.name, "failed" if exc_type else "done", self.info)
+        return False
+
+
+print_pipeline_service = PrintPipelineService(layout_workers=settings.LAYOUT_WORKERS)
+
+
+def run_print_job(file_path: str, params: dict, on_stage=None) -> dict:
+    """
+    Entry point picklabile per i worker del process pool. Allega al risultato le misure
+    dei singoli stadi ('metrics') e, se richiesto, il path del profilo del job ('profile').
+    """
+    profile_name = f"print_{Path(file_path).stem}_{int(time.time() * 1000)}"
+    with metrics_service.collect() as recorder:
+        with metrics_service.profile(profile_name, force=params.get("profile", False)) as prof:
+            result = print_pipeline_service.run(file_path, params, on_stage)
+    result["metrics"] = recorder.stages
+    if "path" in prof:
+        result["profile"] = os.path.basename(prof["path"])
+    return result
+
+
+def run_batch_print_job(items: list, params: dict, on_stage=None) -> dict:
+    """Entry point picklabile del layout (/print/batch), con metriche e profilo come run_print_job."""
+    profile_name = f"layout_{len(items)}_{int(time.time() * 1000)}"
+    with metrics_service.collect() as recorder:
+        with metrics_service.profile(profile_name, force=params.get("profile", False)) as prof:
+            result = print_pipeline_service.run_batch(items, params, on_stage)
+    result["metrics"] = recorder.stages
+    if "path" in prof:
+        result["profile"] = os.path.basename(prof["path"])
+    return result
+
+
+def warm_up():
+    """Warm-up dei worker (JobQueueService.warm_up): import del modulo e dipendenze caricate al primo uso."""
+    skeleton_service.preload()
@@ -1,46 +1,71 @@
+import math
 import cv2
 import numpy as np
 import os
-from skimage.morphology import skeletonize
-from skimage import util
+from app.core.config import settings
+from app.services.metrics import metrics_service
+from app.services.skeleton import skeleton_service
 
 class ProcessingService:
     def preprocess_image(self, input_path: str) -> str:
+        """
+        Binarizza e scheletrizza l'immagine e salva il risultato come '<nome>_processed<ext>'.
+        """
+        final_img = self.skeletonize_image(input_path)
+
+        # Determinazione path di output
+        dir_name = os.path.dirname(input_path)
+        base_name = os.path.basename(input_path)
+        name, ext = os.path.splitext(base_name)
+        output_filename = f"{name}_processed{ext}"
+        output_path = os.path.join(dir_name, output_filename)
+        
+        cv2.imwrite(output_path, final_img)
+        return output_path
+
+    def skeletonize_image(self, input_path: str) -> np.ndarray:
+        """
+        Come preprocess_image ma restituisce lo scheletro in memoria
+        (uint8, sfondo bianco 255 e linee nere 0) senza scriverlo su disco.
+        """
+        return self.skeletonize_array(self.load_image(input_path))
+
+    def load_image(self, input_path: str) -> np.ndarray:
+        """Passi 1-2: decodifica l'immagine e la restituisce in scala di grigi (uint8)."""
         if not os.path.exists(input_path):
             raise FileNotFoundError(f"Image not found: {input_path}")
             
         # 1. Caricamento
-        img = cv2.imread(input_path)
-        if img is None:
-            raise ValueError(f"Could not read image: {input_path}")
-            
-        # 2. Grayscale
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        with metrics_service.stage("image_load") as info:
+            img = cv2.imread(input_path)
+            if img is None:
+                raise ValueError(f"Could not read image: {input_path}")
+                
+            # 2. Grayscale
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            info["pixels"] = gray.size
+        return gray
 
-        # 3. Gaussian Blur: Sfoca leggermente per unire i pixel "vicini ma staccati"
-        blurred = cv2.GaussianBlur(gray, (3, 3), 0)
-        
-        # 4. Otsu Thresholding (Invertito: Oggetto Bianco, Sfondo Nero)
-        _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-        
-        # 5. Chiusura Morfologica: Tappa i micro-buchi all'interno delle linee
-        # Usiamo un kernel ellittico che è più naturale per i tratti a mano
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
-        closed = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel, iterations=1)
-
-        # 6. Dilatazione leggera per unire tratti molto vicini prima dello scheletro
-        dilated = cv2.dilate(closed, kernel, iterations=1)
+    def skeletonize_array(self, gray: np.ndarray) -> np.ndarray:
+        """
+        Passi 3-8 su un'immagine in scala di grigi già in memoria: restituisce lo scheletro
+        (uint8, sfondo bianco 255 e linee nere 0).
+        """
+        return self.skeletonize_mask(self.binarize(gray))
 
-        # 7. Skeletonization con Scikit-Image (Metodo Lee)
-        # Scikit-image vuole un array booleano (True/False) o 0/1.
-        # Convertiamo l'immagine OpenCV (0-255) in bool.
-        binary_bool = dilated > 127
-        
-        # Eseguiamo la scheletrizzazione
-        skeleton_bool = skeletonize(binary_bool, method='lee')
-        
-        # Convertiamo di nuovo in uint8 (0-255) per OpenCV
-        skeleton_uint8 = util.img_as_ubyte(skeleton_bool)
+    def skeletonize_mask(self, dilated: np.ndarray) -> np.ndarray:
+        """Passi 7-8 sulla maschera di binarize(): scheletro con sfondo bianco e linee nere."""
+        with metrics_service.stage("skeletonize") as info:
+            # 7. Skeletonization (default Scikit-Image, Metodo Lee; vedi SkeletonService)
+            # Scikit-image vuole un array booleano (True/False) o 0/1.
+            # Convertiamo l'immagine OpenCV (0-255) in bool.
+            binary_bool = dilated > 127
+            
+            # Eseguiamo la scheletrizzazione (a tile su più processi per le immagini grandi)
+            skeleton_bool = skeleton_service.skeletonize(binary_bool, info=info)
+            
+            # Convertiamo di nuovo in uint8 (0-255) per OpenCV (come skimage.util.img_as_ubyte)
+            skeleton_uint8 = skeleton_bool.astype(np.uint8) * 255
         
         # 8. Inversione finale per il salvataggio/vettorializzatore
         # Il vettorializzatore si aspetta: Sfondo Bianco, Linee Nere (o viceversa, ma controlliamo vectorization.py)
@@ -49,16 +74,64 @@ class ProcessingService:
         # skeleton_uint8 ha Linee Bianche (255), Sfondo Nero (0).
         # Quindi dobbiamo invertire.
         final_img = cv2.bitwise_not(skeleton_uint8)
+        return final_img
+
+    def working_resolution(self, shape, width_mm: float, height_mm: float,
+                           pen_width_mm: float = None, px_per_pen: float = None) -> dict:
+        """
+        Risoluzione di lavoro per stampare un'immagine di dimensioni `shape` a width_mm x height_mm:
+        la penna non distingue dettagli più fini della sua larghezza, quindi bastano px_per_pen pixel
+        per larghezza di penna (PREPROCESS_PX_PER_PEN, 0 = sempre a piena risoluzione).
+        Restituisce {'scale': fattore di riduzione <= 1, 'kernel': lato dei kernel in pixel}.
+        La scala è arrotondata per eccesso a passi di 2^(1/4): piccoli ridimensionamenti nel
+        composer riusano lo stesso scheletro in cache. Solo se l'immagine viene ridotta, i kernel
+        (blur e morfologia) coprono una larghezza di penna alla risoluzione di lavoro, cioè circa
+        px_per_pen pixel (dispari, almeno 3); a piena risoluzione restano 3x3 come in origine.
+        """
+        pen_width_mm = pen_width_mm or settings.PEN_WIDTH_MM
+        px_per_pen = settings.PREPROCESS_PX_PER_PEN if px_per_pen is None else px_per_pen
+        height, width = shape[:2]
+        scale = 1.0
+        if px_per_pen > 0 and width_mm > 0 and height_mm > 0:
+            needed = max(width_mm / width, height_mm / height) * px_per_pen / pen_width_mm
+            if needed < 1.0:
+                scale = 2.0 ** (-math.floor(-4 * math.log2(needed)) / 4)
+
+        kernel = max(3, int(round(px_per_pen)) | 1) if scale < 1.0 else 3
+        return {"scale": scale, "kernel": kernel}
+
+    def downsample(self, gray: np.ndarray, scale: float) -> np.ndarray:
+        """Riduce l'immagine al fattore scale (INTER_AREA: media dei pixel, niente aliasing delle linee)."""
+        if scale >= 1.0:
+            return gray
+        with metrics_service.stage("downsample") as info:
+            size = (max(1, round(gray.shape[1] * scale)), max(1, round(gray.shape[0] * scale)))
+            small = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+            info["pixels"] = small.size
+        return small
+
+    def binarize(self, gray: np.ndarray, kernel_size: int = 3) -> np.ndarray:
+        """
+        Passi 3-6 su un'immagine in scala di grigi: restituisce la maschera dei tratti
+        (uint8, tratti bianchi 255 su sfondo nero 0) pronta per la scheletrizzazione.
+        kernel_size: lato (dispari) dei kernel di blur e morfologia, vedi working_resolution.
+        """
+        with metrics_service.stage("blur_threshold"):
+            # 3. Gaussian Blur: Sfoca leggermente per unire i pixel "vicini ma staccati"
+            blurred = cv2.GaussianBlur(gray, (kernel_size, kernel_size), 0)
+            
+            # 4. Otsu Thresholding (Invertito: Oggetto Bianco, Sfondo Nero)
+            _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
         
-        # Determinazione path di output
-        dir_name = os.path.dirname(input_path)
-        base_name = os.path.basename(input_path)
-        name, ext = os.path.splitext(base_name)
-        output_filename = f"{name}_processed{ext}"
-        output_path = os.path.join(dir_name, output_filename)
-        
-        cv2.imwrite(output_path, final_img)
-        return output_path
+        with metrics_service.stage("morphology"):
+            # 5. Chiusura Morfologica: Tappa i micro-buchi all'interno delle linee
+            # Usiamo un kernel ellittico che è più naturale per i tratti a mano
+            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
+            closed = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel, iterations=1)
+
+            # 6. Dilatazione leggera per unire tratti molto vicini prima dello scheletro
+            dilated = cv2.dilate(closed, kernel, iterations=1)
+        return dilated
 
     # _skeletonize rimosso perché usiamo skimage
 
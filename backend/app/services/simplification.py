@@ -0,0 +1,139 @@
+import cv2
+import numpy as np
+
+from app.core.config import settings
+
+
+class SimplificationService:
+    """
+    Stadio di semplificazione dei path (Ramer-Douglas-Peucker), applicato a tutti i path
+    di un job in una sola chiamata. Lunghezze, tolleranze per path, filtro dei passi sotto
+    la risoluzione e statistiche sono calcolati in batch su un unico array; per l'RDP vero
+    e proprio resta approxPolyDP (C++), più veloce di qualunque RDP vettoriale in NumPy.
+    """
+
+    def simplify(self, paths, tolerance, min_step: float = 0.0):
+        """
+        paths: lista di array (N, 2) non vuoti. tolerance: scostamento massimo ammesso
+        (stesse unità dei punti), scalare oppure un valore per path. min_step: i punti interni
+        più vicini di così al precedente vengono scartati (passi che la penna non risolve).
+        Primo e ultimo punto di ogni path restano sempre.
+        Restituisce (path semplificati, stats) con stats = {points_before, points_after, reduction_ratio}.
+        """
+        points_before = sum(len(p) for p in paths)
+        tolerance = np.broadcast_to(np.asarray(tolerance, dtype=np.float64), (len(paths),)).tolist()
+
+        simplified = []
+        for path, eps in zip(paths, tolerance):
+            if len(path) > 2 and eps > 0:
+                path = self._approx(path, eps)
+            simplified.append(path)
+
+        if min_step > 0 and simplified:
+            simplified = self._drop_short_steps(simplified, min_step)
+        return simplified, self._stats(points_before, sum(len(p) for p in simplified))
+
+    def path_lengths(self, paths, closed: bool = False) -> np.ndarray:
+        """Lunghezza di tutti i path in un colpo solo (come cv2.arcLength, anche chiusi)."""
+        if not paths:
+            return np.zeros(0)
+        points, offsets = self._pack(paths)
+        steps = np.zeros(len(points))
+        steps[1:] = np.hypot(*np.diff(points, axis=0).T)
+        # Il primo punto di ogni path non ha passo (niente salto dal path precedente)
+        steps[offsets[:-1]] = 0.0
+        lengths = np.diff(np.concatenate([[0.0], np.cumsum(steps)])[offsets])
+        if closed:
+            first = points[offsets[:-1]]
+            last = points[offsets[1:] - 1]
+            lengths += np.hypot(*(last - first).T)
+        return lengths
+
+    def tolerance_px(self, bbox, target_width: float, target_height: float, tolerance_mm: float = None) -> float:
+        """
+        Tolleranza in unità sorgente corrispondente a tolerance_mm sul piano del plotter
+        (mai sotto la risoluzione meccanica: punti più fitti non sono riproducibili dalla penna).
+        Con scala diversa sui due assi vale quella più grande, così in nessuna direzione
+        lo scostamento supera la tolleranza in mm. None = SIMPLIFY_TOLERANCE_MM.
+        """
+        if tolerance_mm is None:
+            tolerance_mm = settings.SIMPLIFY_TOLERANCE_MM
+        tolerance_mm = max(tolerance_mm, settings.PLOTTER_RESOLUTION_MM)
+        width = bbox[2] - bbox[0]
+        height = bbox[3] - bbox[1]
+        scale = max(target_width / width if width else 0.0, target_height / height if height else 0.0)
+        return tolerance_mm / scale if scale else 0.0
+
+    # --- Interni ---
+
+    def _approx(self, path, eps):
+        # Path chiuso (primo punto = ultimo): approxPolyDP aperto perde i punti di chiusura,
+        # si semplificano le due metà separate dal punto più lontano dall'inizio
+        if len(path) > 3 and (path[0] == path[-1]).all():
+            far = int(np.argmax(((path - path[0]) ** 2).sum(axis=1)))
+            return np.concatenate([self._approx_open(path[:far + 1], eps)[:-1],
+                                   self._approx_open(path[far:], eps)])
+        return self._approx_open(path, eps)
+
+    def _approx_open(self, path, eps):
+        if len(path) <= 2:
+            return path
+        # approxPolyDP accetta solo int32/float32
+        if path.dtype in (np.int32, np.float32):
+            return cv2.approxPolyDP(path.reshape(-1, 1, 2), eps, False).reshape(-1, 2)
+        approx = cv2.approxPolyDP(path.astype(np.float32).reshape(-1, 1, 2), eps, False)
+        return approx.reshape(-1, 2).astype(path.dtype)
+
+    def _drop_short_steps(self, paths, min_step):
+        """
+        Scarta i punti interni più vicini di min_step all'ultimo punto tenuto (non al precedente:
+        una catena di passi corti viene sfoltita finché il passo accumulato non arriva a min_step).
+        Primo e ultimo punto restano; se l'ultimo è troppo vicino all'ultimo tenuto, prende il suo
+        posto. Ogni punto scartato dista meno di min_step da un punto tenuto.
+        """
+        points, offsets = self._pack(paths)
+        step = np.full(len(points), np.inf)
+        step[1:] = np.hypot(*np.diff(points, axis=0).T)
+        step[offsets[:-1]] = np.inf
+
+        # Solo i path con almeno un passo corto vanno percorsi punto per punto
+        short_paths = np.flatnonzero(np.add.reduceat(step < min_step, offsets[:-1]) > 0) \
+            if len(points) else np.zeros(0, dtype=np.int64)
+        short_paths = [i for i in short_paths.tolist() if offsets[i + 1] - offsets[i] > 2]
+        if not short_paths:
+            return paths
+
+        result = list(paths)
+        min_step_sq = min_step * min_step
+        for i in short_paths:
+            path = result[i]
+            coords = path.tolist()
+            keep = [0]
+            last_x, last_y = coords[0]
+            for j in range(1, len(coords) - 1):
+                x, y = coords[j]
+                if (x - last_x) ** 2 + (y - last_y) ** 2 >= min_step_sq:
+                    keep.append(j)
+                    last_x, last_y = x, y
+            x, y = coords[-1]
+            if len(keep) > 1 and (x - last_x) ** 2 + (y - last_y) ** 2 < min_step_sq:
+                keep[-1] = len(coords) - 1
+            else:
+                keep.append(len(coords) - 1)
+            result[i] = path[keep]
+        return result
+
+    def _pack(self, paths):
+        offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in paths], out=offsets[1:])
+        return np.concatenate(paths).astype(np.float64, copy=False), offsets
+
+    def _stats(self, before, after):
+        return {
+            "points_before": before,
+            "points_after": after,
+            "reduction_ratio": round(before / after, 2) if after else 0.0,
+        }
+
+
+simplification_service = SimplificationService()
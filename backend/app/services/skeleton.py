@@ -0,0 +1,154 @@
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+
+# Backend di thinning disponibili:
+# - lee: skimage, metodo di Lee (quello storico, default)
+# - zhang: skimage, Zhang-Suen (più veloce, scheletro leggermente diverso)
+# - ximgproc: OpenCV contrib (cv2.ximgproc.thinning, Zhang-Suen in C++), il più veloce;
+#   richiede opencv-contrib-python, altrimenti si ripiega su 'zhang'
+BACKENDS = ("lee", "zhang", "ximgproc")
+
+
+def ximgproc_available() -> bool:
+    return hasattr(cv2, "ximgproc") and hasattr(cv2.ximgproc, "thinning")
+
+
+def _thin(binary: np.ndarray, backend: str) -> np.ndarray:
+    """Scheletro di un'immagine booleana (True = tratto) con il backend indicato."""
+    if backend == "ximgproc":
+        thinned = cv2.ximgproc.thinning(binary.astype(np.uint8) * 255, thinningType=cv2.ximgproc.THINNING_ZHANGSUEN)
+        return thinned > 0
+    # scikit-image (e scipy) costa da solo centinaia di ms di import: caricato al primo uso,
+    # i job che trovano i path in cache non lo importano mai
+    from skimage.morphology import skeletonize
+    return skeletonize(binary, method=backend)
+
+
+def _thin_tile(task):
+    # Eseguito nei processi del pool: task = (tile con margine, backend)
+    tile, backend = task
+    return _thin(tile, backend)
+
+
+class SkeletonService:
+    """
+    Scheletrizzazione delle immagini binarizzate, anche a tasselli su più processi.
+
+    In modalità a tasselli l'immagine viene divisa in tile sovrapposte: ogni tile viene
+    scheletrizzata con un margine attorno e se ne tiene solo la parte centrale. Il thinning
+    è un'operazione locale (ogni iterazione guarda solo i vicini 3x3 e il numero di iterazioni
+    è limitato dallo spessore del tratto), quindi con un margine più largo dei tratti più
+    spessi le cuciture coincidono con lo scheletro calcolato sull'immagine intera.
+    """
+
+    # Margine minimo (px) attorno a ogni tile
+    MIN_OVERLAP = 16
+
+    def __init__(self, backend: str, tile_size: int, tile_min_pixels: int, workers: int):
+        self.backend = backend
+        self.tile_size = tile_size
+        self.tile_min_pixels = tile_min_pixels
+        self.workers = workers
+
+    def resolve_backend(self, backend: str = None) -> str:
+        backend = backend or self.backend
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown skeleton backend: {backend} (choose from {', '.join(BACKENDS)})")
+        if backend == "ximgproc" and not ximgproc_available():
+            print("Skeleton: cv2.ximgproc non disponibile (serve opencv-contrib), uso 'zhang'")
+            return "zhang"
+        return backend
+
+    def preload(self):
+        """Importa subito il backend di thinning configurato (warm-up dei worker)."""
+        if self.resolve_backend() != "ximgproc":
+            import skimage.morphology  # noqa: F401
+
+    def params(self) -> dict:
+        """Parametri che cambiano il risultato (per le chiavi della cache)."""
+        return {"backend": self.resolve_backend()}
+
+    def skeletonize(self, binary: np.ndarray, backend: str = None, tile_size: int = None,
+                    workers: int = None, info: dict = None) -> np.ndarray:
+        """
+        binary: array booleano (True = tratto). Restituisce lo scheletro booleano.
+        Le immagini sopra tile_min_pixels vengono lavorate a tile di tile_size px su `workers` processi.
+        info: dict opzionale che riceve backend e numero di tile (per le metriche).
+        """
+        backend = self.resolve_backend(backend)
+        tile_size = tile_size if tile_size is not None else self.tile_size
+        workers = workers if workers is not None else self.workers
+        if info is not None:
+            info["backend"] = backend
+
+        h, w = binary.shape
+        if tile_size <= 0 or (h <= tile_size and w <= tile_size) or h * w < self.tile_min_pixels:
+            return _thin(binary, backend)
+        return self._skeletonize_tiled(binary, backend, tile_size, workers, info)
+
+    def overlap_for(self, binary: np.ndarray) -> int:
+        """
+        Margine necessario attorno a ogni tile: il thinning di un tratto spesso 2r termina
+        in ~r iterazioni e ogni iterazione propaga l'informazione di un pixel, quindi
+        teniamo il doppio dello spessore massimo più una riserva.
+        """
+        dist = cv2.distanceTransform(binary.astype(np.uint8), cv2.DIST_L2, 3)
+        return max(self.MIN_OVERLAP, 2 * math.ceil(float(dist.max())) + 8)
+
+    def iter_tiles(self, shape, tile_size: int, overlap: int):
+        """(core, padded) per ogni tile: slice della parte tenuta e della finestra con margine."""
+        h, w = shape
+        for y0 in range(0, h, tile_size):
+            y1 = min(y0 + tile_size, h)
+            for x0 in range(0, w, tile_size):
+                x1 = min(x0 + tile_size, w)
+                core = (slice(y0, y1), slice(x0, x1))
+                padded = (slice(max(y0 - overlap, 0), min(y1 + overlap, h)),
+                          slice(max(x0 - overlap, 0), min(x1 + overlap, w)))
+                yield core, padded
+
+    # --- Interni ---
+
+    def _skeletonize_tiled(self, binary, backend, tile_size, workers, info):
+        overlap = self.overlap_for(binary)
+        tasks, cores = [], []
+        for core, padded in self.iter_tiles(binary.shape, tile_size, overlap):
+            # Le tile senza tratti nella parte centrale restano vuote anche nello scheletro
+            if not binary[core].any():
+                continue
+            tasks.append((binary[padded], backend))
+            # Posizione della parte centrale dentro la finestra con margine
+            inner = (slice(core[0].start - padded[0].start, core[0].stop - padded[0].start),
+                     slice(core[1].start - padded[1].start, core[1].stop - padded[1].start))
+            cores.append((core, inner))
+
+        if workers > 1 and len(tasks) > 1:
+            # Pool della sola chiamata, come run_batch: un pool che sopravvive bloccherebbe l'uscita
+            # del worker della coda (multiprocessing attende i processi figli prima degli atexit)
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                results = list(pool.map(_thin_tile, tasks))
+        else:
+            results = map(_thin_tile, tasks)
+
+        skeleton = np.zeros(binary.shape, dtype=bool)
+        for (core, inner), thinned in zip(cores, results):
+            skeleton[core] = thinned[inner]
+
+        if info is not None:
+            info.update(tiles=len(tasks), tile_size=tile_size, overlap=overlap, workers=workers)
+        return skeleton
+
+
+skeleton_service = SkeletonService(
+    backend=settings.SKELETON_BACKEND,
+    tile_size=settings.SKELETON_TILE_SIZE,
+    tile_min_pixels=settings.SKELETON_TILE_MIN_PIXELS,
+    workers=settings.SKELETON_WORKERS,
+)
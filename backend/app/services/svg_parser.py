@@ -0,0 +1,469 @@
+import math
+import re
+import xml.etree.ElementTree as ET
+from array import array
+
+import numpy as np
+
+from app.services.simplification import simplification_service
+
+# Comandi del path e numero di argomenti per ripetizione (spec SVG 1.1, 8.3)
+_ARITY = {"M": 2, "L": 2, "H": 1, "V": 1, "C": 6, "S": 4, "Q": 4, "T": 2, "A": 7, "Z": 0}
+_COMMANDS = frozenset(_ARITY) | frozenset(c.lower() for c in _ARITY)
+
+# Un solo passaggio di tokenizzazione: comandi e numeri ("10-5" e "1.5.5" sono due numeri)
+_TOKEN = re.compile(r"[MmZzLlHhVvCcSsQqTtAa]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_INVALID = re.compile(r"[^MmZzLlHhVvCcSsQqTtAa0-9eE.,+\-\s]")
+_LETTERS = re.compile(r"[A-DF-Za-df-z]")
+_TRANSFORM = re.compile(r"(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)")
+
+# Contenitori il cui contenuto non viene disegnato direttamente
+_HIDDEN = frozenset({"defs", "clipPath", "mask", "symbol", "marker", "pattern", "metadata"})
+
+
+class SvgParseError(ValueError):
+    """File SVG non leggibile (XML malformato)."""
+
+
+class SvgParserService:
+    """
+    Parser dei path SVG per GCodeService: grammatica completa del path (M/L/H/V/C/S/Q/T/A/Z,
+    assoluti e relativi), attributi transform dei gruppi e curve appiattite con una tolleranza.
+
+    Il documento è letto in streaming con iterparse: ogni elemento viene liberato appena
+    chiuso, quindi in memoria restano solo le coordinate (array compatti di double) e non
+    l'albero XML. Ogni stringa 'd' viene tokenizzata una volta sola; quadratiche e archi
+    diventano cubiche. Trasformazioni e appiattimento delle curve sono fatti alla fine in
+    blocco su tutti i punti, con un numero di segmenti per curva stimato dalla sua curvatura
+    (formula di Wang) in base alla tolleranza.
+    """
+
+    # Segmenti massimi per curva (protegge da tolleranze assurde)
+    MAX_SEGMENTS = 1024
+    # Punti campionati per blocco: limita gli array temporanei dell'appiattimento
+    SAMPLE_BLOCK = 1 << 18
+
+    def parse(self, source, tolerance: float = 0.1, target_size=None, tolerance_mm: float = None,
+              info: dict = None) -> list:
+        """
+        source: path di un file SVG oppure file aperto in lettura.
+        tolerance: scostamento massimo delle curve appiattite, in unità utente SVG.
+        target_size: (larghezza, altezza) di stampa in mm; se indicata la tolleranza è
+        tolerance_mm sul piano del plotter (SimplificationService.tolerance_px sul bounding box).
+        Restituisce una lista di array (N, 2) float64, un path per sottopercorso.
+        I dati malformati di un path non sono fatali: come da specifica, il path viene disegnato
+        fino al primo errore (contati in info['errors']). XML illeggibile -> SvgParseError.
+        """
+        data = self._read(source)
+        if info is not None:
+            info["errors"] = data.errors
+        if not data.subpath_start:
+            return []
+
+        anchors, curves = data.transformed()
+        if target_size is not None:
+            # Bounding box sui soli punti di passaggio: mai più grande di quello vero, quindi
+            # la tolleranza in unità utente non è mai più larga di quella richiesta in mm
+            bbox = (*anchors.min(axis=0).tolist(), *anchors.max(axis=0).tolist())
+            tolerance = simplification_service.tolerance_px(bbox, *target_size, tolerance_mm)
+
+        if info is not None:
+            info["curves"] = len(curves)
+        return self._flatten(anchors, curves, data, tolerance)
+
+    def parse_transform(self, value: str) -> np.ndarray:
+        """Attributo transform -> matrice affine 3x3 (le trasformazioni si compongono da sinistra)."""
+        matrix = np.eye(3)
+        for name, args in _TRANSFORM.findall(value or ""):
+            v = [float(n) for n in _NUMBER.findall(args)]
+            m = np.eye(3)
+            if name == "matrix" and len(v) == 6:
+                m[:2] = [[v[0], v[2], v[4]], [v[1], v[3], v[5]]]
+            elif name == "translate" and v:
+                m[:2, 2] = [v[0], v[1] if len(v) > 1 else 0.0]
+            elif name == "scale" and v:
+                m[0, 0], m[1, 1] = v[0], v[1] if len(v) > 1 else v[0]
+            elif name == "rotate" and v:
+                a = math.radians(v[0])
+                m[:2, :2] = [[math.cos(a), -math.sin(a)], [math.sin(a), math.cos(a)]]
+                if len(v) == 3:
+                    # rotate(a, cx, cy) = translate(cx, cy) rotate(a) translate(-cx, -cy)
+                    m[:2, 2] = [v[1], v[2]] - m[:2, :2] @ [v[1], v[2]]
+            elif name == "skewX" and v:
+                m[0, 1] = math.tan(math.radians(v[0]))
+            elif name == "skewY" and v:
+                m[1, 0] = math.tan(math.radians(v[0]))
+            matrix = matrix @ m
+        return matrix
+
+    # --- Lettura del documento ---
+
+    def _read(self, source) -> "_PathData":
+        """Primo passaggio: scorre il documento in streaming e accumula i punti in _PathData."""
+        data = _PathData()
+        stack = [0]
+        elements = []
+        hidden = 0
+        try:
+            for event, elem in ET.iterparse(source, events=("start", "end")):
+                tag = elem.tag.rsplit("}", 1)[-1] if isinstance(elem.tag, str) else ""
+                if event == "start":
+                    elements.append(elem)
+                    transform = elem.get("transform")
+                    stack.append(data.add_matrix(stack[-1], self.parse_transform(transform)) if transform else stack[-1])
+                    hidden += tag in _HIDDEN
+                    continue
+
+                if tag == "path" and not hidden:
+                    d = elem.get("d")
+                    if d and not self._parse_d(d, data, stack[-1]):
+                        data.errors += 1
+
+                hidden -= tag in _HIDDEN
+                stack.pop()
+                elements.pop()
+                # Liberiamo l'elemento appena chiuso: il padre non accumula figli già letti
+                elem.clear()
+                if elements:
+                    del elements[-1][:]
+        except ET.ParseError as e:
+            raise SvgParseError(f"Invalid SVG: {e}") from e
+
+        if data.errors:
+            print(f"Warning: {data.errors} SVG path(s) with malformed data, drawn up to the first error")
+        return data
+
+    # --- Grammatica del path ---
+
+    def _parse_d(self, d: str, data: "_PathData", matrix: int) -> bool:
+        """
+        Interpreta un attributo 'd' aggiungendo punti e cubiche a data, in coordinate utente
+        assolute. Restituisce False se la stringa contiene un errore: quanto letto prima resta.
+        """
+        ok = True
+        invalid = _INVALID.search(d)
+        if invalid:
+            d, ok = d[:invalid.start()], False
+
+        if ok and set(_LETTERS.findall(d)) <= {"M", "L"}:
+            return self._parse_polyline(d, data, matrix)
+
+        tokens = _TOKEN.findall(d)
+        anchors = data.anchors
+        cx = cy = sx = sy = 0.0
+        # Ultimo punto di controllo, per la riflessione di S (dopo C/S) e di T (dopo Q/T)
+        kx = ky = 0.0
+        last = None
+        drawing = False
+        started = False
+        command = None
+        i, n = 0, len(tokens)
+        try:
+            while i < n:
+                token = tokens[i]
+                if token in _COMMANDS:
+                    command = token
+                    i += 1
+                    if command in "Zz":
+                        if drawing and (cx != sx or cy != sy):
+                            anchors.extend((sx, sy))
+                        # Dopo Z si riparte dall'inizio del sottopercorso chiuso; numeri qui sono un errore
+                        cx, cy, drawing, last, command = sx, sy, False, None, None
+                    continue
+                if command is None:
+                    return False
+
+                upper = command.upper()
+                if upper == "A":
+                    args, i = self._arc_args(tokens, i)
+                else:
+                    arity = _ARITY[upper]
+                    args = [float(t) for t in tokens[i:i + arity]]
+                    if len(args) < arity:
+                        return False
+                    i += arity
+                if command != upper:
+                    dx, dy = cx, cy
+                else:
+                    dx = dy = 0.0
+
+                if upper == "M":
+                    cx, cy = sx, sy = args[0] + dx, args[1] + dy
+                    data.begin_subpath(cx, cy, matrix)
+                    drawing = started = True
+                    last = None
+                    # Coppie successive di M sono lineto impliciti
+                    command = "L" if command == "M" else "l"
+                    continue
+                if not started:
+                    return False
+                if not drawing:
+                    data.begin_subpath(cx, cy, matrix)
+                    drawing = True
+
+                if upper == "L":
+                    cx, cy = args[0] + dx, args[1] + dy
+                    anchors.extend((cx, cy))
+                    last = None
+                elif upper == "H":
+                    cx = args[0] + dx
+                    anchors.extend((cx, cy))
+                    last = None
+                elif upper == "V":
+                    cy = args[0] + dy
+                    anchors.extend((cx, cy))
+                    last = None
+                elif upper == "C" or upper == "S":
+                    if upper == "C":
+                        x1, y1 = args[0] + dx, args[1] + dy
+                        args = args[2:]
+                    elif last == "C":
+                        x1, y1 = 2 * cx - kx, 2 * cy - ky
+                    else:
+                        x1, y1 = cx, cy
+                    kx, ky = args[0] + dx, args[1] + dy
+                    x, y = args[2] + dx, args[3] + dy
+                    data.add_cubic(cx, cy, x1, y1, kx, ky, x, y)
+                    cx, cy, last = x, y, "C"
+                elif upper == "Q" or upper == "T":
+                    if upper == "Q":
+                        kx, ky = args[0] + dx, args[1] + dy
+                        args = args[2:]
+                    elif last == "Q":
+                        kx, ky = 2 * cx - kx, 2 * cy - ky
+                    else:
+                        kx, ky = cx, cy
+                    x, y = args[0] + dx, args[1] + dy
+                    # Elevazione di grado esatta: la quadratica diventa una cubica
+                    data.add_cubic(cx, cy, cx + 2 / 3 * (kx - cx), cy + 2 / 3 * (ky - cy),
+                                   x + 2 / 3 * (kx - x), y + 2 / 3 * (ky - y), x, y)
+                    cx, cy, last = x, y, "Q"
+                else:
+                    x, y = args[5] + dx, args[6] + dy
+                    # Estremi coincidenti: l'arco si omette (spec SVG, F.6.2); raggio nullo: segmento
+                    if x != cx or y != cy:
+                        cubics = _arc_to_cubics(cx, cy, x, y, *args[:5])
+                        if cubics is None:
+                            anchors.extend((x, y))
+                        for cubic in cubics or ():
+                            data.add_cubic(*cubic)
+                    cx, cy, last = x, y, None
+        except (ValueError, IndexError):
+            # Argomenti mancanti o comando al posto di un numero
+            return False
+        return ok
+
+    def _parse_polyline(self, d: str, data: "_PathData", matrix: int) -> bool:
+        """
+        Caso più comune (es. gli SVG esportati da PathSet): solo M/L assoluti. Le coordinate
+        di ogni sottopercorso vengono convertite in blocco, senza lo stato per comando.
+        """
+        chunks = d.split("M")
+        if chunks[0].strip(" \t\r\n,"):
+            return False
+        for chunk in chunks[1:]:
+            values = array("d", map(float, _NUMBER.findall(chunk)))
+            if len(values) < 2:
+                return False
+            data.begin_subpath(values[0], values[1], matrix)
+            data.anchors.extend(values[2:len(values) - len(values) % 2])
+            if len(values) % 2:
+                return False
+        return True
+
+    def _arc_args(self, tokens, i):
+        """
+        Sette argomenti di A/a. I flag sono una sola cifra e possono essere attaccati al
+        numero successivo ("a5 5 0 1150 50"): il token viene spezzato e il resto riletto.
+        """
+        args = [float(tokens[i]), float(tokens[i + 1]), float(tokens[i + 2])]
+        i += 3
+        for _ in range(2):
+            token = tokens[i]
+            if token[0] not in "01":
+                raise ValueError(f"Invalid arc flag: {token}")
+            args.append(float(token[0]))
+            if len(token) > 1:
+                tokens[i] = token[1:]
+            else:
+                i += 1
+        args += [float(tokens[i]), float(tokens[i + 1])]
+        return args, i + 2
+
+    # --- Appiattimento ---
+
+    def _flatten(self, anchors, curves, data, tolerance):
+        """
+        Secondo passaggio, in blocco: ogni punto finale di una cubica viene sostituito dai
+        campioni della curva, poi i punti vengono divisi nei sottopercorsi. Le curve sono
+        campionate a blocchi di SAMPLE_BLOCK punti, scritti direttamente nell'array finale.
+        """
+        curve_end = np.frombuffer(data.curve_end, dtype=np.int64)
+        n = self._segments(curves, tolerance)
+        offsets = np.zeros(len(curves) + 1, dtype=np.int64)
+        np.cumsum(n, out=offsets[1:])
+
+        counts = np.ones(len(anchors), dtype=np.int64)
+        counts[curve_end] = n
+        starts = np.zeros(len(anchors) + 1, dtype=np.int64)
+        np.cumsum(counts, out=starts[1:])
+
+        points = np.empty((starts[-1], 2))
+        is_line = np.ones(len(anchors), dtype=bool)
+        is_line[curve_end] = False
+        points[starts[:-1][is_line]] = anchors[is_line]
+
+        first_sample = starts[curve_end] - offsets[:-1]
+        blocks = np.unique(np.searchsorted(offsets, np.arange(0, offsets[-1], self.SAMPLE_BLOCK), side="right") - 1)
+        for a, b in zip(blocks, np.append(blocks[1:], len(curves))):
+            curve = np.repeat(np.arange(a, b), n[a:b])
+            index = np.arange(offsets[a], offsets[b])
+            points[first_sample[curve] + index] = self._sample_cubics(curves, curve, index - offsets[curve] + 1, n)
+
+        bounds = starts[np.frombuffer(data.subpath_start, dtype=np.int64)]
+        return [p for p in np.split(points, bounds[1:]) if len(p) >= 2]
+
+    def _segments(self, curves, tolerance):
+        """
+        Segmenti per cubica: n = ceil(sqrt(3/4 * M / tolerance)), M = massima differenza
+        seconda dei punti di controllo (formula di Wang, con segmenti uniformi in t).
+        """
+        p0, p1, p2, p3 = curves[:, 0], curves[:, 1], curves[:, 2], curves[:, 3]
+        second = np.maximum(np.hypot(*(p0 - 2 * p1 + p2).T), np.hypot(*(p1 - 2 * p2 + p3).T))
+        n = np.ceil(np.sqrt(0.75 * second / max(tolerance, 1e-9)))
+        return np.clip(n, 1, self.MAX_SEGMENTS).astype(np.int64)
+
+    def _sample_cubics(self, curves, curve, step, n):
+        """Punto step/n[curve] di ogni curva indicata (polinomio in forma di Horner)."""
+        p0, p1, p2, p3 = (curves[curve, k] for k in range(4))
+        t = (step / n[curve])[:, None]
+        samples = p3 - p0 + 3 * (p1 - p2)
+        samples *= t
+        samples += 3 * (p0 - 2 * p1 + p2)
+        samples *= t
+        samples += 3 * (p1 - p0)
+        samples *= t
+        samples += p0
+        # L'ultimo campione è esattamente il punto finale (niente errori di arrotondamento)
+        last = step == n[curve]
+        samples[last] = p3[last]
+        return samples
+
+
+class _PathData:
+    """
+    Coordinate lette dal documento, in array compatti della libreria standard (8 byte per valore):
+    punti di passaggio (x, y), cubiche (8 valori: inizio, due controlli, fine) con l'indice del
+    loro punto finale, inizio e matrice di trasformazione di ogni sottopercorso.
+    """
+
+    def __init__(self):
+        self.anchors = array("d")
+        self.curves = array("d")
+        self.curve_end = array("q")
+        self.subpath_start = array("q")
+        self.subpath_matrix = array("q")
+        self.matrices = [np.eye(3)]
+        self.errors = 0
+
+    def add_matrix(self, parent: int, matrix: np.ndarray) -> int:
+        self.matrices.append(self.matrices[parent] @ matrix)
+        return len(self.matrices) - 1
+
+    def begin_subpath(self, x: float, y: float, matrix: int):
+        self.subpath_start.append(len(self.anchors) // 2)
+        self.subpath_matrix.append(matrix)
+        self.anchors.extend((x, y))
+
+    def add_cubic(self, *coords):
+        self.curves.extend(coords)
+        self.anchors.extend(coords[6:])
+        self.curve_end.append(len(self.anchors) // 2 - 1)
+
+    def transformed(self):
+        """Punti (N, 2) e cubiche (K, 4, 2) con le matrici dei rispettivi gruppi applicate."""
+        anchors = np.frombuffer(self.anchors, dtype=np.float64).reshape(-1, 2)
+        curves = np.frombuffer(self.curves, dtype=np.float64).reshape(-1, 4, 2)
+        matrix = np.frombuffer(self.subpath_matrix, dtype=np.int64)
+        if not matrix.any():
+            return anchors, curves
+
+        # Matrice di ogni punto = quella del suo sottopercorso; le cubiche usano quella del punto finale
+        starts = np.frombuffer(self.subpath_start, dtype=np.int64)
+        point_matrix = np.repeat(matrix, np.diff(np.append(starts, len(anchors))))
+        curve_matrix = point_matrix[np.frombuffer(self.curve_end, dtype=np.int64)]
+        matrices = np.stack(self.matrices)
+        anchors = self._affine(matrices, point_matrix, anchors)
+        curves = self._affine(matrices, np.repeat(curve_matrix, 4), curves.reshape(-1, 2)).reshape(-1, 4, 2)
+        return anchors, curves
+
+    def _affine(self, matrices, index, points):
+        # Una colonna alla volta: nessuna copia (N, 2, 2) delle matrici
+        x, y = points[:, 0], points[:, 1]
+        out = np.empty_like(points)
+        out[:, 0] = matrices[index, 0, 0] * x + matrices[index, 0, 1] * y + matrices[index, 0, 2]
+        out[:, 1] = matrices[index, 1, 0] * x + matrices[index, 1, 1] * y + matrices[index, 1, 2]
+        return out
+
+
+def _arc_to_cubics(x0, y0, x, y, rx, ry, angle, large, sweep):
+    """
+    Arco ellittico in forma 'endpoint' (spec SVG, F.6.5) -> lista di cubiche (8 valori),
+    una ogni 90° al massimo (errore radiale < 3e-4 del raggio). None se un raggio è nullo.
+    """
+    rx, ry = abs(rx), abs(ry)
+    if rx == 0 or ry == 0:
+        return None
+
+    phi = math.radians(angle % 360)
+    cos_phi, sin_phi = math.cos(phi), math.sin(phi)
+    dx, dy = (x0 - x) / 2, (y0 - y) / 2
+    x1 = cos_phi * dx + sin_phi * dy
+    y1 = -sin_phi * dx + cos_phi * dy
+
+    # Raggi troppo piccoli per unire i due punti: si ingrandiscono in proporzione
+    scale = (x1 / rx) ** 2 + (y1 / ry) ** 2
+    if scale > 1:
+        rx, ry = rx * math.sqrt(scale), ry * math.sqrt(scale)
+
+    num = rx * rx * ry * ry - rx * rx * y1 * y1 - ry * ry * x1 * x1
+    den = rx * rx * y1 * y1 + ry * ry * x1 * x1
+    coef = math.sqrt(max(num, 0.0) / den) if den else 0.0
+    if bool(large) == bool(sweep):
+        coef = -coef
+    cx1 = coef * rx * y1 / ry
+    cy1 = -coef * ry * x1 / rx
+    cx = cos_phi * cx1 - sin_phi * cy1 + (x0 + x) / 2
+    cy = sin_phi * cx1 + cos_phi * cy1 + (y0 + y) / 2
+
+    theta = math.atan2((y1 - cy1) / ry, (x1 - cx1) / rx)
+    delta = math.atan2((-y1 - cy1) / ry, (-x1 - cx1) / rx) - theta
+    if sweep and delta < 0:
+        delta += 2 * math.pi
+    elif not sweep and delta > 0:
+        delta -= 2 * math.pi
+
+    segments = max(1, math.ceil(abs(delta) / (math.pi / 2) - 1e-9))
+    step = delta / segments
+    alpha = 4.0 / 3.0 * math.tan(step / 4)
+
+    def point(ux, uy):
+        # Cerchio unitario -> ellisse ruotata e traslata
+        ux, uy = ux * rx, uy * ry
+        return cos_phi * ux - sin_phi * uy + cx, sin_phi * ux + cos_phi * uy + cy
+
+    cubics = []
+    start = (x0, y0)
+    cos_a, sin_a = math.cos(theta), math.sin(theta)
+    for k in range(1, segments + 1):
+        cos_b, sin_b = math.cos(theta + k * step), math.sin(theta + k * step)
+        # Estremo finale esatto: niente microsalti tra l'arco e i tratti successivi
+        end = (x, y) if k == segments else point(cos_b, sin_b)
+        cubics.append((*start, *point(cos_a - alpha * sin_a, sin_a + alpha * cos_a),
+                       *point(cos_b + alpha * sin_b, sin_b - alpha * cos_b), *end))
+        start, cos_a, sin_a = end, cos_b, sin_b
+    return cubics
+
+
+svg_parser_service = SvgParserService()
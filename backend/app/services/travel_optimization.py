@@ -0,0 +1,201 @@
+import math
+import time
+
+import numpy as np
+
+from app.core.paths import PathArray
+
+
+class TravelOptimizationService:
+    """
+    Raffinamento dell'ordine dei path dopo il greedy: 2-opt e Or-opt con inversione
+    dei tratti, entro un budget di tempo, più l'unione dei tratti che si toccano.
+    Tutte le distanze sono calcolate nello spazio scalato (mm) passato con `scale`.
+    """
+
+    def __init__(self, window: int = 64, max_segment: int = 3):
+        # window: distanza massima (in posizioni) tra i due tagli di una mossa
+        # max_segment: lunghezza massima del blocco spostato dall'Or-opt
+        self.window = window
+        self.max_segment = max_segment
+
+    # --- Metriche ---
+
+    def travel_distance(self, paths, start=(0, 0), scale=(1.0, 1.0)) -> float:
+        """Somma dei movimenti a penna alzata (G0) tra un path e il successivo."""
+        if not paths:
+            return 0.0
+        starts, ends = self._endpoints(paths, scale)
+        prev = np.vstack([np.asarray(start, dtype=float) * scale, ends[:-1]])
+        return float(np.hypot(*(starts - prev).T).sum())
+
+    # --- Ottimizzazione ---
+
+    def optimize(self, paths, start=(0, 0), scale=(1.0, 1.0), time_budget: float = 1.0):
+        """
+        Applica 2-opt e Or-opt (con inversione) all'ordine dei path finché
+        trova miglioramenti o finché non scade il budget (in secondi).
+        """
+        n = len(paths)
+        if n < 3 or time_budget <= 0:
+            return list(paths)
+
+        deadline = time.perf_counter() + time_budget
+        order = np.arange(n)
+        flipped = np.zeros(n, dtype=bool)
+        starts, ends = self._endpoints(paths, scale)
+        origin = np.asarray(start, dtype=float) * scale
+
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            for i in range(n):
+                if time.perf_counter() >= deadline:
+                    break
+                if self._two_opt_move(i, order, flipped, starts, ends, origin):
+                    improved = True
+                moved = self._or_opt_move(i, order, flipped, starts, ends, origin)
+                if moved is not None:
+                    order, flipped, starts, ends = moved
+                    improved = True
+
+        return [paths[k][::-1] if f else paths[k] for k, f in zip(order, flipped)]
+
+    def merge_paths(self, paths, tolerance: float, scale=(1.0, 1.0)):
+        """
+        Unisce in un unico tratto a penna giù i path consecutivi la cui fine
+        coincide (entro `tolerance` mm) con l'inizio del successivo: un Z-lift in meno.
+        """
+        if not paths:
+            return []
+        sx, sy = scale
+        groups = [[np.asarray(paths[0])]]
+        for p in paths[1:]:
+            p = np.asarray(p)
+            last = groups[-1][-1][-1]
+            first = p[0]
+            if math.hypot((first[0] - last[0]) * sx, (first[1] - last[1]) * sy) <= tolerance:
+                # Evitiamo di duplicare il punto di giunzione quando coincide
+                groups[-1].append(p[1:] if np.array_equal(first, last) else p)
+            else:
+                groups.append([p])
+        return [g[0] if len(g) == 1 else np.concatenate(g) for g in groups]
+
+    # --- Mosse ---
+
+    def _two_opt_move(self, i, order, flipped, starts, ends, origin):
+        """
+        Inverte il blocco [i..j] (ordine e verso dei path) se accorcia il viaggio.
+        Nuovi archi: fine(i-1) -> fine(j) e inizio(i) -> inizio(j+1).
+        """
+        n = len(order)
+        j_max = min(n - 1, i + self.window)
+        if j_max <= i:
+            return False
+
+        prev = ends[i - 1] if i > 0 else origin
+        js = np.arange(i + 1, j_max + 1)
+        old = self._dist(prev, starts[i]) + self._next_cost(ends[js], starts, js + 1)
+        new = np.hypot(*(ends[js] - prev).T) + self._next_cost(starts[i], starts, js + 1)
+        delta = new - old
+        best = int(np.argmin(delta))
+        if delta[best] >= -1e-9:
+            return False
+
+        j = int(js[best])
+        seg = slice(i, j + 1)
+        order[seg] = order[seg][::-1].copy()
+        flipped[seg] = ~flipped[seg][::-1]
+        s_seg = starts[seg][::-1].copy()
+        starts[seg] = ends[seg][::-1]
+        ends[seg] = s_seg
+        return True
+
+    def _or_opt_move(self, i, order, flipped, starts, ends, origin):
+        """
+        Sposta il blocco [i..i+L-1] (L <= max_segment), eventualmente invertito,
+        nella posizione migliore entro la finestra. Restituisce i nuovi array o None.
+        """
+        n = len(order)
+        best = None
+        prev = ends[i - 1] if i > 0 else origin
+        for length in range(1, self.max_segment + 1):
+            last = i + length - 1
+            if last >= n:
+                break
+
+            # Guadagno dalla rimozione del blocco
+            nxt_cost = self._dist(ends[last], starts[last + 1]) if last + 1 < n else 0.0
+            bridge = self._dist(prev, starts[last + 1]) if last + 1 < n else 0.0
+            removal_gain = self._dist(prev, starts[i]) + nxt_cost - bridge
+
+            # Posizioni di inserimento: dopo la posizione k (k fuori dal blocco)
+            lo = max(-1, i - self.window)
+            hi = min(n - 1, last + self.window)
+            ks = np.array([k for k in range(lo, hi + 1) if k < i - 1 or k > last], dtype=int)
+            if len(ks) == 0:
+                continue
+
+            k_ends = np.where(ks[:, None] >= 0, ends[np.maximum(ks, 0)], origin)
+            has_next = ks + 1 < n
+            k_next = starts[np.minimum(ks + 1, n - 1)]
+            # k non è mai adiacente al blocco, quindi il successore di k resta k+1
+            base = np.where(has_next, np.hypot(*(k_next - k_ends).T), 0.0)
+
+            for reverse in (False, True):
+                seg_start = ends[last] if reverse else starts[i]
+                seg_end = starts[i] if reverse else ends[last]
+                cost = (np.hypot(*(seg_start - k_ends).T)
+                        + np.where(has_next, np.hypot(*(k_next - seg_end).T), 0.0)
+                        - base)
+                idx = int(np.argmin(cost))
+                delta = cost[idx] - removal_gain
+                if delta < -1e-9 and (best is None or delta < best[0]):
+                    best = (delta, length, int(ks[idx]), reverse)
+
+        if best is None:
+            return None
+
+        _, length, k, reverse = best
+        last = i + length - 1
+        block = list(range(i, last + 1))
+        rest = [p for p in range(n) if p < i or p > last]
+        # Posizione di inserimento nella lista senza il blocco
+        insert_at = k + 1 if k < i else k + 1 - length
+        if reverse:
+            block = block[::-1]
+        perm = np.array(rest[:insert_at] + block + rest[insert_at:])
+
+        new_order = order[perm]
+        new_flipped = flipped[perm].copy()
+        new_starts = starts[perm].copy()
+        new_ends = ends[perm].copy()
+        if reverse:
+            pos = slice(insert_at, insert_at + length)
+            new_flipped[pos] = ~new_flipped[pos]
+            new_starts[pos], new_ends[pos] = new_ends[pos].copy(), new_starts[pos].copy()
+        return new_order, new_flipped, new_starts, new_ends
+
+    # --- Helper ---
+
+    def _endpoints(self, paths, scale):
+        sx, sy = scale
+        if isinstance(paths, PathArray):
+            factor = np.array([sx, sy])
+            return paths.starts().astype(np.float64) * factor, paths.ends().astype(np.float64) * factor
+        starts = np.array([(p[0][0] * sx, p[0][1] * sy) for p in paths], dtype=float)
+        ends = np.array([(p[-1][0] * sx, p[-1][1] * sy) for p in paths], dtype=float)
+        return starts, ends
+
+    def _dist(self, a, b) -> float:
+        return float(math.hypot(a[0] - b[0], a[1] - b[1]))
+
+    def _next_cost(self, points, starts, next_idx):
+        """Distanza da `points` all'inizio del path in posizione next_idx (0 se oltre la fine)."""
+        n = len(starts)
+        valid = next_idx < n
+        nxt = starts[np.minimum(next_idx, n - 1)]
+        return np.where(valid, np.hypot(*(nxt - points).T), 0.0)
+
+
+travel_optimization_service = TravelOptimizationService()
@@ -1,12 +1,31 @@
 import cv2
 import numpy as np
 import os
+from app.core.config import settings
+from app.core.paths import PathArray, PathSet
+from app.services.centerline import centerline_service
+from app.services.metrics import metrics_service
+from app.services.simplification import simplification_service
+
+# Motori di vettorializzazione disponibili (vedi extract_paths_from_image)
+ENGINES = ("centerline", "contours")
 
 class VectorizationService:
     def vectorize_image(self, input_path: str, epsilon_coeff: float = 0.002) -> str:
         """
-        Trasforma l'immagine in percorsi SVG ottimizzati.
-        epsilon_coeff: controlla la semplificazione (più alto = meno punti, più "morbido").
+        Trasforma l'immagine in percorsi SVG ottimizzati e li salva su disco.
+        Wrapper di extract_paths per chi ha bisogno del file SVG.
+        """
+        path_set = self.extract_paths(input_path, epsilon_coeff)
+        with metrics_service.stage("svg_write"):
+            return path_set.write_svg()
+
+    def extract_paths(self, input_path: str, epsilon_coeff: float = 0.002) -> PathSet:
+        """
+        Trasforma l'immagine in percorsi ottimizzati, restituiti in memoria come PathSet
+        (pronti per GCodeService, senza passare da un file SVG).
+        epsilon_coeff: controlla la semplificazione (più alto = meno punti, più "morbido");
+        0 = nessuna semplificazione (path grezzi, da semplificare in mm con GCodeService).
         """
         if not os.path.exists(input_path):
             raise FileNotFoundError(f"Image not found: {input_path}")
@@ -14,49 +33,56 @@ class VectorizationService:
         img = cv2.imread(input_path, cv2.IMREAD_GRAYSCALE)
         if img is None:
             raise ValueError(f"Could not read image: {input_path}")
+
+        return self.extract_paths_from_image(img, epsilon_coeff, source_path=input_path)
+
+    def extract_paths_from_image(self, img: np.ndarray, epsilon_coeff: float = 0.002,
+                                 source_path: str = None, engine: str = None) -> PathSet:
+        """
+        Come extract_paths ma parte da uno scheletro già in memoria
+        (uint8 in scala di grigi, sfondo bianco e linee nere).
+        engine: 'centerline' (grafo dello scheletro, ogni tratto una volta sola) oppure
+        'contours' (findContours, ogni tratto in andata e ritorno). Default: settings.VECTORIZE_ENGINE.
+        """
+        engine = engine or settings.VECTORIZE_ENGINE
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown vectorization engine: {engine} (choose from {', '.join(ENGINES)})")
+
+        if engine == "centerline":
+            with metrics_service.stage("trace_graph") as info:
+                polylines = centerline_service.trace(img == 0)
+                info.update(paths=len(polylines), points=sum(len(p) for p in polylines))
+            # Una polilinea aperta è lunga la metà del contorno che la percorre avanti e indietro:
+            # raddoppiamo la lunghezza per mantenere la stessa tolleranza relativa di epsilon_coeff
+            closed, length_factor = False, 2.0
+        else:
+            # Invertiamo: findContours vuole l'oggetto bianco su fondo nero
+            inverted = cv2.bitwise_not(img)
             
-        # Invertiamo: findContours vuole l'oggetto bianco su fondo nero
-        inverted = cv2.bitwise_not(img)
-        
-        # Trova i contorni
-        contours, _ = cv2.findContours(inverted, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+            # Trova i contorni
+            with metrics_service.stage("find_contours") as info:
+                contours, _ = cv2.findContours(inverted, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+                info.update(paths=len(contours), points=sum(len(c) for c in contours))
+            polylines = [contour.reshape(-1, 2) for contour in contours]
+            closed, length_factor = True, 1.0
         
         height, width = img.shape
-        svg_paths = []
-        
-        for contour in contours:
-            # Semplificazione del tracciato (Ramer-Douglas-Peucker)
-            # epsilon è la massima distanza tra il contorno originale e la sua approssimazione
-            epsilon = epsilon_coeff * cv2.arcLength(contour, True)
-            approx = cv2.approxPolyDP(contour, epsilon, False)
-            
-            if len(approx) < 2:
-                continue
-                
-            # Costruzione del path D
-            points = approx.reshape(-1, 2)
-            path_data = f"M {points[0][0]} {points[0][1]}"
-            for i in range(1, len(points)):
-                path_data += f" L {points[i][0]} {points[i][1]}"
-            
-            # NOTA: Per un plotter, spesso NON vogliamo 'Z' (chiusura) 
-            # se stiamo disegnando linee aperte scheletrizzate.
-            # Se è un cerchio, lo chiuderà l'ultimo punto L che coincide con M.
-            
-            svg_paths.append(f'<path d="{path_data}" fill="none" stroke="black" stroke-width="1"/>')
-        
-        # Composizione file SVG
-        svg_content = [
-            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
-            *svg_paths,
-            '</svg>'
-        ]
+
+        # NOTA: Per un plotter, spesso NON vogliamo 'Z' (chiusura) 
+        # se stiamo disegnando linee aperte scheletrizzate.
+        # Se è un cerchio, lo chiuderà l'ultimo punto L che coincide con M.
+        paths = [p for p in polylines if len(p) >= 2]
         
-        output_path = input_path.replace("_processed.png", ".svg").replace(".png", ".svg")
+        with metrics_service.stage("approx_poly") as info:
+            if epsilon_coeff:
+                # Semplificazione del tracciato (Ramer-Douglas-Peucker), tutti i path in un colpo solo:
+                # epsilon è la massima distanza tra il contorno originale e la sua approssimazione
+                lengths = simplification_service.path_lengths(paths, closed=closed) * length_factor
+                paths, _ = simplification_service.simplify(paths, epsilon_coeff * lengths)
+            # Con epsilon_coeff = 0 i path restano grezzi: la semplificazione in mm avviene
+            # in GCodeService.prepare_paths, quando la dimensione di stampa è nota
+            info.update(paths=len(paths), points=sum(len(p) for p in paths))
         
-        with open(output_path, "w") as f:
-            f.write("\n".join(svg_content))
-            
-        return output_path
+        return PathSet(paths=PathArray.from_paths(paths), width=width, height=height, source_path=source_path)
 
-vectorization_service = VectorizationService()
\ No newline at end of file
+vectorization_service = VectorizationService()
@@ -0,0 +1,107 @@
+"""
+Artefatti in /static (ArtifactStoreService).
+
+1. Event loop: --writes immagini da --size-kb scritte dentro una coroutine, con open()/write()
+   sincroni (come il vecchio generate_image) o con awrite_bytes (in un thread). Un ticker ogni
+   millisecondo misura il ritardo massimo dell'event loop, cioè quanto restano ferme le altre
+   richieste servite dallo stesso processo.
+2. Molti file: --files artefatti in una sola cartella (vecchio /static) o nelle 256 sottocartelle
+   dello store: tempo per elencare la cartella di un file, per trovarne uno (touch) e per uno sweep
+   completo della quota.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_artifacts
+    python -m benchmarks.bench_artifacts --writes 64 --size-kb 2048 --files 200000
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+
+from app.services.artifacts import ArtifactStoreService
+
+
+async def loop_lag(write_all):
+    """Ritardo massimo (s) di un ticker da 1 ms mentre gira write_all()."""
+    lag = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal lag
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lag = max(lag, time.perf_counter() - start - 0.001)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    await write_all()
+    elapsed = time.perf_counter() - start
+    done = True
+    await task
+    return elapsed, lag
+
+
+def digest(i):
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writes", type=int, default=32)
+    parser.add_argument("--size-kb", type=int, default=2048)
+    parser.add_argument("--files", type=int, default=50000)
+    args = parser.parse_args()
+
+    data = os.urandom(args.size_kb * 1024)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ArtifactStoreService(tmp, "artifacts", quota=1 << 40, ttl_s=0, sweep_interval_s=600)
+
+        async def sync_writes():
+            for i in range(args.writes):
+                with open(os.path.join(tmp, f"generated_{i}.png"), "wb") as f:
+                    f.write(data)
+                await asyncio.sleep(0)
+
+        async def async_writes():
+            for i in range(args.writes):
+                await store.awrite_bytes(digest(i), ".png", data)
+
+        print(f"{'writes':<16} {'total [s]':>10} {'max loop lag [ms]':>18}")
+        for name, write_all in (("sync in loop", sync_writes), ("awrite_bytes", async_writes)):
+            elapsed, lag = asyncio.run(loop_lag(write_all))
+            print(f"{name:<16} {elapsed:>10.3f} {lag * 1000:>18.1f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        flat = os.path.join(tmp, "flat")
+        os.makedirs(flat)
+        store = ArtifactStoreService(tmp, "artifacts", quota=1 << 40, ttl_s=0, sweep_interval_s=600)
+        for i in range(args.files):
+            open(os.path.join(flat, f"{digest(i)}.gcode"), "wb").close()
+            path = store.path(digest(i), ".gcode")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "wb").close()
+
+        def timed(fn, repeat=5):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - start)
+            return best
+
+        probe = digest(args.files // 2)
+        print(f"\n{args.files} files     {'list dir [ms]':>14} {'touch [us]':>11} {'sweep [ms]':>11}")
+        print(f"{'flat /static':<16} {timed(lambda: os.listdir(flat)) * 1000:>14.2f} "
+              f"{timed(lambda: os.utime(os.path.join(flat, f'{probe}.gcode'))) * 1e6:>11.1f} {'-':>11}")
+        print(f"{'sharded store':<16} "
+              f"{timed(lambda: os.listdir(os.path.dirname(store.path(probe, '.gcode')))) * 1000:>14.2f} "
+              f"{timed(lambda: store.touch(store.path(probe, '.gcode'))) * 1e6:>11.1f} "
+              f"{timed(store.sweep, repeat=1) * 1000:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+G-code standard vs compatto (GCodeService, compact=True) sul corpus sintetico.
+
+1. Dimensione: righe, byte, tempo di emissione e tempo di trasmissione sulla seriale
+   (10 bit per byte) per ogni --baudrate, senza e con semplificazione in mm (--tolerance-mm).
+   'dev' è lo scostamento massimo (mm) dei tratti compatti da quelli standard.
+2. Streaming: i due programmi di un'immagine piccola (--stream-size) inviati a SimulatedFirmware
+   con PlotterDriverService (character counting) a --stream-baudrate, con i movimenti accelerati
+   di --speedup volte. Il tempo macchina (busy) deve coincidere (stesso disegno); cambiano il
+   tempo totale e quello a planner vuoto (starved), cioè quanto la linea frena il plotter.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_gcode_compact
+    python -m benchmarks.bench_gcode_compact --size 2048 --baudrate 9600 115200 250000 --stream-baudrate 9600
+"""
+import argparse
+import io
+import os
+import re
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from app.services.gcode import gcode_service
+from app.services.plotter import PlotterDriverService
+from app.services.plotter_sim import SimulatedFirmware
+from app.services.processing import processing_service
+from app.services.vectorization import vectorization_service
+from benchmarks.corpus import DENSITIES, render_line_art
+
+SIZE_MM = 200.0
+_WORD = re.compile(r"([GXYZ])(-?\d+(?:\.\d*)?|-?\.\d+)")
+
+
+def corpus_paths(size, density, seed):
+    gray = cv2.cvtColor(render_line_art(size, density, seed), cv2.COLOR_BGR2GRAY)
+    return vectorization_service.extract_paths_from_image(processing_service.skeletonize_array(gray), 0.0)
+
+
+def emit(path_set, compact, tolerance_mm):
+    buffer = io.StringIO()
+    start = time.perf_counter()
+    summary = gcode_service.write_gcode(path_set, 0.0, 0.0, SIZE_MM, SIZE_MM, 0.0, sink=buffer,
+                                        tolerance_mm=tolerance_mm, compact=compact)
+    return buffer.getvalue(), summary, time.perf_counter() - start
+
+
+def strokes(gcode):
+    """Tratti a penna giù (array di punti in mm), interpretando G0/G1 modali e assi omessi."""
+    position, z, result, current = [0.0, 0.0], 5.0, [], None
+    for line in gcode.splitlines():
+        words = _WORD.findall(line.split(";", 1)[0])
+        if any(axis == "G" and float(value) not in (0, 1) for axis, value in words):
+            continue
+        target, target_z = list(position), z
+        for axis, value in words:
+            if axis == "X":
+                target[0] = float(value)
+            elif axis == "Y":
+                target[1] = float(value)
+            elif axis == "Z":
+                target_z = float(value)
+        if target_z != z:
+            if target_z <= 0:
+                current = [target]
+            elif current is not None:
+                result.append(np.array(current))
+                current = None
+        elif current is not None and target != position:
+            current.append(target)
+        position, z = target, target_z
+    return result
+
+
+def distance_to(points, polyline):
+    """Distanza di ogni punto dalla spezzata."""
+    if len(polyline) == 1:
+        return np.hypot(*(points - polyline[0]).T)
+    a, b = polyline[:-1], polyline[1:]
+    ab = b - a
+    length = np.maximum((ab ** 2).sum(axis=1), 1e-12)
+    t = np.clip(((points[:, None] - a[None]) * ab[None]).sum(axis=2) / length, 0.0, 1.0)
+    return np.hypot(*(points[:, None] - (a[None] + t[..., None] * ab[None])).transpose(2, 0, 1)).min(axis=1)
+
+
+def deviation_mm(standard, compact):
+    a, b = strokes(standard), strokes(compact)
+    if len(a) != len(b):
+        return float("nan")
+    return max((max(distance_to(p, q).max(), distance_to(q, p).max()) for p, q in zip(a, b)), default=0.0)
+
+
+def stream(gcode, baudrate, speedup):
+    with tempfile.TemporaryDirectory() as tmp:
+        gcode_path = os.path.join(tmp, "bench.gcode")
+        with open(gcode_path, "w") as f:
+            f.write(gcode)
+        firmware = SimulatedFirmware(baudrate=baudrate, latency_s=0.001, speedup=speedup)
+        driver = PlotterDriverService(firmware.listen(), baudrate, "char", 128, ack_window=1,
+                                      ack_timeout_s=30.0, settle_s=0.0)
+        driver.start(gcode_path)
+        status = driver.wait()
+        firmware.close()
+    if status["status"] != "done":
+        raise RuntimeError(f"Stream {status['status']}: {status['error']}")
+    return status, firmware.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--densities", nargs="+", choices=list(DENSITIES), default=list(DENSITIES))
+    parser.add_argument("--tolerance-mm", type=float, default=0.1, help="semplificazione del secondo caso")
+    parser.add_argument("--baudrate", type=int, nargs="+", default=[9600, 115200])
+    parser.add_argument("--stream-size", type=int, default=256)
+    parser.add_argument("--stream-baudrate", type=int, default=19200)
+    parser.add_argument("--speedup", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    transfer = " ".join(f"{f'{baud} [s]':>12}" for baud in args.baudrate)
+    print(f"{'image':<14} {'tol':>5} {'mode':<9} {'lines':>8} {'bytes':>9} {'ratio':>6} "
+          f"{'emit [s]':>9} {transfer} {'dev [mm]':>9}")
+    for density in args.densities:
+        path_set = corpus_paths(args.size, density, args.seed)
+        for tolerance_mm in (None, args.tolerance_mm):
+            standard, standard_summary, standard_time = emit(path_set, False, tolerance_mm)
+            compact, compact_summary, compact_time = emit(path_set, True, tolerance_mm)
+            deviation = deviation_mm(standard, compact)
+            for mode, summary, elapsed in (("standard", standard_summary, standard_time),
+                                           ("compact", compact_summary, compact_time)):
+                seconds = " ".join(f"{summary.bytes * 10 / baud:>12.1f}" for baud in args.baudrate)
+                print(f"{f'{density}_{args.size}':<14} {tolerance_mm or 0.0:>5.2f} {mode:<9} {summary.lines:>8} "
+                      f"{summary.bytes:>9} {standard_summary.bytes / summary.bytes:>6.2f} {elapsed:>9.2f} "
+                      f"{seconds} {deviation if mode == 'compact' else 0.0:>9.4f}")
+
+    path_set = corpus_paths(args.stream_size, "complex", args.seed)
+    print(f"\nstreaming complex_{args.stream_size} @ {args.stream_baudrate} baud, x{args.speedup:g}")
+    print(f"{'mode':<9} {'lines':>7} {'moves':>7} {'total [s]':>10} {'busy [s]':>9} {'starved [s]':>12}")
+    for mode, compact in (("standard", False), ("compact", True)):
+        gcode, _, _ = emit(path_set, compact, None)
+        status, stats = stream(gcode, args.stream_baudrate, args.speedup)
+        print(f"{mode:<9} {status['lines_total']:>7} {stats['moves']:>7} {status['elapsed_s']:>10.1f} "
+              f"{stats['busy_s']:>9.1f} {stats['starved_s']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
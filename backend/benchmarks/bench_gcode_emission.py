@@ -0,0 +1,108 @@
+"""
+Micro-benchmark di trasformazione + emissione G-code: loop per punto (vecchio)
+vs array NumPy contigui e formattazione in blocco (GCodeService attuale).
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_gcode_emission
+    python -m benchmarks.bench_gcode_emission --points 10000 100000 1000000
+"""
+import argparse
+import math
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.core.paths import PathArray
+from app.services.gcode import gcode_service
+
+
+def legacy_emit(paths, center, scale, rotation, target, target_size, draw_speed=1200, travel_speed=3000):
+    """Loop per punto originale di GCodeService.generate_gcode, usato come riferimento."""
+    gcode = []
+    center_x, center_y = center
+    scale_x, scale_y = scale
+    target_x, target_y = target
+    target_width, target_height = target_size
+    rad = math.radians(rotation)
+    cos_a = math.cos(rad)
+    sin_a = math.sin(rad)
+
+    for path in paths:
+        first_point = True
+        for x, y in path:
+            tx = x - center_x
+            ty = y - center_y
+            sx = tx * scale_x
+            sy = ty * scale_y
+            rx = sx * cos_a - sy * sin_a
+            ry = sx * sin_a + sy * cos_a
+
+            final_x = rx + target_x + (target_width / 2)
+            final_y = (ry * -1) + target_y + (target_height / 2)
+
+            if first_point:
+                gcode.append(f"G0 X{final_x:.2f} Y{final_y:.2f} F{travel_speed}")
+                gcode.append(f"G1 Z0 F{draw_speed}")
+                first_point = False
+            else:
+                gcode.append(f"G1 X{final_x:.2f} Y{final_y:.2f} F{draw_speed}")
+
+        gcode.append(f"G0 Z5 F{travel_speed}")
+    return "\n".join(gcode)
+
+
+def vectorized_emit(paths, center, scale, rotation, target, target_size, draw_speed=1200, travel_speed=3000):
+    """Stesso lavoro fatto dal GCodeService attuale (PathArray + trasformazione batch + template)."""
+    gcode = []
+    packed = PathArray.from_paths(paths)
+    points, offsets = packed.points.astype(np.float64), packed.offsets.tolist()
+    final = gcode_service._transform_points(points, center, scale, rotation, target, target_size)
+    move_template = f"G0 X%.2f Y%.2f F{travel_speed}\nG1 Z0 F{draw_speed}"
+    draw_template = f"\nG1 X%.2f Y%.2f F{draw_speed}"
+    lift = f"G0 Z5 F{travel_speed}"
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        gcode.append((move_template + draw_template * (end - start - 1)) % tuple(final[start:end].ravel().tolist()))
+        gcode.append(lift)
+    return "\n".join(gcode)
+
+
+def make_paths(total_points, points_per_path=40, size=1024, seed=0):
+    # Coordinate esatte in float32 (come i pixel dei path reali), così i due G-code sono confrontabili
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(max(total_points // points_per_path, 1)):
+        paths.append([(rng.randrange(size * 64) / 64, rng.randrange(size * 64) / 64) for _ in range(points_per_path)])
+    return paths
+
+
+def measure(fn, *args):
+    # Tempo e memoria in due esecuzioni separate: tracemalloc rallenta molto il codice Python
+    t0 = time.perf_counter()
+    out = fn(*args)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, nargs="+", default=[10000, 100000, 500000])
+    args = parser.parse_args()
+
+    params = ((512.0, 512.0), (0.2, 0.2), 30.0, (10.0, 20.0), (200.0, 200.0))
+    print(f"{'points':>9} {'loop [s]':>9} {'numpy [s]':>10} {'speedup':>8} {'loop MB':>8} {'numpy MB':>9}  identical")
+    for n in args.points:
+        paths = make_paths(n)
+        ref, t_ref, m_ref = measure(legacy_emit, paths, *params)
+        new, t_new, m_new = measure(vectorized_emit, paths, *params)
+        print(f"{n:>9} {t_ref:>9.3f} {t_new:>10.3f} {t_ref / t_new:>7.1f}x "
+              f"{m_ref / 2**20:>8.1f} {m_new / 2**20:>9.1f}  {ref == new}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Generazione immagini contro l'endpoint locale MockImageEndpoint (latenza ed errori 429/500
+iniettati): il client storico (un AsyncOpenAI, tutte le richieste insieme, nessun tentativo)
+vs ImageGenerationService con concorrenza limitata, tentativi con backoff, richieste
+identiche unite e cache su disco per prompt.
+
+Ogni scenario manda --requests richieste contemporanee scelte fra --unique prompt distinti,
+poi ripete lo stesso carico a cache calda. Riporta il tempo totale, le chiamate all'API
+(quelle che si pagano), le richieste fallite e il picco di richieste contemporanee lato API.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_generation
+    python -m benchmarks.bench_generation --requests 128 --unique 8 --concurrency 2 8 --error-rate 0.2
+"""
+import argparse
+import asyncio
+import base64
+import random
+import tempfile
+import time
+
+from openai import AsyncOpenAI
+
+from app.services.artifacts import ArtifactStoreService
+from app.services.image_generation import ImageGenerationService
+from app.services.image_generation_sim import MockImageEndpoint
+
+
+async def run_baseline(base_url, prompts):
+    """Comportamento originale: una richiesta all'API per ogni chiamata, senza limiti né tentativi."""
+    client = AsyncOpenAI(api_key="mock", base_url=base_url, max_retries=0)
+
+    async def one(prompt):
+        response = await client.images.generate(model="gpt-image-1-mini", prompt=prompt, n=1, size="1024x1024")
+        return base64.b64decode(response.data[0].b64_json)
+
+    results = await asyncio.gather(*(one(p) for p in prompts), return_exceptions=True)
+    await client.close()
+    return sum(isinstance(r, Exception) for r in results)
+
+
+async def run_gateway(service, prompts):
+    results = await asyncio.gather(*(service.generate_image(p) for p in prompts), return_exceptions=True)
+    return sum(isinstance(r, Exception) for r in results)
+
+
+def scenario(name, args, prompts, run):
+    endpoint = MockImageEndpoint(latency_s=args.latency_ms / 1000.0, error_rate=args.error_rate, seed=args.seed)
+    base_url = endpoint.start()
+    rows = []
+    try:
+        for phase in ("cold", "warm"):
+            start = time.perf_counter()
+            calls_before = endpoint.stats["requests"]
+            failed = asyncio.run(run(base_url))
+            rows.append((phase, time.perf_counter() - start, endpoint.stats["requests"] - calls_before, failed))
+    finally:
+        endpoint.close()
+    for phase, elapsed, calls, failed in rows:
+        print(f"{name:<14} {phase:<5} {elapsed:>9.2f} {calls:>10} {failed:>7} {endpoint.stats['peak_concurrency']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--unique", type=int, default=16, help="prompt distinti fra le richieste")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.25)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--backoff-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    subjects = [f"subject {i}" for i in range(args.unique)]
+    prompts = [rng.choice(subjects) for _ in range(args.requests)]
+
+    print(f"{'client':<14} {'cache':<5} {'time [s]':>9} {'API calls':>10} {'failed':>7} {'peak':>6}")
+    scenario("baseline", args, prompts, lambda base_url: run_baseline(base_url, prompts))
+    for concurrency in args.concurrency:
+        with tempfile.TemporaryDirectory() as tmp:
+            services = []
+
+            async def run(base_url):
+                # Un servizio per scenario (cache condivisa fra fase fredda e calda),
+                # ricreato nel loop corrente: semaforo e client appartengono al loop
+                service = ImageGenerationService(
+                    api_key="mock", base_url=base_url, model="gpt-image-1-mini", size="1024x1024",
+                    store=ArtifactStoreService(tmp, "artifacts", quota=1 << 30, ttl_s=0, sweep_interval_s=600),
+                    max_concurrency=concurrency, max_retries=args.retries, timeout_s=30.0,
+                    backoff_s=args.backoff_ms / 1000.0,
+                )
+                services.append(service)
+                try:
+                    return await run_gateway(service, prompts)
+                finally:
+                    await service.aclose()
+
+            scenario(f"gateway x{concurrency}", args, prompts, run)
+            cold, warm = (service.stats for service in services)
+            print(f"{'':<14} cold: {cold['coalesced']} coalesced, {cold['retries']} retries; "
+                  f"warm: {warm['cache_hits']} cache hits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Stima del tempo di stampa sul corpus sintetico: vecchia stima a velocità costante
+(lunghezza / feedrate) vs MotionPlannerService (accelerazione trapezoidale e junction
+deviation), con e senza feedrate adattivo. Riporta anche il tempo del planner.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_motion
+    python -m benchmarks.bench_motion --sizes 1024 2048 --accel 300 1000
+"""
+import argparse
+import math
+import time
+
+import cv2
+import numpy as np
+
+from app.services.gcode import gcode_service
+from app.services.motion import MotionPlannerService
+from app.services.processing import processing_service
+from app.services.vectorization import vectorization_service
+from benchmarks.corpus import DENSITIES, render_line_art
+
+SIZE_MM = 200.0
+DRAW_SPEED = 1200
+TRAVEL_SPEED = 3000
+
+
+def constant_speed_estimate(points, offsets):
+    """Stima originale di GCodeService.iter_gcode: ogni movimento a feedrate pieno, senza accelerazione."""
+    lift = gcode_service.PEN_LIFT_MM
+    total = lift / TRAVEL_SPEED * 60
+    position = np.zeros(2)
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        block = points[start:end]
+        travel = math.hypot(*(block[0] - position))
+        draw = float(np.hypot(*np.diff(block, axis=0).T).sum())
+        total += ((travel + lift) / TRAVEL_SPEED + (draw + lift) / DRAW_SPEED) * 60
+        position = block[-1]
+    return total + math.hypot(*position) / TRAVEL_SPEED * 60
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 2048])
+    parser.add_argument("--densities", nargs="+", choices=list(DENSITIES), default=list(DENSITIES))
+    parser.add_argument("--accel", type=float, nargs="+", default=[500.0])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'image':<14} {'accel':>6} {'points':>8} {'constant [s]':>13} {'planned [s]':>12} "
+          f"{'adaptive [s]':>13} {'plan [ms]':>10}")
+    for density in args.densities:
+        for size in args.sizes:
+            gray = cv2.cvtColor(render_line_art(size, density, args.seed), cv2.COLOR_BGR2GRAY)
+            path_set = vectorization_service.extract_paths_from_image(processing_service.skeletonize_array(gray), 0.0)
+            prepared = gcode_service.prepare_paths(path_set, SIZE_MM, SIZE_MM, tolerance_mm=0.1)
+            points, offsets = prepared.paths.points.astype(np.float64), prepared.paths.offsets
+            bbox = prepared.bbox
+            scale = (SIZE_MM / (bbox[2] - bbox[0]), SIZE_MM / (bbox[3] - bbox[1]))
+            center = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
+            final = gcode_service._transform_points(points, center, scale, 0.0, (0.0, 0.0), (SIZE_MM, SIZE_MM))
+
+            constant = constant_speed_estimate(final, offsets)
+            for accel in args.accel:
+                planner = MotionPlannerService(accel=accel)
+                start = time.perf_counter()
+                _, planned = planner.plan(final, offsets, DRAW_SPEED, TRAVEL_SPEED, gcode_service.PEN_LIFT_MM)
+                elapsed = time.perf_counter() - start
+                _, adaptive = planner.plan(final, offsets, DRAW_SPEED, TRAVEL_SPEED, gcode_service.PEN_LIFT_MM,
+                                           adaptive_feed=True)
+                print(f"{f'{density}_{size}':<14} {accel:>6.0f} {len(final):>8} {constant:>13.1f} "
+                      f"{planned['estimated_time_s']:>12.1f} {adaptive['estimated_time_s']:>13.1f} "
+                      f"{elapsed * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
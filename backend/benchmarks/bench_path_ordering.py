@@ -0,0 +1,93 @@
+"""
+Benchmark dell'ordinamento dei path: indice spaziale vs scansione lineare O(n²).
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_path_ordering
+    python -m benchmarks.bench_path_ordering --sizes 1000 10000 100000 --naive-limit 5000
+"""
+import argparse
+import math
+import random
+import time
+
+from app.services.path_ordering import path_ordering_service
+
+
+def naive_sort_paths(paths):
+    """Implementazione originale di GCodeService._sort_paths, usata come riferimento."""
+    if not paths: return []
+    sorted_p = []
+    current_pos = (0, 0)
+    remaining = paths[:]
+
+    while remaining:
+        best_idx = -1
+        min_d = float('inf')
+        should_reverse = False
+
+        for i, p in enumerate(remaining):
+            start = p[0]
+            d_start = math.sqrt((start[0]-current_pos[0])**2 + (start[1]-current_pos[1])**2)
+            end = p[-1]
+            d_end = math.sqrt((end[0]-current_pos[0])**2 + (end[1]-current_pos[1])**2)
+
+            if d_start < min_d:
+                min_d = d_start
+                best_idx = i
+                should_reverse = False
+
+            if d_end < min_d:
+                min_d = d_end
+                best_idx = i
+                should_reverse = True
+
+        p_to_add = remaining.pop(best_idx)
+        if should_reverse:
+            p_to_add = p_to_add[::-1]
+        sorted_p.append(p_to_add)
+        current_pos = p_to_add[-1]
+
+    return sorted_p
+
+
+def make_paths(n, size=1024, seed=0):
+    """Tratti brevi casuali su un canvas size x size, simili all'output del vettorializzatore."""
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(n):
+        x, y = rng.randint(0, size), rng.randint(0, size)
+        pts = [(x, y)]
+        for _ in range(rng.randint(1, 6)):
+            x = min(max(x + rng.randint(-8, 8), 0), size)
+            y = min(max(y + rng.randint(-8, 8), 0), size)
+            pts.append((x, y))
+        paths.append(pts)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 3000, 10000, 30000, 100000])
+    parser.add_argument("--naive-limit", type=int, default=3000,
+                        help="esegue anche l'algoritmo O(n²) fino a questo numero di path")
+    args = parser.parse_args()
+
+    print(f"{'paths':>8} {'grid [s]':>10} {'naive [s]':>10} {'speedup':>8}  identical")
+    for n in args.sizes:
+        paths = make_paths(n)
+
+        t0 = time.perf_counter()
+        fast = path_ordering_service.sort_paths(paths)
+        t_fast = time.perf_counter() - t0
+
+        if n <= args.naive_limit:
+            t0 = time.perf_counter()
+            ref = naive_sort_paths(paths)
+            t_naive = time.perf_counter() - t0
+            print(f"{n:>8} {t_fast:>10.3f} {t_naive:>10.3f} {t_naive / t_fast:>7.1f}x  {fast == ref}")
+        else:
+            print(f"{n:>8} {t_fast:>10.3f} {'-':>10} {'-':>8}  -")
+
+
+if __name__ == "__main__":
+    main()
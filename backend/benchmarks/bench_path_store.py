@@ -0,0 +1,103 @@
+"""
+Contenitori dei path sul corpus sintetico: liste di tuple (formato storico), lista di array
+(N, 2) float64 e PathArray (float32 piatto + offset). Per ciascuno: memoria occupata, tempo
+di filtro rumore + bounding box (stadio 'filter' di GCodeService) e caricamento dalla cache
+su disco (pickle classico vs ResultCache con mmap).
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_path_store
+    python -m benchmarks.bench_path_store --sizes 2048 4096 --densities complex
+"""
+import argparse
+import pickle
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from app.core.paths import PathArray
+from app.services.cache import ResultCache
+from app.services.processing import processing_service
+from app.services.vectorization import vectorization_service
+from benchmarks.corpus import DENSITIES, render_line_art
+
+NOISE_MM = 0.3
+
+
+def filter_tuples(paths):
+    """Filtro e bounding box originali (_path_length per path, due liste di coordinate)."""
+    kept = [p for p in paths if sum(np.hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip(p, p[1:])) > NOISE_MM]
+    xs = [x for p in kept for x, _ in p]
+    ys = [y for p in kept for _, y in p]
+    return kept, (min(xs), min(ys), max(xs), max(ys))
+
+
+def filter_arrays(paths):
+    kept = [p for p in paths if float(np.hypot(*np.diff(p, axis=0).T).sum()) > NOISE_MM]
+    points = np.concatenate(kept)
+    return kept, (*points.min(axis=0), *points.max(axis=0))
+
+
+def filter_path_array(paths):
+    kept = paths.select(paths.lengths() > NOISE_MM)
+    return kept, kept.bbox()
+
+
+def footprint(build):
+    tracemalloc.start()
+    value = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, size
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 2048])
+    parser.add_argument("--densities", nargs="+", choices=list(DENSITIES), default=list(DENSITIES))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'image':<14} {'container':<10} {'paths':>6} {'points':>8} {'memory [MB]':>12} "
+          f"{'filter [ms]':>12} {'load [ms]':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResultCache(tmp, memory_limit=0, disk_limit=1 << 34)
+        for density in args.densities:
+            for size in args.sizes:
+                gray = cv2.cvtColor(render_line_art(size, density, args.seed), cv2.COLOR_BGR2GRAY)
+                packed = vectorization_service.extract_paths_from_image(
+                    processing_service.skeletonize_array(gray), 0.0).paths
+                raw = [np.asarray(p, dtype=np.float64) for p in packed]
+
+                containers = {
+                    "tuples": (lambda: [[tuple(pt) for pt in p.tolist()] for p in raw], filter_tuples),
+                    "arrays": (lambda: [p.copy() for p in raw], filter_arrays),
+                    "PathArray": (lambda: PathArray.from_paths(raw), filter_path_array),
+                }
+                for name, (build, filter_fn) in containers.items():
+                    value, memory = footprint(build)
+                    elapsed = timed(lambda: filter_fn(value))
+                    if name == "PathArray":
+                        key = f"{density}-{size}"
+                        cache.put(key, value)
+                        load = timed(lambda: cache.get(key))
+                    else:
+                        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+                        load = timed(lambda: pickle.loads(data))
+                    print(f"{f'{density}_{size}':<14} {name:<10} {len(packed):>6} {packed.point_count:>8} "
+                          f"{memory / 2**20:>12.2f} {elapsed * 1000:>12.1f} {load * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
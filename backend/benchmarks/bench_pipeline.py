@@ -0,0 +1,273 @@
+"""
+Benchmark della pipeline immagine -> G-code su un corpus sintetico di line-art
+(vedi benchmarks/corpus.py). Per ogni immagine misura ProcessingService,
+VectorizationService, GCodeService e la pipeline /print completa (senza cache),
+con throughput, picco di RSS e numero di path/punti.
+
+Ogni caso gira in un processo separato, così il picco di RSS non è sporcato dai casi precedenti.
+I risultati si possono salvare come baseline JSON e confrontare con una baseline esistente:
+il confronto segnala i casi più lenti della tolleranza o con output diverso ed esce con codice 1.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --save benchmarks/baseline.json
+    python -m benchmarks.bench_pipeline --compare benchmarks/baseline.json --tolerance 0.2
+    python -m benchmarks.bench_pipeline --resolutions 512 1024 --densities complex --repeat 5
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import DENSITIES, RESOLUTIONS, build_corpus
+
+try:
+    import resource  # non disponibile su Windows
+except ImportError:
+    resource = None
+
+# Parametri di stampa usati per GCodeService e per la pipeline completa
+PRINT_PARAMS = {"x_mm": 10.0, "y_mm": 10.0, "width_mm": 200.0, "height_mm": 200.0, "rotation": 0.0}
+
+
+class _NullSink:
+    """Sink che scarta il G-code: misuriamo l'emissione, non il disco."""
+
+    def write(self, data):
+        return len(data)
+
+
+def _rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss è in KB su Linux e in byte su macOS
+    return round(rss / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def _timed(fn, repeat):
+    """Esegue fn repeat volte: restituisce (ultimo risultato, mediana dei tempi)."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    return out, statistics.median(times)
+
+
+def bench_services(image_path, repeat):
+    """Misura i tre servizi in sequenza sulla stessa immagine (eseguito in un processo figlio)."""
+    from app.services.processing import processing_service
+    from app.services.vectorization import vectorization_service
+    from app.services.gcode import gcode_service
+    from app.services.print_pipeline import simplify_tolerance_mm, vectorize_epsilon
+
+    results = {}
+
+    skeleton, elapsed = _timed(lambda: processing_service.skeletonize_image(image_path), repeat)
+    megapixels = skeleton.size / 1e6
+    results["processing"] = {
+        "duration_s": round(elapsed, 5),
+        "throughput": round(megapixels / elapsed, 3),
+        "throughput_unit": "Mpx/s",
+        "rss_peak_mb": _rss_mb(),
+        "pixels": int(skeleton.size),
+    }
+
+    path_set, elapsed = _timed(
+        lambda: vectorization_service.extract_paths_from_image(skeleton, vectorize_epsilon(), source_path=image_path),
+        repeat,
+    )
+    results["vectorization"] = {
+        "duration_s": round(elapsed, 5),
+        "throughput": round(megapixels / elapsed, 3),
+        "throughput_unit": "Mpx/s",
+        "rss_peak_mb": _rss_mb(),
+        "paths": len(path_set),
+        "points": path_set.point_count,
+    }
+
+    def gcode():
+        prepared = gcode_service.prepare_paths(path_set, PRINT_PARAMS["width_mm"], PRINT_PARAMS["height_mm"],
+                                               tolerance_mm=simplify_tolerance_mm(PRINT_PARAMS))
+        return gcode_service.write_gcode(
+            prepared,
+            target_x=PRINT_PARAMS["x_mm"],
+            target_y=PRINT_PARAMS["y_mm"],
+            target_width=PRINT_PARAMS["width_mm"],
+            target_height=PRINT_PARAMS["height_mm"],
+            rotation=PRINT_PARAMS["rotation"],
+            sink=_NullSink(),
+        )
+
+    summary, elapsed = _timed(gcode, repeat)
+    results["gcode"] = {
+        "duration_s": round(elapsed, 5),
+        "throughput": round(path_set.point_count / elapsed, 1),
+        "throughput_unit": "points/s",
+        "rss_peak_mb": _rss_mb(),
+        "paths": summary.paths,
+        "lines": summary.lines,
+        "bytes": summary.bytes,
+    }
+    return results
+
+
+def bench_pipeline(image_path, repeat):
+    """Pipeline /print completa a cache vuota, come la esegue un worker della coda dei job."""
+    from app.services.cache import result_cache
+    from app.services.print_pipeline import print_pipeline_service
+
+    def run():
+        result_cache.clear()
+        return print_pipeline_service.run(image_path, dict(PRINT_PARAMS))
+
+    result, elapsed = _timed(run, repeat)
+    return {
+        "pipeline": {
+            "duration_s": round(elapsed, 5),
+            "throughput": round(1.0 / elapsed, 3),
+            "throughput_unit": "images/s",
+            "rss_peak_mb": _rss_mb(),
+            "lines": result["commands"],
+            "bytes": result["bytes"],
+        }
+    }
+
+
+def _run_isolated(fn, *args):
+    # Un processo nuovo per ogni misura: RSS pulito e nessuna cache condivisa tra i casi
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(processes=1, maxtasksperchild=1) as pool:
+        return pool.apply(fn, args)
+
+
+def run_benchmarks(cases, repeat):
+    report = {}
+    for name, path in cases:
+        print(f"  {name}...", flush=True)
+        report[name] = {**_run_isolated(bench_services, path, repeat), **_run_isolated(bench_pipeline, path, repeat)}
+    return report
+
+
+def environment_info():
+    import cv2
+    import numpy
+    import skimage
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "opencv": cv2.__version__,
+        "scikit-image": skimage.__version__,
+    }
+
+
+def compare(current, baseline, tolerance, rss_tolerance, min_delta=0.005):
+    """
+    Confronta due report: restituisce le righe (caso, stadio, esito, dettaglio).
+    Esiti: 'slower', 'memory' e 'changed' (path/punti/righe diversi) sono regressioni.
+    Le differenze di tempo sotto min_delta secondi sono rumore e non contano.
+    """
+    rows = []
+    for case, stages in current.items():
+        base_stages = baseline.get(case)
+        if base_stages is None:
+            rows.append((case, "-", "new", "not in baseline"))
+            continue
+        for stage, cur in stages.items():
+            base = base_stages.get(stage)
+            if base is None:
+                rows.append((case, stage, "new", "not in baseline"))
+                continue
+
+            ratio = cur["duration_s"] / base["duration_s"] if base["duration_s"] else 1.0
+            detail = f"{base['duration_s']:.4f}s -> {cur['duration_s']:.4f}s ({ratio:.2f}x)"
+            changed = [k for k in ("pixels", "paths", "points", "lines", "bytes")
+                       if k in base and base[k] != cur.get(k)]
+            if changed:
+                rows.append((case, stage, "changed",
+                             ", ".join(f"{k} {base[k]} -> {cur.get(k)}" for k in changed)))
+            delta = abs(cur["duration_s"] - base["duration_s"])
+            if ratio > 1.0 + tolerance and delta >= min_delta:
+                rows.append((case, stage, "slower", detail))
+            elif ratio < 1.0 - tolerance and delta >= min_delta:
+                rows.append((case, stage, "faster", detail))
+            else:
+                rows.append((case, stage, "ok", detail))
+
+            if base.get("rss_peak_mb") and cur.get("rss_peak_mb"):
+                rss_ratio = cur["rss_peak_mb"] / base["rss_peak_mb"]
+                if rss_ratio > 1.0 + rss_tolerance:
+                    rows.append((case, stage, "memory",
+                                 f"RSS {base['rss_peak_mb']}MB -> {cur['rss_peak_mb']}MB ({rss_ratio:.2f}x)"))
+    return rows
+
+
+def print_report(report):
+    print(f"\n{'case':<14} {'stage':<14} {'time [s]':>9} {'throughput':>18} {'RSS MB':>8} {'paths':>7} {'points':>8}")
+    for case, stages in report.items():
+        for stage, r in stages.items():
+            throughput = f"{r['throughput']:.1f} {r['throughput_unit']}"
+            print(f"{case:<14} {stage:<14} {r['duration_s']:>9.4f} {throughput:>18} "
+                  f"{r['rss_peak_mb'] if r['rss_peak_mb'] is not None else '-':>8} "
+                  f"{r.get('paths', '-'):>7} {r.get('points', '-'):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resolutions", type=int, nargs="+", default=list(RESOLUTIONS))
+    parser.add_argument("--densities", nargs="+", choices=list(DENSITIES), default=list(DENSITIES))
+    parser.add_argument("--repeat", type=int, default=3, help="esecuzioni per misura (si usa la mediana)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", help="dove scrivere il corpus (default: cartella temporanea)")
+    parser.add_argument("--save", metavar="JSON", help="salva i risultati come baseline")
+    parser.add_argument("--compare", metavar="JSON", help="confronta con una baseline salvata")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="rallentamento ammesso (0.15 = +15%%)")
+    parser.add_argument("--rss-tolerance", type=float, default=0.25, help="aumento di RSS ammesso")
+    parser.add_argument("--min-delta", type=float, default=0.005, help="differenze di tempo ignorate [s]")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="plotter_bench_") as tmp:
+        # La pipeline completa deve partire a cache vuota e non toccare la cache del server
+        os.environ["PLOTTER_CACHE_DIR"] = os.path.join(tmp, "cache")
+        corpus_dir = args.corpus_dir or os.path.join(tmp, "corpus")
+
+        cases = build_corpus(corpus_dir, args.resolutions, args.densities, args.seed)
+        print(f"Corpus: {len(cases)} immagini in {corpus_dir}")
+        report = run_benchmarks(cases, args.repeat)
+
+    print_report(report)
+    document = {"environment": environment_info(), "repeat": args.repeat, "seed": args.seed, "results": report}
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"\nBaseline salvata in {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline["results"], args.tolerance, args.rss_tolerance, args.min_delta)
+        print(f"\nConfronto con {args.compare} ({baseline['environment']['date']}, "
+              f"{baseline['environment']['platform']}):")
+        for case, stage, outcome, detail in rows:
+            print(f"{case:<14} {stage:<14} {outcome:<8} {detail}")
+        regressions = [r for r in rows if r[2] in ("slower", "memory", "changed")]
+        if regressions:
+            print(f"\n{len(regressions)} regressioni rispetto alla baseline")
+            sys.exit(1)
+        print("\nNessuna regressione")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Preprocessing a piena risoluzione vs adattivo alla dimensione di stampa
+(ProcessingService.working_resolution) sul corpus sintetico.
+
+Per ogni immagine e larghezza di stampa: scala e kernel scelti, tempo di preprocessing +
+vettorializzazione, pixel lavorati, punti grezzi e punti dopo GCodeService.prepare_paths
+(semplificazione in mm). 'dev p95' è lo scostamento (mm sul foglio) dei punti adattivi dallo
+scheletro a piena risoluzione, da confrontare con la larghezza della penna.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_preprocess
+    python -m benchmarks.bench_preprocess --size 4096 --widths-mm 30 60 --pen-width-mm 0.5
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.gcode import gcode_service
+from app.services.image_pipeline import ImagePipeline
+from app.services.processing import processing_service
+from benchmarks.corpus import DENSITIES, render_line_art
+
+
+def run(gray, scale, kernel):
+    start = time.perf_counter()
+    image = ImagePipeline.from_array(gray, debug=False).preprocess(scale, kernel).vectorize(0.0)
+    return image, time.perf_counter() - start
+
+
+def deviation_mm(path_set, scale, reference_skeleton, mm_per_px):
+    """95° percentile della distanza (mm) dei punti dallo scheletro di riferimento."""
+    distance = cv2.distanceTransform(reference_skeleton, cv2.DIST_L2, 3)
+    points = np.clip(np.rint(path_set.paths.points / scale).astype(np.int64), 0, np.array(distance.shape[::-1]) - 1)
+    return float(np.percentile(distance[points[:, 1], points[:, 0]], 95)) * mm_per_px
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=2048, help="lato dell'immagine sorgente (px)")
+    parser.add_argument("--densities", nargs="+", choices=list(DENSITIES), default=list(DENSITIES))
+    parser.add_argument("--widths-mm", type=float, nargs="+", default=[30.0, 100.0, 200.0, 400.0])
+    parser.add_argument("--pen-width-mm", type=float, default=settings.PEN_WIDTH_MM)
+    parser.add_argument("--px-per-pen", type=float, default=settings.PREPROCESS_PX_PER_PEN)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'image':<14} {'mm':>5} {'mode':<9} {'scale':>6} {'kernel':>6} {'time [s]':>9} {'Mpx':>6} "
+          f"{'raw pts':>8} {'pts':>7} {'dev p95 [mm]':>13}")
+    for density in args.densities:
+        gray = cv2.cvtColor(render_line_art(args.size, density, args.seed), cv2.COLOR_BGR2GRAY)
+        full, full_time = run(gray, 1.0, 3)
+        for width_mm in args.widths_mm:
+            resolution = processing_service.working_resolution(
+                gray.shape, width_mm, width_mm, pen_width_mm=args.pen_width_mm, px_per_pen=args.px_per_pen)
+            cases = [("full", 1.0, 3, full, full_time)]
+            if resolution["scale"] < 1.0 or resolution["kernel"] != 3:
+                cases.append(("adaptive", resolution["scale"], resolution["kernel"],
+                              *run(gray, resolution["scale"], resolution["kernel"])))
+            for mode, scale, kernel, image, elapsed in cases:
+                prepared = gcode_service.prepare_paths(image.path_set, width_mm, width_mm,
+                                                       tolerance_mm=settings.SIMPLIFY_TOLERANCE_MM)
+                deviation = deviation_mm(image.path_set, scale, full.skeleton, width_mm / args.size)
+                print(f"{f'{density}_{args.size}':<14} {width_mm:>5.0f} {mode:<9} {scale:>6.3f} {kernel:>6} "
+                      f"{elapsed:>9.2f} {image.skeleton.size / 1e6:>6.2f} {image.path_set.point_count:>8} "
+                      f"{prepared.paths.point_count:>7} {deviation:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark della scheletrizzazione: immagine intera vs tile su 1..N processi, per ogni backend.
+Verifica anche che lo scheletro a tile coincida con quello dell'immagine intera,
+contando a parte i pixel diversi vicino ai bordi delle tile (le cuciture).
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_skeleton
+    python -m benchmarks.bench_skeleton --sizes 2048 4096 --workers 1 2 4 8 --backends lee zhang ximgproc
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from app.services.processing import processing_service
+from app.services.skeleton import BACKENDS, skeleton_service
+from benchmarks.corpus import DENSITIES, render_line_art
+
+# Distanza (px) dal bordo di una tile entro cui un pixel conta come "sulla cucitura"
+SEAM_BAND = 3
+
+
+def make_binary(size, density, seed):
+    img = render_line_art(size, density, seed)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return processing_service.binarize(gray) > 127
+
+
+def seam_mask(shape, tile_size):
+    mask = np.zeros(shape, dtype=bool)
+    for border in range(tile_size, shape[0], tile_size):
+        mask[max(border - SEAM_BAND, 0):border + SEAM_BAND, :] = True
+    for border in range(tile_size, shape[1], tile_size):
+        mask[:, max(border - SEAM_BAND, 0):border + SEAM_BAND] = True
+    return mask
+
+
+def timed(fn):
+    start = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2048, 4096])
+    parser.add_argument("--density", choices=list(DENSITIES), default="complex")
+    parser.add_argument("--tile-size", type=int, default=1024)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=["lee", "zhang", "ximgproc"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"CPU: {os.cpu_count()}  tile: {args.tile_size}px")
+    print(f"{'size':>5} {'backend':>9} {'mode':>10} {'time [s]':>9} {'speedup':>8} "
+          f"{'diff px':>8} {'seam px':>8} {'skeleton px':>12}")
+    for size in args.sizes:
+        binary = make_binary(size, args.density, args.seed)
+        seams = seam_mask(binary.shape, args.tile_size)
+        for requested in args.backends:
+            backend = skeleton_service.resolve_backend(requested)
+            if backend != requested:
+                continue
+
+            reference, t_ref = timed(lambda: skeleton_service.skeletonize(binary, backend, tile_size=0))
+            print(f"{size:>5} {backend:>9} {'full':>10} {t_ref:>9.3f} {'1.0x':>8} "
+                  f"{0:>8} {0:>8} {int(reference.sum()):>12}")
+
+            for workers in args.workers:
+                # Primo giro a vuoto (file .pyc e cache del disco); il tempo misurato comprende
+                # l'avvio del pool, che vive solo per la chiamata
+                skeleton_service.skeletonize(binary, backend, tile_size=args.tile_size, workers=workers)
+                tiled, t = timed(lambda: skeleton_service.skeletonize(
+                    binary, backend, tile_size=args.tile_size, workers=workers))
+                diff = tiled != reference
+                print(f"{size:>5} {backend:>9} {f'tiled x{workers}':>10} {t:>9.3f} {t_ref / t:>7.1f}x "
+                      f"{int(diff.sum()):>8} {int((diff & seams).sum()):>8} {int(tiled.sum()):>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Avvio a freddo del server: ogni misura è un processo Python nuovo.
+
+1. import di app.main (quello che uvicorn fa prima di accettare connessioni), con i moduli
+   pesanti (numpy, OpenCV, scikit-image, SDK OpenAI) eventualmente caricati nel server e i
+   moduli più lenti secondo `python -X importtime`. Oltre --budget-s il benchmark esce con
+   codice 1, così può stare in CI.
+2. uvicorn avviato davvero: tempo dal lancio alla prima risposta di /health, senza warm-up e con
+   warm-up (che parte dopo l'avvio e non deve ritardarlo).
+3. Worker della coda: import della pipeline e warm_up() in un processo nuovo, cioè quanto il
+   warm-up toglie al primo job /print.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 10 --budget-s 0.5
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+HEAVY_MODULES = ("numpy", "cv2", "skimage", "scipy", "openai", "httpx")
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+{call}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def timed_import(module, call=""):
+    script = _IMPORT_SCRIPT.format(module=module, call=call, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(module, count):
+    """I `count` moduli con il tempo cumulativo più alto secondo -X importtime."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1e6, name.rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_health(warmup, timeout_s=60.0):
+    """Secondi dal lancio di uvicorn alla prima risposta 200 di /health."""
+    port = free_port()
+    env = {**os.environ, "PLOTTER_WARMUP": "1" if warmup else "0"}
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                               "--log-level", "warning"], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout_s:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1.0) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError("/health non risponde")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-s", type=float, default=1.0, help="tempo massimo (mediana) per import app.main")
+    parser.add_argument("--top", type=int, default=8, help="moduli più lenti da elencare")
+    args = parser.parse_args()
+
+    timed_import("app.main")  # compila i .pyc, la prima misura non deve pagarli
+    runs = [timed_import("app.main") for _ in range(args.repeat)]
+    import_s = statistics.median(run["elapsed"] for run in runs)
+    print(f"import app.main: {import_s:.3f}s (mediana di {args.repeat}, budget {args.budget_s:.2f}s)")
+    print(f"moduli pesanti nel server: {', '.join(runs[0]['loaded']) or 'nessuno'}")
+    for seconds, name in slowest_imports("app.main", args.top):
+        print(f"  {seconds:>7.3f}s  {name.strip()}")
+
+    print(f"\n{'uvicorn':<16} {'/health [s]':>12}")
+    for warmup in (False, True):
+        seconds = statistics.median(time_to_health(warmup) for _ in range(args.repeat))
+        print(f"{'warm-up' if warmup else 'no warm-up':<16} {seconds:>12.3f}")
+
+    worker = [timed_import("app.services.print_pipeline", "app.services.print_pipeline.warm_up()")
+              for _ in range(args.repeat)]
+    print(f"\nworker: pipeline + warm_up() {statistics.median(run['elapsed'] for run in worker):.3f}s "
+          f"({', '.join(worker[0]['loaded'])})")
+
+    if import_s > args.budget_s:
+        print(f"\nOLTRE IL BUDGET: {import_s:.3f}s > {args.budget_s:.2f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
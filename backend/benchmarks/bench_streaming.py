@@ -0,0 +1,85 @@
+"""
+Streaming del G-code verso il firmware simulato (SimulatedFirmware): controllo di flusso
+'ack' (una riga alla volta, si aspetta l'ok) vs 'char' (character counting sul buffer di
+ricezione di Grbl). Il G-code è quello della pipeline sul corpus sintetico, troncato a
+--lines righe perché i movimenti sono eseguiti in tempo reale.
+
+Riporta il tempo totale, il tempo di lavoro della macchina, il tempo a planner vuoto
+(starved: il plotter fermo ad aspettare dati) e il riempimento medio del buffer.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_streaming
+    python -m benchmarks.bench_streaming --size 2048 --tolerance-mm 0.02 --latency-ms 1 16
+"""
+import argparse
+import io
+import itertools
+import os
+import tempfile
+
+import cv2
+
+from app.services.gcode import gcode_service
+from app.services.plotter import PlotterDriverService
+from app.services.plotter_sim import SimulatedFirmware
+from app.services.processing import processing_service
+from app.services.vectorization import vectorization_service
+from benchmarks.corpus import DENSITIES, render_line_art
+
+SIZE_MM = 200.0
+
+
+def corpus_gcode(size, density, seed, lines, draw_speed, tolerance_mm):
+    """Prime `lines` righe del G-code prodotto dalla pipeline su un'immagine del corpus."""
+    gray = cv2.cvtColor(render_line_art(size, density, seed), cv2.COLOR_BGR2GRAY)
+    path_set = vectorization_service.extract_paths_from_image(processing_service.skeletonize_array(gray), 0.0)
+    buffer = io.StringIO()
+    gcode_service.write_gcode(path_set, 0.0, 0.0, SIZE_MM, SIZE_MM, 0.0, sink=buffer, tolerance_mm=tolerance_mm,
+                             draw_speed=draw_speed)
+    return "\n".join(itertools.islice(buffer.getvalue().splitlines(), lines)) + "\n"
+
+
+def stream(gcode_path, flow_control, baudrate, latency_s, rx_buffer):
+    firmware = SimulatedFirmware(rx_buffer=rx_buffer, baudrate=baudrate, latency_s=latency_s)
+    driver = PlotterDriverService(firmware.listen(), baudrate, flow_control, rx_buffer, ack_window=1,
+                                  ack_timeout_s=30.0, settle_s=0.0)
+    driver.start(gcode_path)
+    status = driver.wait()
+    firmware.close()
+    if status["status"] != "done":
+        raise RuntimeError(f"Stream {status['status']}: {status['error']}")
+    return status, firmware.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--density", choices=list(DENSITIES), default="complex")
+    parser.add_argument("--lines", type=int, default=1500)
+    parser.add_argument("--baudrate", type=int, nargs="+", default=[115200])
+    parser.add_argument("--latency-ms", type=float, nargs="+", default=[1.0, 16.0])
+    parser.add_argument("--draw-speed", type=int, default=3000, help="feedrate di disegno (mm/min)")
+    parser.add_argument("--tolerance-mm", type=float, default=0.1)
+    parser.add_argument("--rx-buffer", type=int, default=128)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        gcode_path = os.path.join(tmp, "bench.gcode")
+        with open(gcode_path, "w") as f:
+            f.write(corpus_gcode(args.size, args.density, args.seed, args.lines, args.draw_speed,
+                                 args.tolerance_mm))
+
+        print(f"{'baud':>7} {'latency':>8} {'flow':>5} {'total [s]':>10} {'busy [s]':>9} "
+              f"{'starved [s]':>12} {'fill':>5} {'lines/s':>8}")
+        for baudrate in args.baudrate:
+            for latency_ms in args.latency_ms:
+                for flow_control in ("ack", "char"):
+                    status, stats = stream(gcode_path, flow_control, baudrate, latency_ms / 1000.0, args.rx_buffer)
+                    print(f"{baudrate:>7} {latency_ms:>6.1f}ms {flow_control:>5} {status['elapsed_s']:>10.1f} "
+                          f"{stats['busy_s']:>9.1f} {stats['starved_s']:>12.1f} {status['buffer_fill']:>5.2f} "
+                          f"{status['lines_total'] / status['elapsed_s']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
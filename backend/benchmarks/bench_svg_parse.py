@@ -0,0 +1,119 @@
+"""
+Benchmark del parsing SVG: vecchio parser a regex (ET.parse + coppie di numeri, senza
+comandi né transform) vs SvgParserService (grammatica completa, iterparse, curve appiattite).
+Il file di prova è generato al volo: gruppi con transform e path misti (L/H/V relativi,
+cubiche, quadratiche, archi). Riporta tempo, picco di memoria Python e punti prodotti.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_svg_parse
+    python -m benchmarks.bench_svg_parse --paths 1000 10000 100000 --tolerance-mm 0.05
+"""
+import argparse
+import os
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+from app.services.svg_parser import svg_parser_service
+
+SIZE_MM = 200.0
+
+
+def legacy_parse(svg_path):
+    """_parse_svg_paths originale di GCodeService, usato come riferimento."""
+    tree = ET.parse(svg_path)
+    root = tree.getroot()
+    ns = {'svg': 'http://www.w3.org/2000/svg'}
+    paths = []
+    elements = root.findall('.//svg:path', ns) + root.findall('.//path')
+    for elem in elements:
+        d = elem.get('d')
+        if not d:
+            continue
+        nums = re.findall(r"[-+]?\d*\.\d+|\d+", d)
+        pts = []
+        for i in range(0, len(nums), 2):
+            if i + 1 < len(nums):
+                pts.append((float(nums[i]), float(nums[i + 1])))
+        if pts:
+            paths.append(pts)
+    return paths
+
+
+def random_path(rng):
+    """Un attributo 'd' con tutti i tipi di comando, in coordinate assolute e relative."""
+    x, y = rng.uniform(0, 1000), rng.uniform(0, 1000)
+    parts = [f"M{x:.2f} {y:.2f}"]
+    for _ in range(rng.randint(3, 12)):
+        kind = rng.random()
+        r = lambda: rng.uniform(-40, 40)
+        if kind < 0.3:
+            parts.append("l" + " ".join(f"{r():.2f},{r():.2f}" for _ in range(rng.randint(1, 6))))
+        elif kind < 0.4:
+            parts.append(f"h{r():.2f}v{r():.2f}")
+        elif kind < 0.65:
+            parts.append(f"c{r():.2f} {r():.2f} {r():.2f} {r():.2f} {r():.2f} {r():.2f}s{r():.2f} {r():.2f} {r():.2f} {r():.2f}")
+        elif kind < 0.8:
+            parts.append(f"q{r():.2f} {r():.2f} {r():.2f} {r():.2f}t{r():.2f} {r():.2f}")
+        else:
+            parts.append(f"a{abs(r()) + 1:.2f} {abs(r()) + 1:.2f} {rng.uniform(0, 90):.1f} "
+                         f"{rng.randint(0, 1)}{rng.randint(0, 1)}{r():.2f} {r():.2f}")
+    if rng.random() < 0.3:
+        parts.append("z")
+    return "".join(parts)
+
+
+def write_svg(path, n_paths, seed=0, group_size=50):
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write('<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1000 1000">\n')
+        for start in range(0, n_paths, group_size):
+            f.write(f'<g transform="translate({rng.uniform(-20, 20):.1f} {rng.uniform(-20, 20):.1f}) '
+                    f'rotate({rng.uniform(-5, 5):.1f} 500 500)">\n')
+            for _ in range(min(group_size, n_paths - start)):
+                f.write(f'<path d="{random_path(rng)}" fill="none" stroke="black"/>\n')
+            f.write('</g>\n')
+        f.write('</svg>\n')
+
+
+def measure(fn):
+    """Tempo senza tracemalloc (che rallenta le allocazioni), poi picco di memoria in un secondo giro."""
+    start = time.perf_counter()
+    out = fn()
+    elapsed = time.perf_counter() - start
+    del out
+    tracemalloc.start()
+    out = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--tolerance-mm", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'paths':>7} {'file [MB]':>10} {'parser':>8} {'time [s]':>9} {'peak [MB]':>10} {'points':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_paths in args.paths:
+            svg_path = os.path.join(tmp, f"bench_{n_paths}.svg")
+            write_svg(svg_path, n_paths, args.seed)
+            size_mb = os.path.getsize(svg_path) / 2**20
+
+            legacy, t_legacy, m_legacy = measure(lambda: legacy_parse(svg_path))
+            parsed, t_new, m_new = measure(lambda: svg_parser_service.parse(
+                svg_path, target_size=(SIZE_MM, SIZE_MM), tolerance_mm=args.tolerance_mm))
+            print(f"{n_paths:>7} {size_mb:>10.1f} {'legacy':>8} {t_legacy:>9.3f} {m_legacy / 2**20:>10.1f} "
+                  f"{sum(len(p) for p in legacy):>9}")
+            print(f"{n_paths:>7} {size_mb:>10.1f} {'stream':>8} {t_new:>9.3f} {m_new / 2**20:>10.1f} "
+                  f"{sum(len(p) for p in parsed):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Confronto dei motori di vettorializzazione sullo stesso scheletro:
+'contours' (findContours, ogni tratto in andata e ritorno) vs 'centerline' (grafo dello scheletro).
+Riporta tempo, path e punti prodotti, lunghezza disegnata e tempo di stampa stimato dal G-code.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_vectorization
+    python -m benchmarks.bench_vectorization --sizes 1024 2048 --densities simple complex
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from app.services.gcode import gcode_service
+from app.services.processing import processing_service
+from app.services.vectorization import ENGINES, vectorization_service
+from benchmarks.corpus import DENSITIES, render_line_art
+
+SIZE_MM = 200.0
+
+
+class _NullSink:
+    def write(self, data):
+        return len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 2048])
+    parser.add_argument("--densities", nargs="+", choices=list(DENSITIES), default=list(DENSITIES))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'image':<14} {'engine':<11} {'time [s]':>9} {'paths':>7} {'points':>8} "
+          f"{'draw [mm]':>10} {'G-code lines':>13} {'print [s]':>10}")
+    for density in args.densities:
+        for size in args.sizes:
+            gray = cv2.cvtColor(render_line_art(size, density, args.seed), cv2.COLOR_BGR2GRAY)
+            skeleton = processing_service.skeletonize_array(gray)
+            for engine in ENGINES:
+                start = time.perf_counter()
+                path_set = vectorization_service.extract_paths_from_image(skeleton, engine=engine)
+                elapsed = time.perf_counter() - start
+
+                prepared = gcode_service.prepare_paths(path_set, SIZE_MM, SIZE_MM)
+                summary = gcode_service.write_gcode(prepared, 0.0, 0.0, SIZE_MM, SIZE_MM, 0.0, sink=_NullSink())
+                scale = SIZE_MM / max(size, 1)
+                draw_mm = sum(float(np.hypot(*np.diff(p, axis=0).T).sum()) for p in prepared.paths) * scale
+                print(f"{f'{density}_{size}':<14} {engine:<11} {elapsed:>9.3f} {len(path_set):>7} "
+                      f"{path_set.point_count:>8} {draw_mm:>10.0f} {summary.lines:>13} {summary.estimated_time_s:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Corpus sintetico di line-art per i benchmark: PNG generati proceduralmente e
+deterministici (stesso seed -> stessi pixel), simili alle immagini dei preset
+"simple" (pochi tratti spessi) e "complex" (molti tratti sottili e dettagli).
+"""
+import math
+import os
+import random
+
+import cv2
+import numpy as np
+
+# densità -> (numero di forme per megapixel, spessore minimo/massimo del tratto a 1024px)
+DENSITIES = {
+    "simple": (14, 4, 7),
+    "complex": (160, 2, 4),
+}
+RESOLUTIONS = (512, 1024, 2048)
+
+
+def render_line_art(size: int, density: str = "simple", seed: int = 0) -> np.ndarray:
+    """Disegna linee, curve di Bézier, cerchi e spirali neri su fondo bianco (uint8, BGR)."""
+    shapes_per_mpx, min_thick, max_thick = DENSITIES[density]
+    rng = random.Random(f"{density}-{size}-{seed}")
+    img = np.full((size, size, 3), 255, dtype=np.uint8)
+
+    # Lo spessore scala con la risoluzione, come per un disegno ridimensionato
+    thick_scale = size / 1024
+    n_shapes = max(4, int(shapes_per_mpx * (size * size) / 2**20))
+
+    def rand_point():
+        return rng.uniform(0.05, 0.95) * size, rng.uniform(0.05, 0.95) * size
+
+    for _ in range(n_shapes):
+        thickness = max(1, round(rng.randint(min_thick, max_thick) * thick_scale))
+        kind = rng.random()
+        if kind < 0.45:
+            pts = _bezier([rand_point() for _ in range(4)])
+        elif kind < 0.65:
+            pts = _polyline(rand_point(), rng, size, segments=rng.randint(2, 8))
+        elif kind < 0.85:
+            cx, cy = rand_point()
+            radius = rng.uniform(0.02, 0.15) * size
+            cv2.circle(img, (int(cx), int(cy)), int(radius), (0, 0, 0), thickness, cv2.LINE_AA)
+            continue
+        else:
+            pts = _spiral(rand_point(), rng.uniform(0.03, 0.12) * size, turns=rng.uniform(1.5, 4))
+        cv2.polylines(img, [pts], False, (0, 0, 0), thickness, cv2.LINE_AA)
+    return img
+
+
+def build_corpus(directory: str, resolutions=RESOLUTIONS, densities=tuple(DENSITIES), seed: int = 0):
+    """Scrive il corpus in directory e restituisce [(nome_caso, path_png)], in ordine stabile."""
+    os.makedirs(directory, exist_ok=True)
+    cases = []
+    for density in densities:
+        for size in resolutions:
+            name = f"{density}_{size}"
+            path = os.path.join(directory, f"{name}.png")
+            if not os.path.exists(path):
+                cv2.imwrite(path, render_line_art(size, density, seed))
+            cases.append((name, path))
+    return cases
+
+
+def _bezier(control, steps=64):
+    t = np.linspace(0.0, 1.0, steps)[:, None]
+    p0, p1, p2, p3 = (np.array(p) for p in control)
+    curve = (1 - t) ** 3 * p0 + 3 * (1 - t) ** 2 * t * p1 + 3 * (1 - t) * t ** 2 * p2 + t ** 3 * p3
+    return curve.astype(np.int32)
+
+
+def _polyline(start, rng, size, segments):
+    pts = [start]
+    for _ in range(segments):
+        x, y = pts[-1]
+        angle = rng.uniform(0, 2 * math.pi)
+        length = rng.uniform(0.03, 0.2) * size
+        pts.append((min(max(x + length * math.cos(angle), 0), size - 1),
+                    min(max(y + length * math.sin(angle), 0), size - 1)))
+    return np.array(pts, dtype=np.int32)
+
+
+def _spiral(center, radius, turns, steps=200):
+    t = np.linspace(0.0, 1.0, steps)
+    angle = t * turns * 2 * math.pi
+    r = radius * t
+    return np.stack([center[0] + r * np.cos(angle), center[1] + r * np.sin(angle)], axis=1).astype(np.int32)
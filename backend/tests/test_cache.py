@@ -0,0 +1,92 @@
+import os
+import time
+
+import numpy as np
+
+from app.services import cache as cache_module
+from app.services.cache import ResultCache
+
+
+def make_cache(tmp_path, memory_limit=2**20, disk_limit=2**20):
+    return ResultCache(str(tmp_path / "cache"), memory_limit, disk_limit)
+
+
+def tmp_files(cache):
+    return [name for name in os.listdir(cache.directory) if name.endswith(".tmp")]
+
+
+def test_failed_write_leaves_no_temporary_file(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path)
+    cache.put("a", np.arange(10))
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(cache_module.os, "replace", fail)
+    cache.put("b", np.arange(10))
+
+    assert tmp_files(cache) == []
+    assert sorted(os.listdir(cache.directory)) == ["a.pkl"]
+
+
+def test_eviction_removes_stale_temporary_files(tmp_path):
+    cache = make_cache(tmp_path, disk_limit=4096)
+    os.makedirs(cache.directory)
+    old = time.time() - cache_module.TMP_GRACE_S - 1
+    for name in ("stale", "fresh"):
+        with open(os.path.join(cache.directory, f"{name}.pkl.1.2.tmp"), "wb") as f:
+            f.write(b"\0" * 4000)
+    os.utime(os.path.join(cache.directory, "stale.pkl.1.2.tmp"), (old, old))
+
+    cache.put("a", np.arange(10))
+    cache.put("b", np.arange(10))
+
+    # Il temporaneo vecchio conta e va via per primo; quello recente è una scrittura in corso
+    assert tmp_files(cache) == ["fresh.pkl.1.2.tmp"]
+    assert sorted(name for name in os.listdir(cache.directory) if name.endswith(".pkl")) == ["a.pkl", "b.pkl"]
+
+
+def test_file_hash_survives_touch_and_memo_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, "FILE_HASH_MEMO", 2)
+    cache = make_cache(tmp_path)
+    image = tmp_path / "image.png"
+    image.write_bytes(b"png")
+    digest = cache.hash_file(str(image))
+
+    os.utime(image, (time.time() + 10, time.time() + 10))
+    reads = []
+    with monkeypatch.context() as m:
+        m.setattr("builtins.open", lambda *args, **kwargs: reads.append(args) or open(*args, **kwargs))
+        assert cache.hash_file(str(image)) == digest
+    assert reads == []
+
+    for name in ("b", "c", "d"):
+        (tmp_path / name).write_bytes(name.encode())
+        cache.hash_file(str(tmp_path / name))
+    assert len(cache._file_hashes) == 2
+
+
+def buffer_owner(array):
+    while getattr(array, "base", None) is not None:
+        array = array.base
+    return array.obj
+
+
+def test_disk_reads_are_mapped_except_on_windows(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, memory_limit=0)  # ogni get rilegge il file
+    cache.put("a", np.arange(10))
+    assert type(buffer_owner(cache.get("a"))).__name__ == "mmap"
+
+    # Su Windows un file mappato non si può eliminare né sostituire
+    with monkeypatch.context() as m:
+        m.setattr(cache_module.os, "name", "nt")
+        value = cache.get("a")
+    assert isinstance(buffer_owner(value), bytes)
+    assert (value == np.arange(10)).all()
+
+
+def test_rewritten_key_is_counted_once(tmp_path):
+    cache = make_cache(tmp_path)
+    for _ in range(3):
+        cache.put("a", np.arange(1000))
+    assert cache._disk_size == os.path.getsize(os.path.join(cache.directory, "a.pkl"))
@@ -0,0 +1,102 @@
+import asyncio
+import os
+
+import openai
+import pytest
+
+from app.services.artifacts import ArtifactStoreService
+from app.services.image_generation import ImageGenerationService
+from app.services.image_generation_sim import MockImageEndpoint
+
+
+@pytest.fixture
+def endpoint_factory():
+    endpoints = []
+
+    def start(**options):
+        endpoint = MockImageEndpoint(**options)
+        endpoints.append(endpoint)
+        return endpoint, endpoint.start()
+
+    yield start
+    for endpoint in endpoints:
+        endpoint.close()
+
+
+def make_service(tmp_path, base_url, max_concurrency=4, max_retries=3):
+    store = ArtifactStoreService(str(tmp_path), "artifacts", quota=2**30, ttl_s=0, sweep_interval_s=600)
+    return ImageGenerationService("test-key", base_url, "gpt-image-1-mini", "1024x1024", store,
+                                  max_concurrency=max_concurrency, max_retries=max_retries,
+                                  timeout_s=10.0, backoff_s=0.01)
+
+
+async def generate_all(service, prompts, **kwargs):
+    try:
+        return await asyncio.gather(*(service.generate_image(prompt, **kwargs) for prompt in prompts),
+                                    return_exceptions=True)
+    finally:
+        await service.aclose()
+
+
+def test_identical_concurrent_prompts_make_one_upstream_call(tmp_path, endpoint_factory):
+    endpoint, base_url = endpoint_factory(latency_s=0.2)
+    service = make_service(tmp_path, base_url)
+
+    urls = asyncio.run(generate_all(service, ["a cat"] * 8))
+
+    assert len(set(urls)) == 1 and urls[0].startswith("/static/artifacts/")
+    assert os.path.exists(tmp_path / urls[0][len("/static/"):])
+    assert endpoint.stats["requests"] == service.stats["upstream_calls"] == 1
+    assert service.stats["coalesced"] == 7
+
+    # A generazione conclusa la stessa richiesta viene dallo store, senza chiamare l'API
+    assert asyncio.run(generate_all(service, ["a cat"])) == urls[:1]
+    assert service.stats["cache_hits"] == 1 and endpoint.stats["requests"] == 1
+
+
+@pytest.mark.parametrize("errors", [{1: 429}, {1: 500}, {1: 429, 2: 503, 3: 500}])
+def test_transient_errors_are_retried(tmp_path, endpoint_factory, errors):
+    endpoint, base_url = endpoint_factory(responses=errors)
+    service = make_service(tmp_path, base_url, max_retries=3)
+
+    [url] = asyncio.run(generate_all(service, ["a cat"]))
+
+    assert url.startswith("/static/artifacts/")
+    assert endpoint.stats["requests"] == len(errors) + 1
+    assert service.stats["retries"] == len(errors)
+    assert service.stats["failures"] == 0
+
+
+def test_retries_stop_after_max_retries(tmp_path, endpoint_factory):
+    endpoint, base_url = endpoint_factory(responses={1: 500, 2: 500, 3: 500})
+    service = make_service(tmp_path, base_url, max_retries=2)
+
+    [error] = asyncio.run(generate_all(service, ["a cat"]))
+
+    assert isinstance(error, openai.InternalServerError)
+    assert endpoint.stats["requests"] == 3
+    assert service.stats["failures"] == 1
+
+
+@pytest.mark.parametrize("status, error_type", [(400, openai.BadRequestError),
+                                                (401, openai.AuthenticationError)])
+def test_client_errors_are_not_retried(tmp_path, endpoint_factory, status, error_type):
+    endpoint, base_url = endpoint_factory(responses={1: status})
+    service = make_service(tmp_path, base_url, max_retries=3)
+
+    [error] = asyncio.run(generate_all(service, ["a cat"]))
+
+    assert isinstance(error, error_type)
+    assert endpoint.stats["requests"] == 1
+    assert service.stats["retries"] == 0 and service.stats["failures"] == 1
+
+
+def test_semaphore_bounds_concurrent_upstream_requests(tmp_path, endpoint_factory):
+    endpoint, base_url = endpoint_factory(latency_s=0.1)
+    service = make_service(tmp_path, base_url, max_concurrency=2)
+
+    urls = asyncio.run(generate_all(service, [f"subject {i}" for i in range(8)]))
+
+    assert all(isinstance(url, str) for url in urls) and len(set(urls)) == 8
+    assert endpoint.stats["requests"] == 8
+    assert endpoint.stats["peak_concurrency"] == 2
@@ -0,0 +1,40 @@
+import os
+import time
+
+from app.services.jobs import JobQueueService
+
+
+def square(x, on_stage):
+    on_stage("square", "done", {"x": x})
+    return x * x
+
+
+def crash(on_stage):
+    os._exit(1)
+
+
+def wait_for(queue, job_id, timeout_s=60.0):
+    deadline = time.monotonic() + timeout_s
+    while queue.get(job_id)["status"] not in ("done", "failed"):
+        assert time.monotonic() < deadline, "timeout"
+        time.sleep(0.01)
+    return queue.get(job_id)
+
+
+def test_broken_pool_is_replaced_and_its_listener_stopped():
+    queue = JobQueueService(max_workers=1, max_pending=4, history=10)
+    try:
+        job = queue.submit("test", crash)
+        listener = queue._listener
+        assert wait_for(queue, job["id"])["status"] == "failed"
+        listener.join(5.0)
+        assert not listener.is_alive()
+
+        job = queue.submit("test", square, 7)
+        assert queue._listener is not listener
+        job = wait_for(queue, job["id"])
+        assert job["status"] == "done" and job["result"] == 49
+        assert job["stages"]["square"] == {"x": 7, "status": "done"}
+        assert queue.stats()["pending"] == 0
+    finally:
+        queue.shutdown()
@@ -0,0 +1,139 @@
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services.plotter import PlotterDriverService
+from app.services.plotter_sim import SimulatedFirmware
+
+
+def write_gcode(tmp_path, draw_lines=200, step_mm=1.0, feed=600):
+    """Un solo tratto a penna giù di draw_lines segmenti, tra header e penna alzata finale."""
+    lines = ["; --- Start of Job ---", "G21 ; Units in mm", "G90 ; Absolute positioning",
+             "G0 Z5 F3000", "G0 X0 Y0 F3000", "G1 Z0 F1200"]
+    lines += [f"G1 X{(i + 1) * step_mm:.2f} Y{i % 2:.2f} F{feed}" for i in range(draw_lines)]
+    lines += ["G0 Z5 F3000", "G28 X0 Y0 ; Home"]
+    path = tmp_path / "job.gcode"
+    path.write_text("\n".join(lines))
+    return str(path)
+
+
+def sent_lengths(gcode_path):
+    return [len(line.split(";", 1)[0].strip()) + 1 for line in open(gcode_path) if line.split(";", 1)[0].strip()]
+
+
+def make_driver(port, flow_control="char", rx_buffer=128, ack_window=1):
+    return PlotterDriverService(port, 115200, flow_control, rx_buffer, ack_window=ack_window,
+                                ack_timeout_s=10.0, settle_s=0.0)
+
+
+def wait_until(condition, timeout_s=10.0):
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        assert time.monotonic() < deadline, "timeout"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def fast_sim(monkeypatch):
+    monkeypatch.setattr(settings, "PLOTTER_SIM_SPEEDUP", 1000.0)
+
+
+@pytest.fixture
+def slow_sim(monkeypatch):
+    # 200 segmenti da 1 mm a 600 mm/min = 20 s, accelerati a ~2 s
+    monkeypatch.setattr(settings, "PLOTTER_SIM_SPEEDUP", 10.0)
+
+
+def test_char_counting_keeps_the_rx_buffer_full_without_overflow(tmp_path, fast_sim):
+    gcode = write_gcode(tmp_path)
+    driver = make_driver("sim://", "char", rx_buffer=128)
+    try:
+        driver.start(gcode)
+        status = driver.wait(30)
+        stats = driver._simulator.stats
+    finally:
+        driver.shutdown()
+
+    assert status["status"] == "done", status["error"]
+    assert status["lines_acked"] == status["lines_total"] == len(sent_lengths(gcode))
+    assert status["progress"] == 1.0
+    assert stats["overflows"] == 0
+    # Più righe in volo insieme, mai oltre il buffer del firmware
+    assert max(sent_lengths(gcode)) < stats["rx_peak"] <= 128
+
+
+def test_ack_flow_control_sends_one_line_at_a_time(tmp_path, fast_sim):
+    gcode = write_gcode(tmp_path, draw_lines=50)
+    driver = make_driver("sim://", "ack", ack_window=1)
+    try:
+        driver.start(gcode)
+        status = driver.wait(30)
+        stats = driver._simulator.stats
+    finally:
+        driver.shutdown()
+
+    assert status["status"] == "done", status["error"]
+    assert stats["overflows"] == 0
+    assert stats["rx_peak"] <= max(sent_lengths(gcode))
+
+
+@pytest.mark.parametrize("response", ["error:20", "ALARM:1"])
+def test_rejected_line_fails_the_stream_and_lifts_the_pen(tmp_path, response):
+    gcode = write_gcode(tmp_path)
+    # Riga 20: a metà del tratto, penna giù
+    firmware = SimulatedFirmware(speedup=1000.0, responses={20: response})
+    driver = make_driver(firmware.listen())
+    try:
+        driver.start(gcode)
+        status = driver.wait(30)
+        position = firmware.position
+    finally:
+        driver.shutdown()
+        firmware.close()
+
+    assert status["status"] == "failed"
+    assert response in status["error"] and "line 20" in status["error"]
+    assert status["lines_acked"] < status["lines_total"]
+    assert position[2] == settings.PEN_LIFT_MM
+
+
+def test_pause_stops_sending_and_resume_completes(tmp_path, slow_sim):
+    gcode = write_gcode(tmp_path)
+    driver = make_driver("sim://")
+    try:
+        driver.start(gcode)
+        wait_until(lambda: driver.status()["lines_acked"] > 10)
+        assert driver.pause()["status"] == "paused"
+        # Le righe già nel buffer del firmware finiscono, poi non parte più nulla
+        time.sleep(0.5)
+        sent = driver.status()["lines_sent"]
+        time.sleep(0.5)
+        assert driver.status()["lines_sent"] == sent < driver.status()["lines_total"]
+
+        assert driver.resume()["status"] == "streaming"
+        status = driver.wait(30)
+    finally:
+        driver.shutdown()
+
+    assert status["status"] == "done", status["error"]
+    assert status["lines_acked"] == status["lines_total"]
+    assert status["paused_s"] >= 0.8
+
+
+def test_cancel_ends_with_the_pen_lifted(tmp_path, slow_sim):
+    gcode = write_gcode(tmp_path)
+    driver = make_driver("sim://")
+    try:
+        driver.start(gcode)
+        wait_until(lambda: driver.status()["lines_acked"] > 10)
+        assert driver.cancel()["status"] == "cancelling"
+        status = driver.wait(30)
+        position = driver._simulator.position
+    finally:
+        driver.shutdown()
+
+    assert status["status"] == "cancelled"
+    # Il 'G0 Z5' finale del file non è mai partito: la penna l'ha alzata il driver
+    assert status["lines_acked"] < status["lines_total"]
+    assert position[2] == settings.PEN_LIFT_MM
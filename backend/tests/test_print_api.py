@@ -0,0 +1,38 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.print_pipeline import simplify_tolerance_mm
+from app.services.simplification import simplification_service
+
+# Senza 'with' il lifespan non parte: niente warm-up né worker, i job non vengono accodati
+client = TestClient(app)
+
+PRINT = {"imageUrl": "/static/missing.png", "x_mm": 0, "y_mm": 0, "width_mm": 100, "height_mm": 100}
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/print", {**PRINT, "tolerance_mm": -0.1}),
+    ("/print/batch", {"items": [PRINT], "tolerance_mm": -0.1}),
+])
+def test_negative_tolerance_is_rejected(path, body):
+    assert client.post(path, json=body).status_code == 422
+
+
+def test_zero_tolerance_is_not_the_default(monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.SIMPLIFY_MODE", "absolute")
+    assert simplify_tolerance_mm({"tolerance_mm": 0}) == 0
+    assert simplify_tolerance_mm({}) == simplify_tolerance_mm({"tolerance_mm": None}) > 0
+
+    bbox = (0.0, 0.0, 100.0, 100.0)
+    resolution = simplification_service.tolerance_px(bbox, 100.0, 100.0, 0.0)
+    assert resolution < simplification_service.tolerance_px(bbox, 100.0, 100.0, None)
+
+
+def test_print_of_a_directory_is_not_found(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.STATIC_DIR", str(tmp_path))
+    (tmp_path / "artifacts" / "ab").mkdir(parents=True)
+
+    response = client.post("/print", json={**PRINT, "imageUrl": "/static/artifacts/ab"})
+
+    assert response.status_code == 404